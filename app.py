@@ -1,13 +1,106 @@
 # Flask应用主文件
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, g
 from services.subway_system import SubwaySystem
+from services.metrics import REGISTRY, CONTENT_TYPE, CallbackGauge, counter, histogram
+from services.profiling import RequestProfiler, memory_report
+from models.network_delta import NetworkDelta, EDGE_SPLIT, EDGE_REMOVED, NODE_ADDED
+from utils.snapshot import DEFAULT_SNAPSHOT_PATH
 from datetime import datetime
 from math import radians, sin, cos, sqrt, atan2
+from functools import wraps
+import hmac
+import os
+import time
+import tracemalloc
 
 # 创建Flask应用实例
 app = Flask(__name__)
-# 创建地铁系统实例（全局共享）
-system = SubwaySystem()
+# 创建地铁系统实例（全局共享），路线缓存容量、路网快照路径（为空时直接读取JSON）和单次查询的搜索预算（为0时不限制）可通过环境变量配置
+system = SubwaySystem(cache_size=int(os.environ.get('SUBWAY_ROUTE_CACHE_SIZE', 1024)),
+                      snapshot_path=os.environ.get('SUBWAY_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH) or None,
+                      max_expansions=int(os.environ.get('SUBWAY_SEARCH_MAX_EXPANSIONS', 500000)) or None,
+                      max_search_ms=float(os.environ.get('SUBWAY_SEARCH_MAX_MS', 1000)) or None)
+
+# /departure_time 一次最多返回的后续发车班次数
+MAX_NEXT_DEPARTURES = 50
+
+# 请求计数和耗时按路由规则（而不是实际路径）统计，标签取值的数量有限
+HTTP_REQUESTS = counter("subway_http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_SECONDS = histogram("subway_http_request_duration_seconds", "HTTP请求的处理耗时（秒）", ("method", "route"))
+
+def _route_cache_lookups():
+    return {("hit",): system.route_cache.hits, ("miss",): system.route_cache.misses}
+
+def _route_cache_hit_ratio():
+    return {(): system.route_cache.stats()["hit_ratio"]}
+
+for metric in (
+        CallbackGauge("subway_route_cache_lookups_total", "路线缓存的查找次数，result为hit或miss",
+                      _route_cache_lookups, ("result",), kind="counter"),
+        CallbackGauge("subway_route_cache_evictions_total", "路线缓存淘汰的条目数",
+                      lambda: {(): system.route_cache.evictions}, kind="counter"),
+        CallbackGauge("subway_route_cache_entries", "路线缓存当前的条目数", lambda: {(): len(system.route_cache)}),
+        CallbackGauge("subway_route_cache_hit_ratio", "进程启动以来路线缓存的命中率", _route_cache_hit_ratio),
+        CallbackGauge("subway_network_version", "当前发布的路网版本号", lambda: {(): system.network_version})):
+    REGISTRY.register(metric)
+
+# 诊断接口（/debug/*）的管理员令牌，未设置时诊断接口不可用
+ADMIN_TOKEN = os.environ.get('SUBWAY_ADMIN_TOKEN')
+profiler = RequestProfiler()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # 诊断和监控接口本身不参与按需分析
+    if not request.path.startswith(('/debug/', '/metrics')):
+        g.profile = profiler.begin(request.path)
+
+@app.teardown_request
+def finish_request_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.end(profile)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        HTTP_REQUESTS.inc(request.method, route, str(response.status_code))
+        HTTP_SECONDS.observe(time.perf_counter() - started, request.method, route)
+    return response
+
+@app.before_request
+def pin_network_version():
+    """每个请求从头到尾使用请求开始时的路网版本，期间发布的编辑不影响本请求"""
+    g.network_pinned = system.pin()
+
+@app.teardown_request
+def unpin_network_version(exc):
+    if g.pop('network_pinned', False):
+        system.unpin()
+
+class _EditRejected(Exception):
+    """编辑接口返回失败结果，用于丢弃编辑草稿"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+def network_edit(handler):
+    """编辑接口在system.edit()中执行：所有修改作用于下一版本路网的草稿，
+    接口返回成功后一次性发布，返回失败时丢弃草稿，查询请求不会看到改了一半的路网"""
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        try:
+            with system.edit():
+                response = handler(*args, **kwargs)
+                if not response.get_json().get('success'):
+                    raise _EditRejected(response)
+                return response
+        except _EditRejected as e:
+            return e.response
+    return wrapper
 
 # 首页路由
 @app.route('/')
@@ -21,21 +114,31 @@ def query():
     start = data.get('start')
     end = data.get('end')
     mode = data.get('mode', 'time')  # 默认使用最短时间模式
+    depart_time = data.get('depart_time')  # 出发时间（HH:MM），按时刻表查询时使用，其他模式据此估计等车时间
+    depart_until = data.get('depart_until')  # profile模式下出发时间窗口的结束时间（HH:MM）
+    arrive_time = data.get('arrive_time')  # arrive_by模式下的最晚到达时间（HH:MM）
+    date = data.get('date')  # 出行日期（YYYY-MM-DD），决定使用工作日还是双休日时刻表
+    k = data.get('k', 1)  # 最短时间模式返回的备选路线数
     
     if not start or not end:
         return jsonify({"error": "请提供起点和终点站"}), 400
+    if isinstance(k, str) and k.isdigit():
+        k = int(k)
         
     try:
+        # 每个请求只规划一次，以下三种视图都从同一个结果渲染
+        result = system.query_route(start, end, mode, depart_time, depart_until, arrive_time, date, k)
+        
         # 如果是HTML格式的结果（用于原有页面）
-        html_result = system.plan_route(start, end, mode)
+        html_result = system.render_route_text(result)
         
         # 获取路径数据详情（用于地图显示）
-        path_data = system.get_route_details(start, end, mode)
+        path_data = system.render_route_details(result)
         
-        # 对于最少换乘模式，获取所有可能的路线
+        # 对于最少换乘、出发时间窗口和多条备选路线的查询，返回所有路线方案
         all_paths = None
-        if mode == 'transfers':
-            all_paths = system.get_all_transfer_routes(start, end)
+        if mode in ('transfers', 'profile') or len(result.routes) > 1:
+            all_paths = result.routes
         
         # 合并返回结果
         return jsonify({
@@ -46,13 +149,36 @@ def query():
             "lines": path_data.get("lines", []),
             "wait_time": path_data.get("wait_time", 0),
             "segments": path_data.get("segments", []),
-            "all_paths": all_paths
+            "departure": path_data.get("departure"),
+            "arrival": path_data.get("arrival"),
+            "legs": path_data.get("legs"),
+            "all_paths": all_paths,
+            "optimal": result.optimal
         })
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
+# 批量路线查询API：多个起点到多个终点的时间、距离、换乘次数和票价矩阵
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    data = request.get_json(silent=True) or {}
+    origins = data.get('origins')
+    destinations = data.get('destinations')
+    
+    if not isinstance(origins, list) or not isinstance(destinations, list) or not origins or not destinations:
+        return jsonify({"error": "请提供起点站列表origins和终点站列表destinations"}), 400
+    
+    try:
+        return jsonify(system.plan_many(origins, destinations,
+                                        mode=data.get('mode', 'time'),
+                                        depart_time=data.get('depart_time'),
+                                        date=data.get('date')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 # 添加站点API
 @app.route('/edit/add_station', methods=['POST'])
+@network_edit
 def add_station():
     try:
         data = request.get_json()
@@ -85,9 +211,10 @@ def add_station():
         if data['prev_station'] in system.stations[data['next_station']].adjacent_stations:
             del system.stations[data['next_station']].adjacent_stations[data['prev_station']]
         
-        # 更新规划器
-        from services.subway_planner import SubwayPlanner
-        system.planner = SubwayPlanner(system.stations, system.lines)
+        # 更新规划器并使路线缓存失效（编辑器已处理前一站点到新站点的连接）
+        system.mark_network_changed(NetworkDelta(EDGE_SPLIT, data['line_id'],
+                                                 added_edges=[(data['new_station'], data['next_station'])],
+                                                 removed_edges=[(data['prev_station'], data['next_station'])]))
         
         # 返回更新后的地铁数据
         return jsonify({
@@ -101,6 +228,7 @@ def add_station():
         return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/edit/remove_station', methods=['POST'])
+@network_edit
 def remove_station():
     try:
         data = request.get_json()
@@ -119,6 +247,8 @@ def remove_station():
         
         # 获取该站点在线路中的相邻站点
         adjacent_stations = list(system.stations[station_to_remove].adjacent_stations.keys())
+        delta = NetworkDelta(EDGE_REMOVED, removed_stations=[station_to_remove],
+                             removed_edges=[(station_to_remove, adj) for adj in adjacent_stations])
         
         # 如果有两个相邻站点，需要在它们之间建立连接
         if len(adjacent_stations) == 2:
@@ -131,6 +261,7 @@ def remove_station():
             # 建立直接连接
             system.stations[a].add_adjacent_station(b, new_dist)
             system.stations[b].add_adjacent_station(a, new_dist)
+            delta.added_edges.append((a, b))
         
         # 移除站点与相邻站点的连接关系
         for adj in adjacent_stations:
@@ -145,9 +276,8 @@ def remove_station():
         # 从系统中移除该站点
         del system.stations[station_to_remove]
         
-        # 更新规划器
-        from services.subway_planner import SubwayPlanner
-        system.planner = SubwayPlanner(system.stations, system.lines)
+        # 更新规划器并使路线缓存失效
+        system.mark_network_changed(delta)
         
         # 返回更新后的地铁数据
         return jsonify({
@@ -174,6 +304,7 @@ def is_adjacent(line_id, station1, station2):
         return False
 
 @app.route('/edit/extend_line', methods=['POST'])
+@network_edit
 def extend_line():
     try:
         data = request.get_json()
@@ -194,6 +325,7 @@ def extend_line():
 
 # 添加自定义站点API
 @app.route('/edit/add_custom_station', methods=['POST'])
+@network_edit
 def add_custom_station():
     try:
         data = request.get_json()
@@ -212,6 +344,7 @@ def add_custom_station():
         # 保存站点经纬度信息（用于前端显示）
         new_station.lat = station_data['lat']
         new_station.lng = station_data['lng']
+        line_existed = line_data['name'] in system.lines
         
         # 如果是新线路，则创建线路
         if is_new_line:
@@ -371,9 +504,13 @@ def add_custom_station():
                     system.lines[line_name] = new_line
                     new_station.add_line(line_name)
         
-        # 更新规划器
-        from services.subway_planner import SubwayPlanner
-        system.planner = SubwayPlanner(system.stations, system.lines)
+        # 更新规划器并使路线缓存失效：新站点的所有连接都计入增量，
+        # 被断开的原有区间两端都与新站点相连，会随之重新计算
+        system.mark_network_changed(NetworkDelta(
+            NODE_ADDED, line_data['name'],
+            added_stations=[new_station_name],
+            added_edges=[(new_station_name, adj) for adj in new_station.adjacent_stations],
+            added_lines=[] if line_existed else [line_data['name']]))
         
         return jsonify({
             'success': True,
@@ -412,11 +549,29 @@ def get_subway_data():
     return jsonify(system.get_system_data())
 
 # 获取线路发车时间信息
-@app.route('/departure_times/<line_id>', methods=['GET'])
+@app.route('/departure_times/<path:line_id>', methods=['GET'])
 def get_departure_times(line_id):
-    """获取指定线路的所有发车时间信息"""
+    """获取指定线路的所有发车时间信息
+    
+    提供station、start和end参数时只返回该始发站在[start, end]内的发车时间，
+    可用direction参数限定运行方向，date参数（YYYY-MM-DD）选择该日期的时刻表。
+    """
     try:
-        departure_times = system.get_departure_times(line_id)
+        station = request.args.get('station')
+        date = request.args.get('date')
+        if station:
+            start = request.args.get('start', '00:00')
+            end = request.args.get('end', '23:59')
+            departures = system.get_departures_between(line_id, station, start, end,
+                                                       request.args.get('direction'), date)
+            return jsonify({
+                'success': True,
+                'line_id': line_id,
+                'station': station,
+                'departures': departures
+            })
+        
+        departure_times = system.get_departure_times(line_id, date)
         return jsonify({
             'success': True,
             'line_id': line_id,
@@ -428,23 +583,37 @@ def get_departure_times(line_id):
 # 获取站点发车时间信息
 @app.route('/departure_time', methods=['GET'])
 def get_station_departure_time():
-    """获取指定线路指定站点的发车时间信息"""
+    """获取指定线路指定站点的发车时间信息
+    
+    提供after参数（HH:MM）时返回此后的下一班及后续count班（默认5班，最多MAX_NEXT_DEPARTURES班）发车时间，
+    否则返回最早发车时间。date参数（YYYY-MM-DD）选择该日期的时刻表。
+    """
     try:
         line_id = request.args.get('line_id')
         station = request.args.get('station')
+        after = request.args.get('after')
+        date = request.args.get('date')
         
         if not line_id or not station:
             return jsonify({'success': False, 'message': '请提供线路ID和站点名称'}), 400
+        count = request.args.get('count', '5')
+        if not (count.isascii() and count.isdigit()) or not 1 <= int(count) <= MAX_NEXT_DEPARTURES:
+            return jsonify({'success': False,
+                            'message': f'班次数count应为1到{MAX_NEXT_DEPARTURES}之间的整数'}), 400
             
-        departure_time = system.get_station_departure_time(line_id, station)
+        departure_time = system.get_station_departure_time(line_id, station, after, date)
         
         if departure_time:
-            return jsonify({
+            response = {
                 'success': True,
                 'line_id': line_id,
                 'station': station,
                 'departure_time': departure_time
-            })
+            }
+            if after:
+                response['next_departures'] = system.get_next_departures(
+                    line_id, station, after, int(count), request.args.get('direction'), date)
+            return jsonify(response)
         else:
             return jsonify({
                 'success': False,
@@ -453,6 +622,134 @@ def get_station_departure_time():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
+# 查询两站之间的最少换乘次数
+@app.route('/min_transfers', methods=['GET'])
+def get_min_transfers():
+    """基于线路换乘次数表返回两站之间的最少换乘次数"""
+    start = request.args.get('start')
+    end = request.args.get('end')
+    
+    if not start or not end:
+        return jsonify({'success': False, 'message': '请提供起点和终点站'}), 400
+    
+    try:
+        min_transfers = system.get_min_transfers(start, end)
+        if min_transfers is None:
+            return jsonify({'success': False, 'message': f'{start}与{end}之间不连通'}), 404
+        return jsonify({
+            'success': True,
+            'start': start,
+            'end': end,
+            'min_transfers': min_transfers
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/isochrone', methods=['GET'])
+def get_isochrone():
+    """一次搜索返回从某站出发到各站的最短时间、换乘次数和距离，可选时间上限minutes"""
+    station = request.args.get('station')
+    if not station:
+        return jsonify({'success': False, 'message': '请提供出发站'}), 400
+    
+    minutes = request.args.get('minutes')
+    try:
+        minutes = float(minutes) if minutes else None
+    except ValueError:
+        return jsonify({'success': False, 'message': '时间上限应为数字（分钟）'}), 400
+    
+    try:
+        return jsonify(dict(system.get_isochrone(station, minutes), success=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """就绪探针：路网已加载时返回200，否则返回503"""
+    if not system.stations:
+        return jsonify({'ready': False}), 503
+    return jsonify({'ready': True, 'pid': os.getpid(), 'network_version': system.network_version,
+                    'stations': len(system.stations)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的监控指标：各路由的请求数和耗时、规划器搜索量和耗时、缓存命中率、索引重建次数和耗时"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def admin_only(handler):
+    """诊断接口只对携带管理员令牌（请求头X-Admin-Token或Authorization: Bearer）的请求开放，
+    未配置SUBWAY_ADMIN_TOKEN时返回404"""
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': '诊断接口未启用'}), 404
+        token = request.headers.get('X-Admin-Token', '')
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):]
+        if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': '需要管理员令牌'}), 403
+        return handler(*args, **kwargs)
+    return wrapper
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+@admin_only
+def debug_profile():
+    """按需cProfile分析
+    
+    POST开启分析：{"requests": N} 分析接下来的N个请求，{"seconds": S} 分析接下来S秒内开始的请求，
+    可选"path"只分析路径以此开头的请求（如"/query"）。
+    GET在分析完成后返回折叠调用栈（text/plain，可直接用于flamegraph.pl或speedscope），未完成时返回进度。
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            status = profiler.start(data.get('requests'), data.get('seconds'), data.get('path', '/'))
+        except ValueError as e:
+            status = profiler.status()
+            running = status is not None and not status['finished']
+            return jsonify({'error': str(e), 'status': status}), 409 if running else 400
+        return jsonify({'pid': os.getpid(), 'status': status}), 202
+    
+    stacks = profiler.collapsed()
+    if stacks is None:
+        status = profiler.status()
+        if status is None:
+            return jsonify({'error': '尚未开启分析，请先POST /debug/profile'}), 404
+        return jsonify({'pid': os.getpid(), 'status': status})
+    return Response(stacks, content_type='text/plain; charset=utf-8')
+
+@app.route('/debug/memory', methods=['GET', 'POST'])
+@admin_only
+def debug_memory():
+    """内存概况：站点、线路时刻表、等车时间表和缓存占用的内存，以及tracemalloc统计的分配量最大的代码位置
+    
+    GET参数top（默认20）和group（lineno或filename）控制tracemalloc统计；
+    POST {"action": "start", "frames": N} 开启tracemalloc跟踪，{"action": "stop"} 停止跟踪。
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        if action == 'start':
+            frames = data.get('frames', 1)
+            if isinstance(frames, bool) or not isinstance(frames, int) or not 1 <= frames <= 100:
+                return jsonify({'error': '调用栈深度frames应为1到100之间的整数'}), 400
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+        elif action == 'stop':
+            tracemalloc.stop()
+        else:
+            return jsonify({'error': 'action应为start或stop'}), 400
+        return jsonify({'pid': os.getpid(), 'tracing': tracemalloc.is_tracing()})
+    
+    try:
+        top = int(request.args.get('top', 20))
+        report = memory_report(system, top, request.args.get('group', 'lineno'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    report['pid'] = os.getpid()
+    return jsonify(report)
+
 @app.route('/stations', methods=['GET'])
 def get_stations():
     """获取所有站点信息"""
@@ -0,0 +1,265 @@
+# 规划器基准测试：在固定随机种子生成的起终点对上测量延迟、内存和搜索量，并与基线比较
+import argparse
+import heapq
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from services.subway_system import SubwaySystem
+
+DEFAULT_BASELINE = 'resources/benchmarks/baseline.json'
+DEFAULT_SEED = 20240601
+RING_LINES = ("2号线", "10号线")
+# 相对基线允许的最大增幅，超过即判定为性能退化
+DEFAULT_TOLERANCES = {
+    "p50_ms": 0.5,
+    "p95_ms": 0.5,
+    "expanded_mean": 0.05,
+    "peak_kib": 0.25,
+}
+# 延迟增加量低于该值（毫秒）时视为计时噪声
+MIN_LATENCY_DELTA_MS = 0.05
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法求百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def build_corpus(system: SubwaySystem, pairs: int, seed: int) -> Dict[str, List[Tuple[str, str]]]:
+    """生成固定的起终点对语料
+    
+    Args:
+        system: 地铁系统
+        pairs: 每类语料的起终点对数
+        seed: 随机种子，相同的种子和路网得到相同的语料
+    
+    Returns:
+        Dict[str, List[Tuple[start, end]]]: all为全路网随机站点对，long_haul为最短时间位于
+            前10%的长距离站点对，ring为同一环线上的站点对
+    """
+    rng = random.Random(seed)
+    names = list(system.stations)
+    corpus = {"all": [tuple(rng.sample(names, 2)) for _ in range(pairs)]}
+    
+    matrices = system.get_all_pairs()
+    reachable = sorted(value for value in matrices.time.ravel() if 0 < value < math.inf)
+    threshold = percentile(reachable, 90)
+    long_haul = [(matrices.stations[i], matrices.stations[j])
+                 for i, j in zip(*((matrices.time >= threshold) & (matrices.time < math.inf)).nonzero())]
+    corpus["long_haul"] = rng.sample(long_haul, min(pairs, len(long_haul)))
+    
+    ring_pairs = []
+    for line_id in RING_LINES:
+        if line_id in system.lines:
+            stations = system.lines[line_id].stations
+            ring_pairs.extend((a, b) for a in stations for b in stations if a != b)
+    corpus["ring"] = rng.sample(ring_pairs, min(pairs, len(ring_pairs)))
+    return corpus
+
+def measure(operation: Callable, arguments: List[tuple], planner) -> Dict[str, float]:
+    """逐个计时执行operation，再在tracemalloc下重复一遍统计内存峰值"""
+    expanded = planner.expanded_states
+    latencies = []
+    for args in arguments:
+        started = time.perf_counter()
+        operation(*args)
+        latencies.append((time.perf_counter() - started) * 1000)
+    expanded = planner.expanded_states - expanded
+    
+    tracemalloc.start()
+    for args in arguments:
+        operation(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    latencies.sort()
+    return {
+        "count": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+        "expanded_mean": expanded / len(latencies) if latencies else 0.0,
+        "peak_kib": peak / 1024,
+    }
+
+def measure_load(runs: int) -> Dict[str, float]:
+    """测量SubwaySystem的加载时间和内存峰值"""
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        SubwaySystem()
+        latencies.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    SubwaySystem()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies.sort()
+    return {
+        "count": runs,
+        "mean_ms": sum(latencies) / runs,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1],
+        "expanded_mean": 0.0,
+        "peak_kib": peak / 1024,
+    }
+
+def calibrate(runs: int = 5) -> float:
+    """测量一段固定的纯Python堆操作的耗时（毫秒，取最小值），用于抵消不同时段机器速度的差异"""
+    best = math.inf
+    for _ in range(runs):
+        started = time.perf_counter()
+        heap = []
+        for i in range(50000):
+            heapq.heappush(heap, (i * 7919) % 10007)
+        while heap:
+            heapq.heappop(heap)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+def best_of(rounds: List[Dict[str, float]]) -> Dict[str, float]:
+    """多轮测量中逐项取最小值，降低单轮的调度抖动对结果的影响"""
+    return {metric: min(result[metric] for result in rounds) for metric in rounds[0]}
+
+def run_benchmarks(pairs: int, seed: int, load_runs: int = 3, rounds: int = 3) -> Dict:
+    """在各类语料上测量find_shortest_time_path、find_least_transfers_path、
+    calculate_route_details以及SubwaySystem加载
+    
+    每轮测量使用新建的SubwaySystem，路线缓存和线路区段缓存从空开始，
+    各指标取rounds轮中的最小值。
+    
+    Returns:
+        Dict: 包含meta（语料参数和运行环境）和results {"操作/语料": 指标}
+    """
+    corpus = build_corpus(SubwaySystem(), pairs, seed)
+    calibration_ms = calibrate()
+    results = {"load": measure_load(load_runs)}
+    for name, od_pairs in corpus.items():
+        planners = [SubwaySystem().planner for _ in range(rounds)]
+        results[f"shortest_time/{name}"] = best_of(
+            [measure(planner.find_shortest_time_path, od_pairs, planner) for planner in planners])
+        
+        planners = [SubwaySystem().planner for _ in range(rounds)]
+        results[f"least_transfers/{name}"] = best_of(
+            [measure(planner.find_least_transfers_path, od_pairs, planner) for planner in planners])
+        
+        routes = []
+        for start, end in od_pairs:
+            path, _, lines = planners[0].find_shortest_time_path(start, end)
+            if path:
+                routes.append((path, lines))
+        planners = [SubwaySystem().planner for _ in range(rounds)]
+        results[f"route_details/{name}"] = best_of(
+            [measure(planner.calculate_route_details, routes, planner) for planner in planners])
+    return {
+        "meta": {
+            "pairs": pairs,
+            "seed": seed,
+            "rounds": rounds,
+            "calibration_ms": calibration_ms,
+            "corpus_sizes": {name: len(od_pairs) for name, od_pairs in corpus.items()},
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+def compare(results: Dict, baseline: Dict, tolerances: Dict[str, float]) -> List[str]:
+    """与基线比较，返回所有超出容差的指标说明
+    
+    延迟指标先按两次校准耗时之比折算到基线的机器速度，再与基线比较，
+    增加量不足MIN_LATENCY_DELTA_MS的不计。
+    """
+    speed = results["meta"]["calibration_ms"] / baseline["meta"]["calibration_ms"]
+    regressions = []
+    for key, baseline_metrics in baseline["results"].items():
+        metrics = results["results"].get(key)
+        if metrics is None:
+            regressions.append(f"{key}: 本次结果中缺少该项")
+            continue
+        for metric, tolerance in tolerances.items():
+            expected = baseline_metrics.get(metric)
+            if not expected:
+                continue
+            actual = metrics[metric] / speed if metric.endswith("_ms") else metrics[metric]
+            if metric.endswith("_ms") and actual - expected < MIN_LATENCY_DELTA_MS:
+                continue
+            if actual > expected * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {actual:.3f} > 基线 {expected:.3f}"
+                                   f"（+{(actual / expected - 1) * 100:.0f}%，容差 {tolerance * 100:.0f}%）")
+    return regressions
+
+def print_report(results: Dict, baseline: Dict = None):
+    """以表格形式输出结果，有基线时附上p95相对基线的变化"""
+    print(f"校准耗时 {results['meta']['calibration_ms']:.2f} ms")
+    header = f"{'项目':<28}{'次数':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'扩展状态':>10}{'内存KiB':>10}"
+    print(header)
+    for key, metrics in results["results"].items():
+        line = (f"{key:<30}{metrics['count']:>6}{metrics['p50_ms']:>9.3f}{metrics['p95_ms']:>9.3f}"
+                f"{metrics['p99_ms']:>9.3f}{metrics['max_ms']:>9.3f}{metrics['expanded_mean']:>12.1f}"
+                f"{metrics['peak_kib']:>11.1f}")
+        previous = (baseline or {}).get("results", {}).get(key)
+        if previous and previous.get("p95_ms"):
+            line += f"  p95 {(metrics['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="规划器基准测试（延迟单位为毫秒）")
+    parser.add_argument('--pairs', type=int, default=300, help="每类语料的起终点对数")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="生成语料的随机种子")
+    parser.add_argument('--load-runs', type=int, default=3, help="测量加载时间的次数")
+    parser.add_argument('--rounds', type=int, default=3, help="每项重复测量的轮数，各指标取最小值")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument('--update-baseline', action='store_true', help="用本次结果覆盖基线文件")
+    parser.add_argument('--output', help="把本次结果写入该JSON文件")
+    for metric, tolerance in DEFAULT_TOLERANCES.items():
+        parser.add_argument(f"--tolerance-{metric.replace('_', '-')}", type=float, default=tolerance,
+                            dest=f"tolerance_{metric}", help=f"{metric}相对基线允许的增幅")
+    args = parser.parse_args(argv)
+    
+    results = run_benchmarks(args.pairs, args.seed, args.load_runs, args.rounds)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n已更新基线: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\n基线文件 {args.baseline} 不存在，使用 --update-baseline 生成")
+        return 0
+    meta = baseline["meta"]
+    if (meta["pairs"], meta["seed"], meta.get("rounds")) != (args.pairs, args.seed, args.rounds):
+        print("\n语料参数与基线不同，不做比较")
+        return 0
+    
+    tolerances = {metric: getattr(args, f"tolerance_{metric}") for metric in DEFAULT_TOLERANCES}
+    regressions = compare(results, baseline, tolerances)
+    if regressions:
+        print("\n!!! 性能退化 !!!")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\n与基线相比没有性能退化")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+# HTTP压测工具：按接近真实使用情况的请求比例并发访问本地运行的app.py，统计各接口的吞吐量、延迟和错误率
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_URL = 'http://127.0.0.1:5000'
+DEFAULT_SEED = 20240601
+# 各类操作的相对权重
+DEFAULT_MIX = {
+    "query_time": 35,
+    "query_transfers": 25,
+    "departure_times": 15,
+    "stations": 10,
+    "get_subway_data": 10,
+    "edit": 1,
+}
+# 环线不能从端点延长
+RING_LINES = ("2号线", "10号线")
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法求百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class LoadClient:
+    """向被测服务发送请求并记录每个请求的接口、延迟和是否出错"""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        """初始化客户端
+        
+        Args:
+            base_url: 被测服务地址，例如 http://127.0.0.1:5000
+            timeout: 单个请求的超时时间（秒）
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.records: List[Tuple[str, float, bool]] = []  # (接口, 延迟毫秒, 是否出错)
+        self.errors: Dict[str, str] = {}  # 各接口最近一次的错误信息
+        self._lock = threading.Lock()
+
+    def request(self, endpoint: str, method: str, path: str, body: Optional[dict] = None) -> Optional[object]:
+        """发送一个请求并记录结果
+        
+        Args:
+            endpoint: 统计时使用的接口名称
+            method: HTTP方法
+            path: 请求路径（含查询参数）
+            body: POST请求的JSON内容
+        
+        Returns:
+            解析后的JSON响应，请求出错时为None
+        """
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'} if data else {})
+        started = time.perf_counter()
+        error = None
+        result = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                result = json.loads(response.read().decode('utf-8'))
+            # 编辑和时刻表接口失败时仍返回200，以success字段表示
+            if isinstance(result, dict) and result.get('success') is False:
+                error = result.get('message', '请求失败')
+        except urllib.error.HTTPError as e:
+            error = f"HTTP {e.code}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.records.append((endpoint, latency, error is not None))
+            if error is not None:
+                self.errors[endpoint] = error
+        return None if error is not None else result
+
+class Workload:
+    """按权重随机生成请求，编辑操作成对进行（延长线路后再删除新站点），压测结束后路网保持不变"""
+
+    def __init__(self, client: LoadClient, mix: Dict[str, int]):
+        """从被测服务获取站点和线路，作为生成请求的素材
+        
+        Args:
+            client: 压测客户端
+            mix: 各类操作的相对权重
+        
+        Raises:
+            ValueError: 无法从被测服务获取路网数据
+        """
+        self.client = client
+        self.operations = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.operations]
+        lines = client.request("setup", "GET", "/get_subway_data")
+        if not lines:
+            raise ValueError(f"无法从 {client.base_url} 获取路网数据：{client.errors.get('setup')}")
+        self.lines = lines
+        self.stations = sorted({station for line in lines.values() for station in line['stations']})
+        self.extendable = [line_id for line_id, line in lines.items()
+                           if line_id not in RING_LINES and len(line['stations']) >= 2]
+        self._edit_lock = threading.Lock()
+        self._edit_count = 0
+
+    def run_one(self, rng: random.Random):
+        """随机执行一次操作"""
+        operation = rng.choices(self.operations, self.weights)[0]
+        getattr(self, f"_{operation}")(rng)
+
+    def _query_time(self, rng: random.Random):
+        start, end = rng.sample(self.stations, 2)
+        body = {"start": start, "end": end, "mode": "time"}
+        if rng.random() < 0.1:
+            body["k"] = 3
+        self.client.request("query_time", "POST", "/query", body)
+
+    def _query_transfers(self, rng: random.Random):
+        start, end = rng.sample(self.stations, 2)
+        self.client.request("query_transfers", "POST", "/query", {"start": start, "end": end, "mode": "transfers"})
+
+    def _departure_times(self, rng: random.Random):
+        line_id = rng.choice(list(self.lines))
+        path = f"/departure_times/{urllib.parse.quote(line_id)}"
+        if rng.random() < 0.5:
+            station = self.lines[line_id]['stations'][0]
+            hour = rng.randint(6, 21)
+            path += "?" + urllib.parse.urlencode({"station": station, "start": f"{hour:02d}:00",
+                                                  "end": f"{hour + 1:02d}:00"})
+        self.client.request("departure_times", "GET", path)
+
+    def _stations(self, rng: random.Random):
+        self.client.request("stations", "GET", "/stations")
+
+    def _get_subway_data(self, rng: random.Random):
+        self.client.request("get_subway_data", "GET", "/get_subway_data")
+
+    def _edit(self, rng: random.Random):
+        # 编辑依赖线路端点，串行进行以免并发的延长相互冲突
+        if not self.extendable:
+            return
+        with self._edit_lock:
+            self._edit_count += 1
+            line_id = rng.choice(self.extendable)
+            terminal = self.lines[line_id]['stations'][-1]
+            new_station = f"压测站{self._edit_count}"
+            extended = self.client.request("edit_extend_line", "POST", "/edit/extend_line", {
+                "line_id": line_id, "terminal_station": terminal,
+                "new_station": new_station, "distance": rng.randint(800, 2500)})
+            if extended is not None:
+                self.client.request("edit_remove_station", "POST", "/edit/remove_station",
+                                    {"station": new_station})
+
+def run_load(base_url: str, concurrency: int, duration: float = None, total: int = None,
+             mix: Dict[str, int] = None, seed: int = DEFAULT_SEED, timeout: float = 30) -> Dict:
+    """以固定并发数压测被测服务
+    
+    Args:
+        base_url: 被测服务地址
+        concurrency: 并发的客户端线程数
+        duration: 压测持续时间（秒），与total至少提供一个
+        total: 总操作数（一次编辑操作包含两个请求）
+        mix: 各类操作的相对权重，默认为DEFAULT_MIX
+        seed: 随机种子，第i个线程使用seed + i
+        timeout: 单个请求的超时时间（秒）
+    
+    Returns:
+        Dict: summarize的统计结果
+    
+    Raises:
+        ValueError: 参数无效或无法获取路网数据
+    """
+    if concurrency < 1:
+        raise ValueError("并发数必须为正整数")
+    if duration is None and total is None:
+        raise ValueError("必须指定压测时间或总操作数")
+    client = LoadClient(base_url, timeout)
+    workload = Workload(client, mix or DEFAULT_MIX)
+    client.records.clear()
+    
+    remaining = [total]
+    counter_lock = threading.Lock()
+
+    def worker(index: int, deadline: float):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            if total is not None:
+                with counter_lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            workload.run_one(rng)
+    
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else math.inf
+    threads = [threading.Thread(target=worker, args=(i, deadline), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(client.records, elapsed, concurrency, client.errors)
+
+def summarize(records: List[Tuple[str, float, bool]], elapsed: float, concurrency: int,
+              errors: Dict[str, str] = None) -> Dict:
+    """按接口统计吞吐量、延迟百分位数和错误率
+    
+    Args:
+        records: (接口, 延迟毫秒, 是否出错) 列表
+        elapsed: 压测总时长（秒）
+        concurrency: 并发数
+        errors: 各接口最近一次的错误信息
+    
+    Returns:
+        Dict: 包含elapsed_s、concurrency、endpoints {接口: 指标} 和 total（全部请求的指标）
+    """
+    groups = defaultdict(list)
+    for endpoint, latency, failed in records:
+        groups[endpoint].append((latency, failed))
+    groups["total"] = [(latency, failed) for _, latency, failed in records]
+    
+    stats = {}
+    for endpoint, samples in groups.items():
+        latencies = sorted(latency for latency, _ in samples)
+        failures = sum(failed for _, failed in samples)
+        stats[endpoint] = {
+            "requests": len(samples),
+            "errors": failures,
+            "error_rate": failures / len(samples) if samples else 0.0,
+            "rps": len(samples) / elapsed if elapsed > 0 else 0.0,
+            "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p90_ms": percentile(latencies, 90),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+        }
+    return {
+        "elapsed_s": elapsed,
+        "concurrency": concurrency,
+        "endpoints": {name: stats[name] for name in sorted(stats) if name != "total"},
+        "total": stats["total"],
+        "last_errors": dict(errors or {}),
+    }
+
+def print_report(summary: Dict):
+    """以表格形式输出压测结果"""
+    print(f"并发 {summary['concurrency']}，用时 {summary['elapsed_s']:.1f} 秒")
+    print(f"{'接口':<22}{'请求数':>6}{'错误率':>8}{'吞吐/s':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    rows = list(summary["endpoints"].items()) + [("total", summary["total"])]
+    for name, metrics in rows:
+        print(f"{name:<24}{metrics['requests']:>9}{metrics['error_rate'] * 100:>10.1f}%"
+              f"{metrics['rps']:>11.1f}{metrics['p50_ms']:>9.1f}{metrics['p90_ms']:>9.1f}"
+              f"{metrics['p99_ms']:>9.1f}{metrics['max_ms']:>9.1f}")
+    for name, message in summary["last_errors"].items():
+        print(f"  {name} 最近一次错误: {message}")
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """解析形如 query_time=35,edit=0 的权重设置，未提及的操作沿用默认权重
+    
+    Raises:
+        ValueError: 操作名称未知或权重不是非负整数
+    """
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"未知的操作 {name}，可选：{', '.join(DEFAULT_MIX)}")
+        if not weight.isdigit():
+            raise ValueError(f"操作 {name} 的权重应为非负整数")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("至少一种操作的权重应大于0")
+    return mix
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="北京地铁线路查询系统HTTP压测（延迟单位为毫秒）")
+    parser.add_argument('--url', default=DEFAULT_URL, help="被测服务地址")
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help="并发的客户端线程数")
+    parser.add_argument('--duration', '-d', type=float, help="压测持续时间（秒），默认30秒")
+    parser.add_argument('--requests', '-n', type=int, help="总操作数，指定后不再限制时间")
+    parser.add_argument('--mix', default='', help="各类操作的权重，例如 query_time=50,edit=0；"
+                                                 f"默认 {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument('--no-edits', action='store_true', help="不发送编辑请求（多进程部署时编辑只作用于单个工作进程）")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="随机种子")
+    parser.add_argument('--timeout', type=float, default=30, help="单个请求的超时时间（秒）")
+    parser.add_argument('--output', help="把统计结果写入该JSON文件")
+    args = parser.parse_args(argv)
+    
+    try:
+        mix = parse_mix(args.mix)
+        if args.no_edits:
+            mix["edit"] = 0
+        duration = args.duration if args.duration is not None or args.requests else 30
+        summary = run_load(args.url, args.concurrency, duration, args.requests, mix, args.seed, args.timeout)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 1 if summary["total"]["errors"] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
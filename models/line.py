@@ -1,13 +1,16 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
+import copy
+from models.timetable import Timetable, WEEKDAY, parse_time, format_time
 
 @dataclass
 class Line:
     line_id: str  # 线路编号
-    start_times: Dict[str, Dict[str, str]]  # 不同始发站的发车时间 {station_name: {time_id: time}}
+    timetables: Dict[str, Timetable]  # 各日期类型的发车时刻表 {day_type: Timetable}
     speed: float  # 线路速度（km/h）
     stations: List[str]  # 正向站点列表
     reverse_stations: List[str]  # 反向站点列表
+    directions: Dict[str, Tuple[str, str]]  # 运行方向 {direction: (起点站, 终点站)}
     
     def __init__(self, line_id: str, speed: float):
         """初始化线路
@@ -17,53 +20,106 @@ class Line:
         """
         self.line_id = line_id
         self.speed = speed / 2  # 将最高时速转换为平均速度
-        self.start_times = {}
+        self.timetables = {}
         self.stations = []
         self.reverse_stations = []
+        self.directions = {}
 
-    def add_start_time(self, station: str, time_id: str, time: str):
+    def get_timetable(self, day_type: str = WEEKDAY) -> Timetable:
+        """获取指定日期类型的发车时刻表，尚未加载时返回空时刻表"""
+        return self.timetables.get(day_type) or Timetable()
+
+    def set_timetable(self, day_type: str, timetable: Timetable):
+        """设置指定日期类型的发车时刻表"""
+        self.timetables[day_type] = timetable
+
+    def add_start_time(self, station: str, time: str, direction: str = "", day_type: str = WEEKDAY):
         """添加站点的发车时间
         
         Args:
-            station: 站点名称
-            time_id: 发车时间编号
+            station: 始发站名称
             time: 发车时间（格式：HH:MM）
+            direction: 运行方向（如"东行"、"内环"）
+            day_type: 日期类型（工作日、双休日）
+        """
+        self.timetables.setdefault(day_type, Timetable()).add(direction, station, parse_time(time))
+
+    def add_direction(self, direction: str, start_station, end_station):
+        """添加线路的运行方向
+        
+        Args:
+            direction: 方向名称
+            start_station: 该方向的起点站（环线可能为多个站点的列表）
+            end_station: 该方向的终点站（环线可能为多个站点的列表）
         """
-        if station not in self.start_times:
-            self.start_times[station] = {}
-        self.start_times[station][time_id] = time
+        self.directions[direction] = (start_station, end_station)
         
-    def get_start_times(self, station: str) -> Dict[str, str]:
+    def get_start_times(self, station: str, day_type: str = WEEKDAY) -> Dict[str, List[str]]:
         """获取指定站点的所有发车时间
         
         Args:
             station: 站点名称
+            day_type: 日期类型
             
         Returns:
-            Dict[str, str]: 发车时间字典 {time_id: time}，如果站点不存在则返回空字典
+            Dict[str, List[str]]: 各方向按时间排序的发车时间 {direction: [time, ...]}，如果站点不存在则返回空字典
         """
-        return self.start_times.get(station, {})
+        timetable = self.get_timetable(day_type)
+        return {direction: [format_time(minute) for minute in timetable.departures(direction, station)]
+                for direction in timetable.directions(station)}
         
-    def get_all_start_times(self) -> Dict[str, Dict[str, str]]:
+    def get_all_start_times(self, day_type: str = WEEKDAY) -> Dict[str, Dict[str, List[str]]]:
         """获取所有站点的发车时间
         
+        Args:
+            day_type: 日期类型
+            
         Returns:
-            Dict[str, Dict[str, str]]: 所有站点的发车时间字典
+            Dict[str, Dict[str, List[str]]]: 所有站点的发车时间字典 {station: {direction: [time, ...]}}
         """
-        return self.start_times.copy()
+        return {station: self.get_start_times(station, day_type)
+                for station in self.get_timetable(day_type).stations()}
 
-    def get_earliest_start_time(self, station: str) -> Optional[str]:
+    def get_earliest_start_time(self, station: str, day_type: str = WEEKDAY) -> Optional[str]:
         """获取指定站点的最早发车时间
         
         Args:
             station: 站点名称
+            day_type: 日期类型
             
         Returns:
             Optional[str]: 最早发车时间，如果站点不存在则返回None
         """
-        if station in self.start_times and self.start_times[station]:
-            return min(self.start_times[station].values())
-        return None
+        earliest = self.get_timetable(day_type).earliest(station)
+        return format_time(earliest) if earliest is not None else None
+
+    def get_start_time(self, station: str, after: Optional[str] = None, day_type: str = WEEKDAY) -> Optional[str]:
+        """获取指定站点在某时间之后（含）的下一班发车时间
+        
+        Args:
+            station: 站点名称
+            after: 起始时间（格式：HH:MM），为None时返回最早发车时间
+            day_type: 日期类型
+            
+        Returns:
+            Optional[str]: 下一班发车时间，没有后续车次时返回None
+        """
+        if after is None:
+            return self.get_earliest_start_time(station, day_type)
+        departures = self.get_timetable(day_type).next_departures(station, parse_time(after))
+        return format_time(departures[0][0]) if departures else None
+
+    def copy(self) -> 'Line':
+        """复制线路，站点列表和运行方向各自独立
+        
+        发车时刻表按日期类型整体替换而不会被编辑修改，新旧副本共用同一个时刻表字典，
+        按需加载的时刻表对所有副本同时可见。
+        """
+        line = copy.copy(self)
+        line.stations = list(self.stations)
+        line.reverse_stations = list(self.reverse_stations)
+        line.directions = dict(self.directions)
+        return line
 
     def set_stations(self, stations: List[str]):
         self.stations = stations
@@ -0,0 +1,63 @@
+from typing import List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+
+# 编辑操作的类型
+NODE_ADDED = "node_added"  # 在线路端点或换乘处新增站点
+EDGE_SPLIT = "edge_split"  # 在两个相邻站点之间插入站点
+EDGE_REMOVED = "edge_removed"  # 删除站点，两侧站点直接相连
+LINE_EXTENDED = "line_extended"  # 从终点站延长线路
+LINE_CREATED = "line_created"  # 创建新线路
+
+@dataclass
+class NetworkDelta:
+    """一次编辑操作对路网的结构化修改
+    
+    只记录发生变化的站点、区间和线路，规划器据此只更新受影响的邻接表项，
+    站点之间的距离和所属线路仍以Station对象中的数据为准。
+    """
+    kind: str  # 编辑类型
+    line_id: Optional[str] = None  # 被编辑的线路
+    added_stations: List[str] = field(default_factory=list)  # 新增的站点
+    removed_stations: List[str] = field(default_factory=list)  # 删除的站点
+    added_edges: List[Tuple[str, str]] = field(default_factory=list)  # 新增或距离改变的相邻站点对
+    removed_edges: List[Tuple[str, str]] = field(default_factory=list)  # 删除的相邻站点对
+    relined_stations: List[str] = field(default_factory=list)  # 所属线路发生变化的已有站点
+    added_lines: List[str] = field(default_factory=list)  # 新增的线路
+
+    @property
+    def touched_stations(self) -> Set[str]:
+        """自身的邻接关系或所属线路发生变化的所有站点"""
+        touched = set(self.added_stations) | set(self.removed_stations) | set(self.relined_stations)
+        for edge in self.added_edges + self.removed_edges:
+            touched.update(edge)
+        return touched
+
+    @classmethod
+    def edge_split(cls, line_id: str, prev_station: str, next_station: str, new_station: str,
+                   new_station_added: bool = True) -> 'NetworkDelta':
+        """在prev_station和next_station之间插入new_station"""
+        return cls(EDGE_SPLIT, line_id,
+                   added_stations=[new_station] if new_station_added else [],
+                   added_edges=[(prev_station, new_station), (new_station, next_station)],
+                   removed_edges=[(prev_station, next_station)],
+                   relined_stations=[] if new_station_added else [new_station])
+
+    @classmethod
+    def station_removed(cls, station: str, prev_station: str, next_station: str) -> 'NetworkDelta':
+        """删除station，其两侧站点直接相连"""
+        return cls(EDGE_REMOVED,
+                   removed_stations=[station],
+                   added_edges=[(prev_station, next_station)],
+                   removed_edges=[(prev_station, station), (station, next_station)])
+
+    @classmethod
+    def line_extended(cls, line_id: str, terminal_station: str, new_station: str) -> 'NetworkDelta':
+        """从terminal_station延长线路到new_station"""
+        return cls(LINE_EXTENDED, line_id,
+                   added_stations=[new_station],
+                   added_edges=[(terminal_station, new_station)])
+
+    @classmethod
+    def line_created(cls, line_id: str, station: str) -> 'NetworkDelta':
+        """以已有站点station为起点创建新线路"""
+        return cls(LINE_CREATED, line_id, relined_stations=[station], added_lines=[line_id])
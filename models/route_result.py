@@ -0,0 +1,21 @@
+from typing import List, Dict, Optional
+from dataclasses import dataclass, field
+
+@dataclass
+class RouteResult:
+    """一次路线查询的计算结果
+    
+    规划器只搜索一次，文本方案、地图详情和备选路线都从同一个结果渲染，
+    保证同一请求中的等车时间等数据保持一致。
+    """
+    start: str  # 起点站
+    end: str  # 终点站
+    mode: str  # 规划模式："time" 或 "transfers"
+    routes: List[Dict] = field(default_factory=list)  # 按时间排序的路线方案
+    error: Optional[str] = None  # 查询出错时的错误信息
+    optimal: bool = True  # 搜索预算用尽时为False，routes为目前找到的最好结果
+
+    @property
+    def best(self) -> Optional[Dict]:
+        """获取首选路线方案，没有可行路线时返回None"""
+        return self.routes[0] if self.routes else None
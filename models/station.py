@@ -1,5 +1,6 @@
 from typing import Dict, Set
 from dataclasses import dataclass
+import copy
 
 @dataclass
 class Station:
@@ -34,4 +35,11 @@ class Station:
     def remove_line(self, line: str):
         """从站点移除线路"""
         if line in self.lines:
-            self.lines.remove(line) 
\ No newline at end of file
+            self.lines.remove(line) 
+
+    def copy(self) -> 'Station':
+        """复制站点，线路集合和相邻站点表各自独立，其余属性（如经纬度）原样保留"""
+        station = copy.copy(self)
+        station.lines = set(self.lines)
+        station.adjacent_stations = dict(self.adjacent_stations)
+        return station
@@ -0,0 +1,156 @@
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
+from datetime import date, datetime
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+
+def parse_time(value: str) -> int:
+    """将"HH:MM"格式的时间转换为当天的分钟数"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+def format_time(minutes: float) -> str:
+    """将分钟数格式化为"HH:MM"（超过24点时继续累加小时数）"""
+    total = int(round(minutes))
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+WEEKDAY = "工作日"
+WEEKEND = "双休日"
+HOLIDAY = "节假日"
+
+def parse_date(value) -> date:
+    """将"YYYY-MM-DD"格式的字符串（或date对象）转换为date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+class ServiceCalendar:
+    """运营日历：根据日期确定日期类型及使用的时刻表
+    
+    周一至周五为工作日，周六周日为双休日；法定节假日按双休日时刻表运营，
+    调休上班的周末按工作日时刻表运营。
+    """
+    
+    # 没有单独时刻表的日期类型所使用的时刻表
+    TIMETABLE_DAY_TYPES = {HOLIDAY: WEEKEND}
+
+    def __init__(self, holidays: Iterable = (), workdays: Iterable = ()):
+        """初始化运营日历
+        
+        Args:
+            holidays: 法定节假日日期列表（"YYYY-MM-DD"或date）
+            workdays: 调休上班的周末日期列表（"YYYY-MM-DD"或date）
+        """
+        self.holidays = {parse_date(value) for value in holidays}
+        self.workdays = {parse_date(value) for value in workdays}
+
+    def day_type(self, value) -> str:
+        """获取日期类型（工作日、双休日或节假日）"""
+        day = parse_date(value)
+        if day in self.holidays:
+            return HOLIDAY
+        if day in self.workdays:
+            return WEEKDAY
+        return WEEKEND if day.weekday() >= 5 else WEEKDAY
+
+    def timetable_day_type(self, value) -> str:
+        """获取该日期使用的时刻表类型"""
+        day_type = self.day_type(value)
+        return self.TIMETABLE_DAY_TYPES.get(day_type, day_type)
+
+class Timetable:
+    """线路发车时刻表
+    
+    按(运行方向, 始发站)保存升序排列的发车时间，时间以当天分钟数存放在
+    紧凑的无符号短整型数组中（每个发车时间2字节），查询均使用二分查找。
+    """
+    
+    TYPECODE = 'H'
+
+    def __init__(self):
+        self._departures: Dict[Tuple[str, str], array] = {}  # {(direction, station): array}
+
+    def add(self, direction: str, station: str, minute: int):
+        """添加一个发车时间，保持数组有序"""
+        departures = self._departures.setdefault((direction, station), array(self.TYPECODE))
+        insort(departures, minute)
+
+    def extend(self, direction: str, station: str, minutes: Iterable[int]):
+        """批量添加发车时间（只排序一次）"""
+        key = (direction, station)
+        merged = sorted(list(self._departures.get(key, ())) + list(minutes))
+        self._departures[key] = array(self.TYPECODE, merged)
+
+    def departures(self, direction: str, station: str) -> array:
+        """获取某方向某始发站的全部发车时间（升序分钟数）"""
+        return self._departures.get((direction, station), array(self.TYPECODE))
+
+    def directions(self, station: str) -> List[str]:
+        """获取在该站有始发车次的运行方向"""
+        return [direction for direction, origin in self._departures if origin == station]
+
+    def stations(self) -> List[str]:
+        """获取所有有始发车次的站点"""
+        return list(dict.fromkeys(station for _, station in self._departures))
+
+    def items(self) -> Iterator[Tuple[Tuple[str, str], array]]:
+        """遍历((方向, 始发站), 发车时间数组)"""
+        return iter(self._departures.items())
+
+    def next_departures(self, station: str, after: int, count: int = 1,
+                        direction: Optional[str] = None) -> List[Tuple[int, str]]:
+        """查询某时间之后（含）的前count个发车时间
+        
+        Args:
+            station: 始发站
+            after: 起始时间（当天分钟数）
+            count: 返回的发车时间个数
+            direction: 运行方向，为None时合并所有方向
+        
+        Returns:
+            List[Tuple[int, str]]: 按时间升序的(发车时间, 方向)列表
+        """
+        candidates = []
+        for direction_name in self._select_directions(station, direction):
+            departures = self._departures[(direction_name, station)]
+            index = bisect_left(departures, after)
+            candidates.append([(minute, direction_name) for minute in departures[index:index + count]])
+        return list(merge(*candidates))[:count]
+
+    def departures_between(self, station: str, start: int, end: int,
+                           direction: Optional[str] = None) -> List[Tuple[int, str]]:
+        """查询时间区间[start, end]内的所有发车时间
+        
+        Args:
+            station: 始发站
+            start: 区间开始时间（当天分钟数）
+            end: 区间结束时间（当天分钟数）
+            direction: 运行方向，为None时合并所有方向
+        
+        Returns:
+            List[Tuple[int, str]]: 按时间升序的(发车时间, 方向)列表
+        """
+        candidates = []
+        for direction_name in self._select_directions(station, direction):
+            departures = self._departures[(direction_name, station)]
+            first = bisect_left(departures, start)
+            last = bisect_right(departures, end)
+            candidates.append([(minute, direction_name) for minute in departures[first:last]])
+        return list(merge(*candidates))
+
+    def earliest(self, station: str) -> Optional[int]:
+        """获取某站的最早发车时间"""
+        firsts = [departures[0] for (_, origin), departures in self._departures.items()
+                  if origin == station and departures]
+        return min(firsts) if firsts else None
+
+    def _select_directions(self, station: str, direction: Optional[str]) -> List[str]:
+        """确定要查询的方向"""
+        if direction is None:
+            return self.directions(station)
+        return [direction] if (direction, station) in self._departures else []
+
+    def __len__(self) -> int:
+        return sum(len(departures) for departures in self._departures.values())
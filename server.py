@@ -0,0 +1,223 @@
+# 生产环境服务入口：主进程加载一次路网，派生多个工作进程共享只读数据
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+class _RequestHandler(WSGIRequestHandler):
+    # 每个连接只处理一个请求，空闲的长连接不会占住线程池中的线程
+    protocol_version = "HTTP/1.0"
+
+class PooledWSGIServer(BaseWSGIServer):
+    """用固定大小的线程池处理请求的WSGI服务器"""
+    
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int, fd: int):
+        """在主进程已监听的套接字上创建服务器
+        
+        Args:
+            host: 监听地址
+            port: 监听端口
+            app: WSGI应用
+            threads: 线程池大小
+            fd: 已监听套接字的文件描述符
+        """
+        self.executor = None
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        """把连接交给线程池处理"""
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        """等待正在处理的请求完成后关闭"""
+        # 父类在使用已有套接字时会在创建线程池之前调用一次server_close
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        super().server_close()
+
+class PreforkServer:
+    """预派生（pre-fork）多进程服务器
+    
+    主进程导入应用（加载路网并预先构建搜索结构）后监听端口，再派生若干工作进程，
+    工作进程以写时复制方式共享主进程中的只读数据，各自用线程池处理请求。
+    主进程负责重启意外退出的工作进程，并处理以下信号：
+        SIGHUP: 平滑重载，重新加载路网后派生新的工作进程，再让旧进程处理完已接收的请求后退出
+        SIGTERM/SIGINT: 平滑关闭
+    编辑接口只修改处理该请求的工作进程中的路网，多进程部署时路网数据应通过修改数据文件并重载来更新。
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 5000, workers: int = None, threads: int = 4,
+                 graceful_timeout: float = 30, backlog: int = 128):
+        """初始化服务器
+        
+        Args:
+            host: 监听地址
+            port: 监听端口
+            workers: 工作进程数，默认为CPU核数
+            threads: 每个工作进程的线程数
+            graceful_timeout: 平滑关闭时等待工作进程退出的最长秒数，超时后强制结束
+            backlog: 监听队列长度
+        """
+        if workers is not None and workers < 1 or threads < 1:
+            raise ValueError("工作进程数和线程数必须为正整数")
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.socket = None
+        self.children: Dict[int, int] = {}  # 当前一代工作进程 {pid: generation}
+        self.generation = 0  # 每次重载后递增
+        self._signals = []  # 主进程待处理的信号
+
+    def load_app(self):
+        """导入应用并预先构建只读结构，在派生工作进程前调用"""
+        import app as application
+        application.system.warm_up()
+        return application
+
+    def run(self):
+        """加载应用、监听端口并管理工作进程，直到收到关闭信号"""
+        application = self.load_app()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(self.backlog)
+        # 多个进程共同等待同一个套接字，未抢到连接的进程accept时立即返回而不是阻塞
+        self.socket.setblocking(False)
+        print(f"主进程 {os.getpid()} 监听 {self.host}:{self.port}，"
+              f"{self.workers} 个工作进程 × {self.threads} 个线程")
+        
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self._signals.append(signum))
+        
+        self._spawn_workers(application)
+        try:
+            while True:
+                while self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        application = self._reload(application)
+                    else:
+                        return
+                self._reap_workers(application)
+                time.sleep(0.2)
+        finally:
+            self._stop_workers(list(self.children))
+            self.socket.close()
+
+    def _spawn_workers(self, application):
+        """补齐当前一代的工作进程"""
+        # 冻结已有对象，避免工作进程的垃圾回收改写这些对象所在的内存页而破坏写时复制
+        gc.freeze()
+        while len(self.children) < self.workers:
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    self._run_worker(application.app)
+                except BaseException:
+                    import traceback
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    os._exit(code)
+            self.children[pid] = self.generation
+
+    def _run_worker(self, wsgi_app):
+        """工作进程：在共享的监听套接字上处理请求，收到SIGTERM后处理完已接收的请求再退出"""
+        server = PooledWSGIServer(self.host, self.port, wsgi_app, self.threads, self.socket.fileno())
+
+        def stop(signum, frame):
+            # shutdown会等待serve_forever退出，不能在同一线程中调用
+            threading.Thread(target=server.shutdown).start()
+        
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # 终端的Ctrl+C由主进程统一处理
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        # serve_forever退出时会调用server_close，等待线程池中的请求处理完毕
+        server.serve_forever()
+
+    def _reap_workers(self, application):
+        """回收已退出的工作进程并补齐"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if self.children.pop(pid, None) is not None:
+                print(f"工作进程 {pid} 意外退出（状态 {status}），重新派生")
+        self._spawn_workers(application)
+
+    def _reload(self, application):
+        """重新加载路网并替换全部工作进程，旧进程处理完已接收的请求后退出"""
+        print("收到SIGHUP，重新加载路网")
+        application.system.load_data()
+        application.system.warm_up()
+        old_workers = list(self.children)
+        self.children = {}
+        self.generation += 1
+        self._spawn_workers(application)
+        self._stop_workers(old_workers)
+        return application
+
+    def _stop_workers(self, pids):
+        """向工作进程发送SIGTERM并等待退出，超时后强制结束"""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    finished, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    finished = pid
+                if finished:
+                    remaining.discard(pid)
+            time.sleep(0.05)
+        for pid in remaining:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="北京地铁线路查询系统生产环境服务")
+    parser.add_argument('--host', default=os.environ.get('SUBWAY_HOST', '0.0.0.0'), help="监听地址")
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SUBWAY_PORT', 5000)), help="监听端口")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SUBWAY_WORKERS', 0)) or None,
+                        help="工作进程数，默认为CPU核数")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SUBWAY_THREADS', 4)),
+                        help="每个工作进程的线程数")
+    parser.add_argument('--graceful-timeout', type=float,
+                        default=float(os.environ.get('SUBWAY_GRACEFUL_TIMEOUT', 30)),
+                        help="平滑关闭时等待工作进程退出的最长秒数")
+    args = parser.parse_args()
+    
+    PreforkServer(args.host, args.port, args.workers, args.threads, args.graceful_timeout).run()
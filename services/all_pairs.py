@@ -0,0 +1,222 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import numpy as np
+from services.compiled_graph import CompiledGraph
+
+# 导出文件中各矩阵的文件名（不含扩展名）
+MATRIX_NAMES = ("time", "distance", "transfers", "fare")
+STATIONS_FILE = "stations.json"
+
+@dataclass
+class AllPairsMatrices:
+    """全路网站点两两之间的最短时间矩阵及对应路线的距离、换乘次数和票价
+    
+    第i行第j列为从stations[i]到stations[j]的结果。时间与最短时间查询一致（分钟，不含等车时间），
+    距离和换乘次数取自最短时间路线；不连通的站点对时间和距离为inf、换乘次数为-1、票价为nan。
+    """
+    stations: List[str]  # 行列对应的站点名称
+    time: np.ndarray  # 最短时间（分钟），float64
+    distance: np.ndarray  # 最短时间路线的距离（米），float64
+    transfers: np.ndarray  # 最短时间路线的换乘次数，int16
+    fare: np.ndarray  # 按距离计算的票价（元），float64
+
+    def index(self, station: str) -> int:
+        """站点在矩阵中的行列号"""
+        return self.stations.index(station)
+
+    def save(self, directory: str) -> List[str]:
+        """将各矩阵分别导出为.npy文件，站点顺序写入stations.json
+        
+        Args:
+            directory: 输出目录，不存在时自动创建
+        
+        Returns:
+            List[str]: 写入的文件路径
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name in MATRIX_NAMES:
+            path = os.path.join(directory, f"{name}.npy")
+            np.save(path, getattr(self, name))
+            paths.append(path)
+        path = os.path.join(directory, STATIONS_FILE)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.stations, f, ensure_ascii=False)
+        paths.append(path)
+        return paths
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = None) -> 'AllPairsMatrices':
+        """读取save导出的矩阵
+        
+        Args:
+            directory: 导出目录
+            mmap_mode: 传给numpy.load，例如'r'表示以内存映射方式只读打开
+        """
+        with open(os.path.join(directory, STATIONS_FILE), encoding='utf-8') as f:
+            stations = json.load(f)
+        matrices = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                    for name in MATRIX_NAMES}
+        return cls(stations, **matrices)
+
+class _StateGraph:
+    """紧凑路网图上（站点, 线路）状态之间的转移，按到达状态分组并补齐为定长数组
+    
+    只保留有车进站的状态。从状态(u, L)沿u的出边e前往(v, L')的代价为u的停站时间
+    加行驶时间，L'与L不同时再加u的换乘时间并计一次换乘。
+    """
+
+    def __init__(self, graph: CompiledGraph):
+        edge_states = np.frombuffer(graph.edge_states, dtype=np.uint32).astype(np.int64)
+        offsets = np.frombuffer(graph.offsets, dtype=np.uint32).astype(np.int64)
+        edge_lines = np.frombuffer(graph.edge_lines, dtype=np.uint16).astype(np.int64)
+        travel_times = np.frombuffer(graph.travel_times, dtype=np.float64)
+        distances = np.frombuffer(graph.distances, dtype=np.float64)
+        stop_times = np.frombuffer(graph.stop_times, dtype=np.float64)
+        transfer_times = np.frombuffer(graph.transfer_times, dtype=np.float64)
+        station_count = graph.station_count
+        
+        # 状态的紧凑编号
+        states, edge_state_index = np.unique(edge_states, return_inverse=True)
+        state_stations = states // graph.state_width
+        state_lines = states % graph.state_width
+        self.state_count = len(states)
+        
+        # 各条边的起点站，以及起点站出发时直接上车的初始状态
+        out_degree = np.diff(offsets)
+        self.edge_sources = np.repeat(np.arange(station_count), out_degree)
+        self.edge_targets = edge_state_index
+        self.edge_times = travel_times
+        self.edge_distances = distances
+        
+        # 状态之间的转移：每个状态 × 所在站点的每条出边
+        state_degree = out_degree[state_stations]
+        transition_from = np.repeat(np.arange(self.state_count), state_degree)
+        transition_edges = _concat_ranges(offsets[state_stations], state_degree)
+        stations = state_stations[transition_from]
+        is_transfer = edge_lines[transition_edges] != state_lines[transition_from]
+        transition_to = edge_state_index[transition_edges]
+        transition_costs = (stop_times[stations] + travel_times[transition_edges]
+                            + np.where(is_transfer, transfer_times[stations], 0.0))
+        
+        # 按到达状态分组，补齐为 [state_count, width] 的定长数组，补齐位置代价为inf
+        order = np.argsort(transition_to, kind='stable')
+        transition_to = transition_to[order]
+        in_degree = np.bincount(transition_to, minlength=self.state_count)
+        width = max(int(in_degree.max()) if len(in_degree) else 0, 1)
+        slots = _concat_ranges(np.zeros_like(in_degree), in_degree)
+        self.in_states = np.zeros((self.state_count, width), dtype=np.int64)
+        self.in_costs = np.full((self.state_count, width), np.inf)
+        self.in_distances = np.zeros((self.state_count, width))
+        self.in_transfers = np.zeros((self.state_count, width), dtype=np.int16)
+        self.in_states[transition_to, slots] = transition_from[order]
+        self.in_costs[transition_to, slots] = transition_costs[order]
+        self.in_distances[transition_to, slots] = distances[transition_edges[order]]
+        self.in_transfers[transition_to, slots] = is_transfer[order]
+        
+        # 每个站点的到达状态，同样补齐为定长数组，补齐位置指向额外的inf列
+        counts = np.bincount(state_stations, minlength=station_count)
+        width = max(int(counts.max()) if len(counts) else 0, 1)
+        slots = _concat_ranges(np.zeros_like(counts), counts)
+        self.station_states = np.full((station_count, width), self.state_count, dtype=np.int64)
+        self.station_states[state_stations, slots] = np.arange(self.state_count)
+
+def _concat_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """依次拼接 range(starts[i], starts[i] + counts[i])"""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts - starts, counts)
+
+def compute_all_pairs(graph: CompiledGraph, fare: Callable[[np.ndarray], np.ndarray],
+                      chunk_size: int = 256) -> AllPairsMatrices:
+    """用向量化的Bellman-Ford松弛求全路网两两最短时间
+    
+    一批起点的状态代价组成一个矩阵，每轮对所有状态同时用其所有前驱状态松弛，
+    改进某个状态时一并更新该路线的距离和换乘次数，直到没有任何起点再被改进。
+    代价模型与规划器的最短时间搜索相同，起点上车不计停站和换乘时间。
+    
+    Args:
+        graph: 规划器编译的紧凑路网图
+        fare: 按距离矩阵计算票价矩阵的函数
+        chunk_size: 每批同时计算的起点数，用于限制中间数组占用的内存
+    
+    Returns:
+        AllPairsMatrices: 全路网的时间、距离、换乘次数和票价矩阵
+    """
+    states = _StateGraph(graph)
+    station_count = graph.station_count
+    time = np.full((station_count, station_count), np.inf)
+    distance = np.full((station_count, station_count), np.inf)
+    transfers = np.full((station_count, station_count), -1, dtype=np.int16)
+    state_index = np.arange(states.state_count)[None, :]
+    
+    for first in range(0, station_count, chunk_size):
+        sources = np.arange(first, min(first + chunk_size, station_count))
+        rows = len(sources)
+        # 多出的一列恒为inf，供站点状态表中的补齐位置使用
+        cost = np.full((rows, states.state_count + 1), np.inf)
+        dist = np.zeros((rows, states.state_count + 1))
+        hops = np.zeros((rows, states.state_count + 1), dtype=np.int16)
+        
+        # 从起点沿出边直接上车
+        mask = (states.edge_sources >= first) & (states.edge_sources < first + rows)
+        edge_rows = states.edge_sources[mask] - first
+        edge_targets = states.edge_targets[mask]
+        cost[edge_rows, edge_targets] = states.edge_times[mask]
+        dist[edge_rows, edge_targets] = states.edge_distances[mask]
+        
+        active = np.arange(rows)
+        while len(active):
+            current = cost[active]
+            candidates = current[:, states.in_states] + states.in_costs
+            choice = candidates.argmin(axis=2)[..., None]
+            best = np.take_along_axis(candidates, choice, axis=2)[..., 0]
+            improved = best < current[:, :-1]
+            if not improved.any():
+                break
+            choice = choice[..., 0]
+            previous = states.in_states[state_index, choice]
+            row_index = np.arange(len(active))[:, None]
+            new_dist = dist[active][row_index, previous] + states.in_distances[state_index, choice]
+            new_hops = hops[active][row_index, previous] + states.in_transfers[state_index, choice]
+            row, column = np.nonzero(improved)
+            cost[active[row], column] = best[row, column]
+            dist[active[row], column] = new_dist[row, column]
+            hops[active[row], column] = new_hops[row, column]
+            active = active[improved.any(axis=1)]
+        
+        # 每个终点站取代价最小的到达状态
+        station_costs = cost[:, states.station_states]
+        choice = station_costs.argmin(axis=2)
+        chosen = states.station_states[np.arange(station_count)[None, :], choice]
+        row_index = np.arange(rows)[:, None]
+        block = cost[row_index, chosen]
+        reachable = np.isfinite(block)
+        time[sources] = block
+        distance[sources] = np.where(reachable, dist[row_index, chosen], np.inf)
+        transfers[sources] = np.where(reachable, hops[row_index, chosen], -1)
+        # 起点到自身
+        time[sources, sources] = 0
+        distance[sources, sources] = 0
+        transfers[sources, sources] = 0
+    
+    fares = np.where(np.isfinite(distance), fare(distance), np.nan)
+    return AllPairsMatrices(list(graph.station_names), time, distance, transfers, fares)
+
+if __name__ == "__main__":
+    import argparse
+    import time as timer
+    from services.subway_system import SubwaySystem
+    
+    parser = argparse.ArgumentParser(description="离线计算全路网两两之间的最短时间、距离、换乘次数和票价矩阵")
+    parser.add_argument('--data-file', default='resources/data/line_speed_final.json', help="线路速度数据文件")
+    parser.add_argument('--output', default='resources/cache/all_pairs', help="矩阵输出目录")
+    args = parser.parse_args()
+    
+    system = SubwaySystem(args.data_file)
+    started = timer.perf_counter()
+    matrices = system.get_all_pairs()
+    print(f"已计算 {len(matrices.stations)} 个站点的全路网矩阵，用时 {timer.perf_counter() - started:.2f} 秒")
+    for path in matrices.save(args.output):
+        print(f"已导出: {path}")
@@ -0,0 +1,107 @@
+from typing import Dict, List, Tuple, Optional
+from array import array
+from models.station import Station
+from models.line import Line
+
+class CompiledGraph:
+    """只读的紧凑路网图（CSR格式）
+    
+    站点和线路名称映射为从0开始的整数编号，出边按起点站编号连续存放：
+    站点u的出边下标为 offsets[u] 到 offsets[u+1]，每条边在targets、edge_lines、
+    travel_times、distances中分别记录终点站编号、线路编号、预先算好的行驶时间和区间距离。
+    搜索只在整数和数组上进行，站点名称只在输入输出时转换。
+    """
+
+    def __init__(self, stations: Dict[str, Station], lines: Dict[str, Line],
+                 adjacency: Dict[str, List[Tuple[str, str, float]]]):
+        """由规划器的邻接表编译紧凑图
+        
+        Args:
+            stations: 站点字典
+            lines: 线路字典
+            adjacency: 规划器邻接表 {station: [(next_station, line, travel_time), ...]}
+        """
+        self.station_names: List[str] = list(stations)
+        self.station_ids: Dict[str, int] = {name: index for index, name in enumerate(self.station_names)}
+        self.line_names: List[str] = list(lines)
+        self.line_ids: Dict[str, int] = {line_id: index for index, line_id in enumerate(self.line_names)}
+        
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        self.edge_lines = array('H')
+        self.travel_times = array('d')
+        self.distances = array('d')
+        for name in self.station_names:
+            adjacent_stations = stations[name].adjacent_stations
+            for next_station, line_id, travel_time in adjacency.get(name, ()):
+                target = self.station_ids.get(next_station)
+                line_index = self.line_ids.get(line_id)
+                if target is None or line_index is None:
+                    continue
+                self.targets.append(target)
+                self.edge_lines.append(line_index)
+                self.travel_times.append(travel_time)
+                self.distances.append(adjacent_stations[next_station])
+            self.offsets.append(len(self.targets))
+        
+        # 搜索状态编号 = 站点编号 × state_width + 线路编号（线路编号为线路数时表示尚未乘车），
+        # 每条边预先记录到达状态的编号
+        self.state_width = len(self.line_names) + 1
+        self.edge_states = array('I', (target * self.state_width + line_index
+                                       for target, line_index in zip(self.targets, self.edge_lines)))
+        
+        self.stop_times = array('d', (stations[name].stop_time for name in self.station_names))
+        self.transfer_times = array('d', (stations[name].transfer_time for name in self.station_names))
+
+    @property
+    def station_count(self) -> int:
+        """站点数"""
+        return len(self.station_names)
+
+    @property
+    def line_count(self) -> int:
+        """线路数"""
+        return len(self.line_names)
+
+    @property
+    def edge_count(self) -> int:
+        """有向边数（共线区间按线路分别计数）"""
+        return len(self.targets)
+
+    @property
+    def nbytes(self) -> int:
+        """各数组缓冲区占用的字节数（不含名称映射表）"""
+        buffers = (self.offsets, self.targets, self.edge_lines, self.edge_states, self.travel_times,
+                   self.distances, self.stop_times, self.transfer_times)
+        return sum(buffer.itemsize * len(buffer) for buffer in buffers)
+
+    def edges(self, station: int) -> range:
+        """站点的出边下标范围"""
+        return range(self.offsets[station], self.offsets[station + 1])
+
+    def travel_time(self, station: int, next_station: int, line: int) -> Optional[float]:
+        """同一线路上两相邻站点之间的行驶时间，两站不相邻时返回None"""
+        for edge in range(self.offsets[station], self.offsets[station + 1]):
+            if self.targets[edge] == next_station and self.edge_lines[edge] == line:
+                return self.travel_times[edge]
+        return None
+
+    def line_adjacency(self, line_id: str) -> Dict[str, List[Tuple[str, float]]]:
+        """按名称给出某条线路的邻接表 {station: [(next_station, travel_time), ...]}
+        
+        供构建车次等非搜索用途，每次调用都重新生成。
+        """
+        adjacency = {}
+        line = self.line_ids.get(line_id)
+        if line is None:
+            return adjacency
+        for station, name in enumerate(self.station_names):
+            for edge in range(self.offsets[station], self.offsets[station + 1]):
+                if self.edge_lines[edge] == line:
+                    adjacency.setdefault(name, []).append((self.station_names[self.targets[edge]],
+                                                           self.travel_times[edge]))
+        return adjacency
+
+    def names(self, station_ids) -> List[str]:
+        """将站点编号序列转换为站点名称"""
+        return [self.station_names[station] for station in station_ids]
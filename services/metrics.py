@@ -0,0 +1,188 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+import math
+import threading
+
+# 请求处理耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 单次路线搜索耗时的分桶（秒）
+SEARCH_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+# 规划器索引重建耗时的分桶（秒）
+REBUILD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+class _Metric(ABC):
+    """指标基类：按标签值分组保存样本，输出Prometheus文本格式"""
+    
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _check_labels(self, labels: Tuple[str, ...]):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {', '.join(self.labelnames) or '（无）'}")
+
+    def _format_labels(self, labels: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """指标的所有样本行（不含HELP和TYPE）"""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        """计数增加amount，labels依次为各标签的值"""
+        self._check_labels(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(labels)} {_format_value(value)}" for labels, value in values]
+
+class Histogram(_Metric):
+    """按固定分桶统计观测值分布的直方图"""
+    
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # {标签值: [各分桶（不累计）的计数..., 超出最大分桶的计数, 观测值之和]}
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        """记录一个观测值，labels依次为各标签的值"""
+        self._check_labels(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labels: str) -> int:
+        counts = self._values.get(labels)
+        return int(sum(counts[:-1])) if counts else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        lines = []
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{self._format_labels(labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {_format_value(cumulative)}")
+        return lines
+
+class CallbackGauge(_Metric):
+    """在输出时调用回调函数取值的仪表，用于已由其他对象统计的数值（如缓存命中数）"""
+    
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Tuple[str, ...] = (), kind: str = "gauge"):
+        """初始化仪表
+        
+        Args:
+            callback: 返回 {标签值: 数值} 的函数，数值为None的样本不输出
+            kind: 输出的指标类型，回调返回累计计数时可设为"counter"
+        """
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(labels)} {_format_value(value)}"
+                for labels, value in sorted(self.callback().items()) if value is not None]
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序输出所有指标"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """注册指标，同名指标已存在时返回已注册的指标（模块被重复导入时不会重复注册）"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def get(self, name: str) -> _Metric:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """以Prometheus文本格式（0.0.4）输出所有指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# 进程内默认的指标注册表
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    """在默认注册表中创建（或取得已有的）计数器"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    """在默认注册表中创建（或取得已有的）直方图"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+class SearchCounters(threading.local):
+    """当前线程中规划器累计的搜索量，用差值得到单次查询的扩展状态数和枚举路线数
+    
+    各线程独立计数，并发查询之间互不干扰，增加计数时无需加锁。
+    """
+    expanded = 0  # 确定的状态数（或线路序列搜索的扩展次数）
+    paths = 0  # 枚举的候选路线数
+    segment_hits = 0  # 线路区段缓存命中次数
+    segment_misses = 0  # 线路区段缓存未命中次数
+
+SEARCH_COUNTERS = SearchCounters()
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,74 @@
+from typing import Dict, Set
+from dataclasses import dataclass
+from models.station import Station
+from models.line import Line
+from models.network_delta import NetworkDelta
+from services.subway_planner import SubwayPlanner
+
+class CopyOnWriteDict(dict):
+    """草稿使用的站点或线路字典：对象与上一版本共用，编辑第一次取出某个对象时才复制
+
+    编辑代码总是先从字典取出站点或线路再原地修改，因此只有被编辑触及的对象
+    （即路网增量中的站点和线路）会被复制。遍历和成员判断不复制；shared为True时
+    （规划器只读地更新索引时）取出的是共用的对象本身。
+    """
+
+    def __init__(self, base: Dict):
+        super().__init__(base)
+        self.owned: Set[str] = set()  # 已复制或新加入、归本版本所有的键
+        self.shared = False
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if self.shared or key in self.owned:
+            return value
+        value = value.copy()
+        super().__setitem__(key, value)
+        self.owned.add(key)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.owned.add(key)
+
+@dataclass
+class NetworkState:
+    """某一版本的完整路网：站点、线路以及在其上建好索引的规划器
+
+    发布后的版本视为只读，查询线程无需加锁即可读取。编辑先用copy_for_edit复制出
+    下一版本的草稿，所有修改都作用在草稿上，完成后由SubwaySystem以一次引用赋值整体发布，
+    查询线程要么看到编辑前的版本，要么看到编辑完成后的版本。
+    """
+    version: int  # 路网版本号
+    stations: Dict[str, Station]  # 站点名称到Station对象的映射
+    lines: Dict[str, Line]  # 线路名称到Line对象的映射
+    planner: SubwayPlanner  # 该版本路网的规划器
+    changed: bool = False  # 草稿是否已被修改（未修改的草稿不发布）
+
+    def copy_for_edit(self) -> 'NetworkState':
+        """复制出下一版本的草稿
+
+        只复制站点、线路字典和规划器索引字典本身，其中的站点、线路对象和索引项都与当前版本共用：
+        编辑取出某个站点或线路时才复制该对象，规划器按增量更新时也只复制受影响的索引项。
+        """
+        stations, lines = CopyOnWriteDict(self.stations), CopyOnWriteDict(self.lines)
+        return NetworkState(self.version + 1, stations, lines, self.planner.copy(stations, lines))
+
+    def apply_delta(self, delta: NetworkDelta):
+        """按编辑产生的增量更新草稿的规划器，规划器只读取站点和线路，期间不复制对象"""
+        drafts = [d for d in (self.stations, self.lines) if isinstance(d, CopyOnWriteDict)]
+        for draft in drafts:
+            draft.shared = True
+        try:
+            self.planner.apply_delta(delta)
+        finally:
+            for draft in drafts:
+                draft.shared = False
+
+    def seal(self):
+        """草稿编辑完成、即将发布：换回普通字典（对象不变），查询时取出站点和线路不再判断是否复制"""
+        self.stations, self.lines = dict(self.stations), dict(self.lines)
+        self.planner.use_network(self.stations, self.lines)
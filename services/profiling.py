@@ -0,0 +1,267 @@
+from typing import Dict, List, Optional
+from collections import defaultdict
+from dataclasses import dataclass, field
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+# 单次分析最多的请求数和最长时间（秒）
+MAX_PROFILE_REQUESTS = 1000
+MAX_PROFILE_SECONDS = 300
+
+@dataclass
+class ProfileSession:
+    """一次按需分析：对接下来的若干请求或一段时间内的请求做cProfile，结果累加在一起"""
+    requests: Optional[int]  # 分析的请求数上限
+    deadline: Optional[float]  # 分析截止时间（time.monotonic）
+    path_prefix: str  # 只分析路径以此开头的请求
+    started_at: float = field(default_factory=time.time)
+    profiled: int = 0  # 已完成分析的请求数
+    active: int = 0  # 正在分析的请求数
+    stats: Optional[pstats.Stats] = None  # 已完成请求的累计统计
+
+    def expired(self) -> bool:
+        """不再接受新的请求"""
+        if self.requests is not None and self.profiled + self.active >= self.requests:
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def finished(self) -> bool:
+        return self.active == 0 and self.expired()
+
+    def status(self) -> Dict:
+        return {
+            "finished": self.finished,
+            "profiled_requests": self.profiled,
+            "active_requests": self.active,
+            "requests": self.requests,
+            "seconds_left": max(0.0, self.deadline - time.monotonic()) if self.deadline is not None else None,
+            "path_prefix": self.path_prefix,
+            "started_at": self.started_at,
+        }
+
+class RequestProfiler:
+    """线上进程的按需cProfile分析
+    
+    start开启一次分析后，begin/end在请求处理线程中成对调用，为命中的请求单独开启一个Profile，
+    请求结束后合并到本次分析的累计统计。没有进行中的分析时begin只做一次属性检查。
+    同一时刻不能开启多个Profile的Python版本中，并发请求中只有一个会被分析。
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+
+    def start(self, requests: Optional[int] = None, seconds: Optional[float] = None,
+              path_prefix: str = "/") -> Dict:
+        """开启一次分析，替换已完成的上一次分析结果
+        
+        Args:
+            requests: 分析接下来的多少个请求
+            seconds: 分析接下来多少秒内开始的请求，与requests同时提供时先达到者为准
+            path_prefix: 只分析路径以此开头的请求
+        
+        Returns:
+            Dict: 本次分析的状态
+        
+        Raises:
+            ValueError: 参数无效，或上一次分析尚未完成
+        """
+        if requests is None and seconds is None:
+            raise ValueError("必须指定分析的请求数或时长")
+        if requests is not None and (isinstance(requests, bool) or not isinstance(requests, int)
+                                     or not 1 <= requests <= MAX_PROFILE_REQUESTS):
+            raise ValueError(f"分析的请求数应为1到{MAX_PROFILE_REQUESTS}之间的整数")
+        if seconds is not None and (isinstance(seconds, bool) or not isinstance(seconds, (int, float))
+                                    or not 0 < seconds <= MAX_PROFILE_SECONDS):
+            raise ValueError(f"分析时长应在0到{MAX_PROFILE_SECONDS}秒之间")
+        with self._lock:
+            if self.session is not None and not self.session.finished:
+                raise ValueError("上一次分析尚未完成")
+            deadline = time.monotonic() + seconds if seconds is not None else None
+            self.session = ProfileSession(requests, deadline, path_prefix or "/")
+            return self.session.status()
+
+    def begin(self, path: str) -> Optional[cProfile.Profile]:
+        """请求开始时调用，该请求需要分析时返回已开启的Profile"""
+        session = self.session
+        if session is None or not path.startswith(session.path_prefix):
+            return None
+        with self._lock:
+            if session is not self.session or session.expired():
+                return None
+            session.active += 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 其他线程的Profile仍在运行（Python 3.12起同一时刻只能有一个）
+            with self._lock:
+                session.active -= 1
+            return None
+        profile.session = session
+        return profile
+
+    def end(self, profile: cProfile.Profile):
+        """请求结束时调用，关闭Profile并合并统计"""
+        profile.disable()
+        session = profile.session
+        stats = pstats.Stats(profile)
+        with self._lock:
+            if session.stats is None:
+                session.stats = stats
+            else:
+                session.stats.add(stats)
+            session.active -= 1
+            session.profiled += 1
+
+    def status(self) -> Optional[Dict]:
+        session = self.session
+        return session.status() if session is not None else None
+
+    def collapsed(self) -> Optional[str]:
+        """已完成的分析结果，格式为火焰图工具（flamegraph.pl、speedscope等）使用的折叠调用栈
+        
+        Returns:
+            str: 每行“函数;函数;... 微秒数”，尚无已完成的分析时返回None
+        """
+        session = self.session
+        if session is None or not session.finished:
+            return None
+        if session.stats is None:
+            return ""
+        return "\n".join(collapsed_stacks(session.stats)) + "\n"
+
+def collapsed_stacks(stats: pstats.Stats, min_microseconds: float = 1) -> List[str]:
+    """把cProfile的调用关系展开为折叠调用栈
+    
+    cProfile只记录调用者到被调用者的边，因此从没有调用者的函数出发，按每条边占被调用函数
+    累计时间的比例向下分摊时间，栈上每个函数的自身时间按同样比例计入该调用栈。
+    递归调用在第二次出现时截断，时间不足min_microseconds的分支被省略。
+    
+    Args:
+        stats: 分析统计
+        min_microseconds: 保留的最小分支时间（微秒）
+    
+    Returns:
+        List[str]: “函数;函数;... 微秒数”，按调用栈排序
+    """
+    entries = stats.stats
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+    totals = defaultdict(float)
+    stack, on_stack = [], set()
+
+    def walk(func, seconds: float):
+        _, _, own_time, cumulative, _ = entries[func]
+        stack.append(_frame_label(func))
+        on_stack.add(func)
+        share = seconds / cumulative if cumulative > 0 else 0
+        totals[";".join(stack)] += own_time * share if cumulative > 0 else seconds
+        for callee, edge_time in children.get(func, ()):
+            branch = edge_time * share
+            if callee not in on_stack and callee in entries and branch * 1e6 >= min_microseconds:
+                walk(callee, branch)
+        on_stack.discard(func)
+        stack.pop()
+    
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 10000))
+    try:
+        for func, (_, _, _, cumulative, callers) in entries.items():
+            if not callers:
+                walk(func, cumulative)
+    finally:
+        sys.setrecursionlimit(limit)
+    return [f"{frames} {round(seconds * 1e6)}" for frames, seconds in sorted(totals.items())
+            if seconds * 1e6 >= min_microseconds]
+
+def _frame_label(func) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        label = name  # 内置函数
+    else:
+        path = os.path.relpath(filename) if os.path.isabs(filename) else filename
+        if path.startswith(".."):
+            path = os.path.join(*path.split(os.sep)[-2:])
+        label = f"{name} ({path}:{lineno})"
+    # 分号是折叠栈格式中栈帧之间的分隔符
+    return label.replace(";", ",")
+
+def deep_sizeof(obj, seen: set) -> int:
+    """对象及其引用的容器、实例属性占用的总字节数，seen中已计算过的对象不重复计算"""
+    total = 0
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            pending.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            pending.append(item.__dict__)
+    return total
+
+def memory_report(system, top: int = 20, group_by: str = "lineno") -> Dict:
+    """当前进程的内存概况
+    
+    objects按对象图统计当前路网版本中站点、线路时刻表、等车时间表和缓存占用的字节数
+    （count为对象数或字典条目数），不依赖tracemalloc；tracemalloc正在跟踪时另外给出分配量最大的代码位置。
+    跟踪只能记录开启之后的分配，需要覆盖路网加载时应在启动时设置环境变量PYTHONTRACEMALLOC=1。
+    
+    Args:
+        system: 地铁系统
+        top: 返回的代码位置数
+        group_by: tracemalloc统计的分组方式，"lineno"或"filename"
+    
+    Raises:
+        ValueError: 分组方式无效
+    """
+    if group_by not in ("lineno", "filename"):
+        raise ValueError("分组方式应为lineno或filename")
+    report = {"tracemalloc": {"tracing": tracemalloc.is_tracing()}}
+    if tracemalloc.is_tracing():
+        # 先取快照，统计对象大小本身产生的临时分配不计入
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        report["tracemalloc"].update({
+            "current_kib": current / 1024,
+            "peak_kib": peak / 1024,
+            "top": [{"location": str(stat.traceback[0]), "size_kib": stat.size / 1024, "count": stat.count}
+                    for stat in snapshot.statistics(group_by)[:top]],
+        })
+    
+    state = system.state
+    planner = state.planner
+    categories = {
+        "stations": list(state.stations.values()),
+        "line_timetables": [line.timetables for line in state.lines.values()],
+        "wait_times": [planner.wait_times],
+        "segment_cache": [planner.segment_cache],
+        "route_cache": [dict(system.route_cache.items())],
+    }
+    objects = {}
+    for name, values in categories.items():
+        # 站点名等字符串在多处共用，各类别内部去重，类别之间不去重
+        seen = set()
+        objects[name] = {"count": sum(len(value) if isinstance(value, dict) else 1 for value in values),
+                         "size_kib": sum(deep_sizeof(value, seen) for value in values) / 1024}
+    
+    report["network_version"] = state.version
+    report["objects"] = objects
+    return report
@@ -0,0 +1,85 @@
+from typing import Dict, Hashable, Optional
+from collections import OrderedDict
+import threading
+
+class RouteCache:
+    """有容量上限的LRU路线缓存
+    
+    键中包含路网版本号，路网被编辑后旧版本的条目不会再被命中；
+    同时统计命中、未命中和淘汰次数，便于评估缓存容量是否合适。
+    """
+    
+    def __init__(self, maxsize: int = 1024):
+        """初始化缓存
+        
+        Args:
+            maxsize: 最多缓存的条目数，为0时不缓存
+        """
+        if maxsize < 0:
+            raise ValueError("缓存容量不能为负数")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable):
+        """查找缓存条目，命中时将其移到最近使用的位置
+        
+        Returns:
+            缓存的值，未命中时返回None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, value) -> None:
+        """写入缓存条目，超出容量时淘汰最久未使用的条目"""
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """清空所有条目（统计计数保留）"""
+        with self._lock:
+            self._entries.clear()
+    
+    def resize(self, maxsize: int) -> None:
+        """调整缓存容量，缩小时立即淘汰多余条目"""
+        if maxsize < 0:
+            raise ValueError("缓存容量不能为负数")
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def items(self):
+        """当前所有条目 [(键, 值)]，按最久未使用到最近使用排列"""
+        with self._lock:
+            return list(self._entries.items())
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Optional[float]]:
+        """获取缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else None
+        }
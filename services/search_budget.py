@@ -0,0 +1,50 @@
+from typing import Optional
+import time
+
+class SearchBudget:
+    """单次查询的搜索预算：扩展状态数和耗时的上限
+    
+    规划器在扩展状态时调用spend，预算用尽后各层搜索尽快停止，
+    返回到目前为止找到的最好结果，调用方通过exhausted判断结果是否可能不是最优。
+    """
+    
+    # 每扩展这么多个状态才读取一次时钟
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, max_expansions: Optional[int] = None, max_ms: Optional[float] = None):
+        """初始化预算
+        
+        Args:
+            max_expansions: 最多扩展的状态数，为None时不限制
+            max_ms: 最长搜索时间（毫秒），从创建预算时开始计时，为None时不限制
+        
+        Raises:
+            ValueError: 上限不是正数
+        """
+        if max_expansions is not None and max_expansions <= 0:
+            raise ValueError("搜索的扩展状态数上限必须为正数")
+        if max_ms is not None and max_ms <= 0:
+            raise ValueError("搜索的耗时上限必须为正数")
+        self.max_expansions = max_expansions
+        self.deadline = time.perf_counter() + max_ms / 1000 if max_ms is not None else None
+        self.expansions = 0  # 已扩展的状态数
+        self.exhausted = False  # 预算是否已用尽
+        self._until_clock = self.CLOCK_INTERVAL
+
+    def spend(self, count: int = 1) -> bool:
+        """记录扩展的状态数
+        
+        Returns:
+            bool: 预算仍有剩余时为True，用尽后为False
+        """
+        if self.exhausted:
+            return False
+        self.expansions += count
+        if self.max_expansions is not None and self.expansions > self.max_expansions:
+            self.exhausted = True
+        elif self.deadline is not None:
+            self._until_clock -= count
+            if self._until_clock <= 0:
+                self._until_clock = self.CLOCK_INTERVAL
+                self.exhausted = time.perf_counter() > self.deadline
+        return not self.exhausted
@@ -0,0 +1,118 @@
+from typing import List, Tuple
+from array import array
+from services.compiled_graph import CompiledGraph
+
+class SkeletonGraph:
+    """收缩后的换乘骨架图
+    
+    大多数站点只属于一条线路且恰好有两个相邻站点，列车经过时只会停站，
+    不可能换乘或折返。骨架图只保留换乘站、线路端点等其余站点，
+    两个骨架站点之间的一段线路收缩为一条边，边的代价为区间行驶时间与
+    途经站点停站时间之和，并记录途经的站点以便还原完整路径。
+    查询时把起点和终点沿所在区段连接到两侧的骨架站点，只在骨架图上搜索。
+    """
+
+    def __init__(self, graph: CompiledGraph):
+        """由紧凑路网图构建骨架图
+        
+        Args:
+            graph: 规划器编译的紧凑路网图
+        """
+        self.graph = graph
+        self.is_node = bytearray(1 if not self._is_collapsible(station) else 0
+                                 for station in range(graph.station_count))
+        
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        self.edge_lines = array('H')
+        self.edge_states = array('I')
+        self.costs = array('d')
+        self.via_offsets = array('I', [0])
+        self.via_stations = array('I')  # 各条边途经的站点（不含两端）依次存放
+        
+        edges_by_node = [[] for _ in range(graph.station_count)]
+        covered = bytearray(graph.station_count)
+        for station in range(graph.station_count):
+            if self.is_node[station]:
+                edges_by_node[station] = self._collapse_edges(station, covered)
+        # 没有任何骨架站点的环线（所有站点都可收缩），任取一站作为骨架站点
+        for station in range(graph.station_count):
+            if not self.is_node[station] and not covered[station]:
+                self.is_node[station] = 1
+                edges_by_node[station] = self._collapse_edges(station, covered)
+        
+        for station in range(graph.station_count):
+            for target, line, cost, stations in edges_by_node[station]:
+                self.targets.append(target)
+                self.edge_lines.append(line)
+                self.edge_states.append(target * graph.state_width + line)
+                self.costs.append(cost)
+                self.via_stations.extend(stations)
+                self.via_offsets.append(len(self.via_stations))
+            self.offsets.append(len(self.targets))
+
+    def _is_collapsible(self, station: int) -> bool:
+        """站点是否只有同一线路上的两个不同相邻站点（列车只会途经该站）"""
+        graph = self.graph
+        first, last = graph.offsets[station], graph.offsets[station + 1]
+        if last - first != 2:
+            return False
+        return (graph.edge_lines[first] == graph.edge_lines[first + 1]
+                and graph.targets[first] != graph.targets[first + 1]
+                and station not in (graph.targets[first], graph.targets[first + 1]))
+
+    def _collapse_edges(self, node: int, covered: bytearray) -> List[Tuple[int, int, float, List[int]]]:
+        """从骨架站点出发，沿每条出边收缩到下一个骨架站点"""
+        edges = []
+        for edge in self.graph.edges(node):
+            line, stations, costs = self.walk(node, edge)
+            for station in stations[:-1]:
+                covered[station] = 1
+            edges.append((stations[-1], line, costs[-1], stations[:-1]))
+        return edges
+
+    @property
+    def node_count(self) -> int:
+        """骨架站点数"""
+        return sum(self.is_node)
+
+    @property
+    def edge_count(self) -> int:
+        """骨架图的有向边数"""
+        return len(self.targets)
+
+    def edges(self, node: int) -> range:
+        """骨架站点的出边下标范围"""
+        return range(self.offsets[node], self.offsets[node + 1])
+
+    def via(self, edge: int) -> List[int]:
+        """骨架边途经的站点编号（不含两端）"""
+        return self.via_stations[self.via_offsets[edge]:self.via_offsets[edge + 1]].tolist()
+
+    def walk(self, station: int, edge: int) -> Tuple[int, List[int], List[float]]:
+        """从station沿紧凑图中的一条出边出发，途经可收缩站点直到下一个骨架站点
+        
+        代价的计算方式与完整图搜索一致：途经站点计停站时间，出发站点不计。
+        
+        Args:
+            station: 出发站点编号
+            edge: 出发站点在紧凑图中的出边下标
+        
+        Returns:
+            Tuple[line, stations, costs]: 线路编号、依次经过的站点（最后一个为骨架站点）
+                以及到达每个站点时的累计代价
+        """
+        graph = self.graph
+        targets, travel_times = graph.targets, graph.travel_times
+        line = graph.edge_lines[edge]
+        previous, current = station, targets[edge]
+        cost = travel_times[edge]
+        stations, costs = [current], [cost]
+        while not self.is_node[current] and current != station:
+            first = graph.offsets[current]
+            edge = first if targets[first] != previous else first + 1
+            cost = cost + graph.stop_times[current] + travel_times[edge]
+            previous, current = current, targets[edge]
+            stations.append(current)
+            costs.append(cost)
+        return line, stations, costs
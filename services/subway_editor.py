@@ -1,11 +1,26 @@
-from typing import Dict
+from typing import Dict, Callable, Optional
 from models.station import Station
 from models.line import Line
+from models.network_delta import NetworkDelta
 
 class SubwayEditor:
-    def __init__(self, stations: Dict[str, Station], lines: Dict[str, Line]):
+    def __init__(self, stations: Dict[str, Station], lines: Dict[str, Line],
+                 on_change: Optional[Callable[[NetworkDelta], None]] = None):
+        """初始化编辑器
+        
+        Args:
+            stations: 站点字典
+            lines: 线路字典
+            on_change: 每次成功修改站点或线路后以路网增量调用的回调（用于增量更新规划器和缓存）
+        """
         self.stations = stations
         self.lines = lines
+        self.on_change = on_change
+
+    def _notify_change(self, delta: NetworkDelta):
+        """通知路网已发生变化"""
+        if self.on_change is not None:
+            self.on_change(delta)
 
     def add_station(self, line_id: str, prev_station: str, next_station: str, 
                    new_station: str, prev_distance: float, next_distance: float):
@@ -35,6 +50,8 @@ class SubwayEditor:
         
         self.stations[prev_station].add_adjacent_station(new_station, prev_distance)
         self.stations[next_station].add_adjacent_station(new_station, next_distance)
+        
+        self._notify_change(NetworkDelta.edge_split(line_id, prev_station, next_station, new_station))
 
     def extend_line(self, line_id: str, terminal_station: str, 
                    new_station: str, distance: float):
@@ -57,6 +74,8 @@ class SubwayEditor:
         # 建立邻接关系
         new_station_obj.add_adjacent_station(terminal_station, distance)
         self.stations[terminal_station].add_adjacent_station(new_station, distance)
+        
+        self._notify_change(NetworkDelta.line_extended(line_id, terminal_station, new_station))
 
     def remove_station(self, station_name: str):
         """删除站点"""
@@ -85,4 +104,6 @@ class SubwayEditor:
             self.lines[line_id].remove_station(station_name)
         
         # 删除站点
-        del self.stations[station_name] 
\ No newline at end of file
+        del self.stations[station_name]
+        
+        self._notify_change(NetworkDelta.station_removed(station_name, prev_station, next_station))
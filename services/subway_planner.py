@@ -1,11 +1,22 @@
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple, Set, Optional
 import heapq
 from models.station import Station
 from models.line import Line
-import json
+from models.network_delta import NetworkDelta
+from services.transfer_matrix import TransferMatrix
+from services.compiled_graph import CompiledGraph
+from services.skeleton_graph import SkeletonGraph
+from services.metrics import SEARCH_COUNTERS, REBUILD_BUCKETS, histogram
+from services.search_budget import SearchBudget
+from services.wait_times import WaitTimeTable
 import networkx as nx
 from collections import deque
-import random
+import time
+
+REBUILD_SECONDS = histogram("subway_planner_rebuild_seconds",
+                            "规划器索引的重建耗时（秒），kind为full（完整重建）、delta（编辑增量更新）、"
+                            "copy（复制出编辑草稿）、compiled_graph或skeleton_graph（编辑后首次搜索时重新编译）",
+                            ("kind",), REBUILD_BUCKETS)
 
 class SubwayPlanner:
     def __init__(self, stations: Dict[str, Station] = None, lines: Dict[str, Line] = None):
@@ -18,35 +29,74 @@ class SubwayPlanner:
         self.stations = stations if stations is not None else {}
         self.lines = lines if lines is not None else {}
         self.graph = nx.Graph()  # 使用NetworkX的图结构
-        
-        # 如果传入了stations和lines，则加载发车时间
-        if stations is not None and lines is not None:
-            self.load_departure_times(self.lines)
+        self.adjacency = {}  # 搜索用邻接表 {station: [(next_station, line, travel_time), ...]}
+        self.line_graph = {}  # 线路邻接图 {line: {neighbor_line: [transfer_station, ...]}}
+        self.segment_cache = {}
+        self.transfer_matrix = None  # 线路间最少换乘次数表
+        self._compiled_graph = None  # 搜索用的紧凑图，邻接表变化后重新编译
+        self._skeleton_graph = None  # 由紧凑图收缩得到的换乘骨架图
+        self.expanded_states = 0  # 各搜索累计确定的状态数，用于基准测试统计搜索量
         
         # 构建图
         self.build_graph()
         
-        # 用于存储每条路线的等待时间
-        self.route_wait_times = {}
+        # 按(线路, 方向, 小时)的期望等车时间，由地铁系统在加载发车时间后设置，只读
+        self.wait_times = WaitTimeTable()
+
+    def copy(self, stations: Dict[str, Station], lines: Dict[str, Line]) -> 'SubwayPlanner':
+        """复制规划器，供编辑在不影响当前规划器的情况下增量更新
+        
+        编辑会修改的索引（邻接表、线路邻接图等）只复制字典本身，其中的各项与原规划器共用：
+        邻接表等按站点整体替换，线路邻接图的某条线路第一次被修改时才复制该行。只读的紧凑图、
+        骨架图和换乘次数表与原规划器共用（增量更新时整体替换而不是原地修改），只读的等车时间表在所有副本间共享。
+        
+        Args:
+            stations: 新副本使用的站点字典（与原版本共用未修改的站点对象）
+            lines: 新副本使用的线路字典（与原版本共用未修改的线路对象）
+        """
+        started = time.perf_counter()
+        planner = SubwayPlanner.__new__(SubwayPlanner)
+        planner.__dict__.update(self.__dict__)
+        planner.stations = stations
+        planner.lines = lines
+        planner.adjacency = dict(self.adjacency)
+        planner.line_graph = dict(self.line_graph)
+        planner._owned_line_graph = set()
+        planner.station_lines = dict(self.station_lines)
+        planner.segment_cache = dict(self.segment_cache)
+        planner.transfer_matrix = self.transfer_matrix.copy(stations)
+        REBUILD_SECONDS.observe(time.perf_counter() - started, "copy")
+        return planner
+
+    def use_network(self, stations: Dict[str, Station], lines: Dict[str, Line]):
+        """改用内容相同的另一组站点和线路字典（如发布草稿时换下写时复制的字典），索引不变"""
+        self.stations = stations
+        self.lines = lines
+        self.transfer_matrix.stations = stations
+
+    # k条备选路线时最多生成的路线数为 k × YEN_PATH_FACTOR（其余为被过滤的相似路线）
+    YEN_PATH_FACTOR = 5
+
+    # 环形线路首尾闭合区间的实际距离（数据文件中缺少这两段连接）
+    CIRCLE_LINE_CLOSURES = {
+        "2号线": ("西直门", "积水潭", 1810),
+        "10号线": ("火器营", "巴沟", 1441)
+    }
 
     def _add_circle_line_connections(self):
         """为环形线路添加首尾站点的连接"""
-        for line_id in self.circle_lines:
-            line = self.lines[line_id]
-            if len(line.stations) >= 2:
-                first_station = line.stations[0]
-                last_station = line.stations[-1]
-                
-                # 在两个方向都添加连接
-                if first_station in self.stations and last_station in self.stations:
-                    # 使用实际距离数据
-                    distance = {
-                        "2号线": 1810,  # 西直门到积水潭的实际距离
-                        "10号线": 1441  # 火器营到巴沟的实际距离
-                    }[line_id]
-                    
-                    self.stations[first_station].add_adjacent_station(last_station, distance)
-                    self.stations[last_station].add_adjacent_station(first_station, distance)
+        for line_id, (first_station, last_station, distance) in self.CIRCLE_LINE_CLOSURES.items():
+            if line_id not in self.lines:
+                continue
+            if first_station not in self.stations or last_station not in self.stations:
+                continue
+            # 两个站点都仍在该线路上时才闭合环线（编辑后可能已被移除）
+            if line_id not in self.stations[first_station].lines or line_id not in self.stations[last_station].lines:
+                continue
+            
+            # 在两个方向都添加连接
+            self.stations[first_station].add_adjacent_station(last_station, distance)
+            self.stations[last_station].add_adjacent_station(first_station, distance)
 
     def calculate_travel_time(self, distance: float, speed: float) -> float:
         """计算行驶时间（分钟）"""
@@ -77,216 +127,823 @@ class SubwayPlanner:
     def load_lines(self):
         pass
 
-    def find_least_transfers_path(self, start: str, end: str) -> List[Tuple[List[str], int, List[str], float]]:
+    def find_least_transfers_path(self, start: str, end: str,
+                                  budget: Optional[SearchBudget] = None) -> List[Tuple[List[str], int, List[str], float]]:
         """查找最少换乘路径，返回所有最短换乘路径并按时间排序
         
+        先在线路邻接图（线路为节点、换乘站为边）上做BFS求出最少换乘次数，
+        再只为这些线路序列填充具体的站点序列，不再对站点图做穷举搜索。
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            budget: 搜索预算，用尽时返回已找到的路径；一条也没有找到时退而返回最短时间路径
+        
         Returns:
             List[Tuple[path, transfers, lines, time]]: 所有最短换乘路径，按时间排序
         """
-        # 特殊处理：西二旗和清河站之间的换乘
-        if (start in ["西二旗", "清河站"] and end in ["西二旗", "清河站"]):
-            # 获取两站之间的距离
-            distance = self.stations[start].adjacent_stations[end]
-            
-            # 返回两条线路的方案
-            path = [start, end]
+        if start not in self.stations or end not in self.stations:
+            raise ValueError("起点或终点站不存在")
+        
+        if start == end:
+            return [([start], 0, [], 0)]
+        
+        start_lines = [line for line in self.stations[start].lines if line in self.line_graph]
+        end_lines = {line for line in self.stations[end].lines if line in self.line_graph}
+        
+        # 最少换乘的线路序列可能因线路内部不连通而无法落地，此时继续尝试更多换乘
+        for line_chain_group in self._iter_line_chains(start_lines, end_lines, budget):
             path_details = []
+            seen = set()
+            for line_chain in line_chain_group:
+                for path, lines_used in self._expand_line_chain(start, end, line_chain, budget):
+                    SEARCH_COUNTERS.paths += 1
+                    key = (tuple(path), tuple(lines_used))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    path_details.append((path, len(line_chain) - 1, lines_used,
+                                         self._calculate_path_time(path, lines_used)))
             
-            # 13号线方案
-            line_13_speed = self.lines["13号线"].speed
-            time_13 = self.calculate_travel_time(distance, line_13_speed)
-            path_details.append((path, 0, ["13号线"], time_13))
-            
-            # 昌平线方案
-            line_cp_speed = self.lines["昌平线"].speed
-            time_cp = self.calculate_travel_time(distance, line_cp_speed)
-            path_details.append((path, 0, ["昌平线"], time_cp))
+            if path_details:
+                # 按时间排序
+                path_details.sort(key=lambda x: x[3])
+                return path_details
+            if budget is not None and budget.exhausted:
+                break
+        
+        if budget is not None and budget.exhausted:
+            # 预算在找到任何最少换乘路径之前用尽，最短时间搜索的代价有界，用其结果兜底
+            path, lines_used, _ = self._search_shortest_time(start, end)
+            if path:
+                transfers = sum(1 for a, b in zip(lines_used, lines_used[1:]) if a != b)
+                return [(path, transfers, lines_used, self._calculate_path_time(path, lines_used))]
+        return None
+
+    def _iter_line_chains(self, start_lines: List[str], end_lines: Set[str], budget: Optional[SearchBudget] = None):
+        """按换乘次数从少到多，逐层生成从起点线路到终点线路的所有最短线路序列
+        
+        以换乘次数表给出的下界作为起始层数，并用“已用换乘 + 剩余最少换乘 <= 层数”
+        剪枝，只会沿着能在该层数内到达终点线路的线路扩展。预算用尽时给出该层已找到的线路序列后停止。
+        
+        Yields:
+            List[List[str]]: 同一换乘次数下的所有线路序列
+        """
+        # 每条线路到终点线路的最少换乘次数，不可达的线路直接剪掉
+        remaining = {}
+        for line in self.line_graph:
+            transfers = self.transfer_matrix.to_lines(line, end_lines)
+            if transfers is not None:
+                remaining[line] = transfers
+        
+        start_bounds = [remaining[line] for line in start_lines if line in remaining]
+        if not start_bounds:
+            return
+        
+        def extend(chain: List[str], limit: int, chains: List[List[str]]):
+            if not self._count_expanded(1, budget):
+                return
+            line = chain[-1]
+            if line in end_lines:
+                if len(chain) - 1 == limit:
+                    chains.append(list(chain))
+                # 已到达终点线路，不再经过它继续绕行
+                return
+            for neighbor in self.line_graph[line]:
+                if neighbor in chain or neighbor not in remaining:
+                    continue
+                if len(chain) + remaining[neighbor] > limit:
+                    continue
+                chain.append(neighbor)
+                extend(chain, limit, chains)
+                chain.pop()
+        
+        for limit in range(min(start_bounds), len(self.line_graph)):
+            chains = []
+            for line in start_lines:
+                if line in remaining and remaining[line] <= limit:
+                    extend([line], limit, chains)
+            if chains:
+                yield chains
+            if budget is not None and budget.exhausted:
+                return
+
+    def _expand_line_chain(self, start: str, end: str, line_chain: List[str],
+                           budget: Optional[SearchBudget] = None) -> List[Tuple[List[str], List[str]]]:
+        """为一个线路序列填充站点序列
+        
+        依次枚举相邻两条线路之间的换乘站，每条线路内部取行驶时间最短的站点序列，
+        丢弃重复经过同一站点或在某条线路上不乘车的组合。预算用尽时只返回已完成的站点序列。
+        
+        Returns:
+            List[Tuple[path, lines]]: 该线路序列下所有可行的站点序列及每段线路
+        """
+        results = []
+        
+        def extend(index: int, station: str, path: List[str], lines_used: List[str]):
+            if not self._count_expanded(1, budget):
+                return
+            line = line_chain[index]
+            if index == len(line_chain) - 1:
+                exits = [end]
+            else:
+                exits = self.line_graph[line][line_chain[index + 1]]
             
-            # 按时间从短到长排序
-            path_details.sort(key=lambda x: x[3])
-            return path_details
+            for exit_station in exits:
+                segment = self._get_line_segment(line, station, exit_station)
+                if not segment or len(segment) < 2:
+                    continue
+                if any(s in path for s in segment[1:]):
+                    continue
+                new_path = path + segment[1:]
+                new_lines = lines_used + [line] * (len(segment) - 1)
+                if index == len(line_chain) - 1:
+                    results.append((new_path, new_lines))
+                else:
+                    extend(index + 1, exit_station, new_path, new_lines)
+        
+        extend(0, start, [start], [])
+        return results
+
+    def _get_line_segment(self, line_id: str, start: str, end: str) -> List[str]:
+        """获取同一线路上两站之间行驶时间最短的站点序列（环线会比较两个方向）"""
+        line_cache = self.segment_cache.setdefault(line_id, {})
+        key = (start, end)
+        if key in line_cache:
+            SEARCH_COUNTERS.segment_hits += 1
+            return line_cache[key]
+        SEARCH_COUNTERS.segment_misses += 1
+        
+        graph = self.compiled_graph
+        segment = None
+        if line_id in graph.line_ids and start in graph.station_ids and end in graph.station_ids:
+            line = graph.line_ids[line_id]
+            start_id, end_id = graph.station_ids[start], graph.station_ids[end]
+            offsets, targets, edge_lines = graph.offsets, graph.targets, graph.edge_lines
+            travel_times, stop_times = graph.travel_times, graph.stop_times
+            best = {start_id: 0}
+            previous = {start_id: -1}
+            heap = [(0, start_id)]
+            while heap:
+                cost, station = heapq.heappop(heap)
+                if station == end_id:
+                    ids = []
+                    while station >= 0:
+                        ids.append(station)
+                        station = previous[station]
+                    segment = graph.names(reversed(ids))
+                    break
+                if cost > best[station]:
+                    continue
+                dwell = stop_times[station] if station != start_id else 0
+                for edge in range(offsets[station], offsets[station + 1]):
+                    if edge_lines[edge] != line:
+                        continue
+                    next_station = targets[edge]
+                    new_cost = cost + dwell + travel_times[edge]
+                    if new_cost < best.get(next_station, float('inf')):
+                        best[next_station] = new_cost
+                        previous[next_station] = station
+                        heapq.heappush(heap, (new_cost, next_station))
+            self._count_expanded(len(previous))
+        
+        line_cache[key] = segment
+        return segment
+
+    def _calculate_path_time(self, path: List[str], lines_used: List[str]) -> float:
+        """按每段线路计算路径总时间（行驶时间 + 停站时间 + 换乘时间）"""
+        total_time = 0
+        for i in range(len(path)-1):
+            current = path[i]
+            next_station = path[i+1]
+            distance = self.stations[current].adjacent_stations[next_station]
+            line = lines_used[i]
             
-        # 特殊处理：环球度假区和花庄之间的换乘
-        if (start in ["环球度假区", "花庄"] and end in ["环球度假区", "花庄"]):
-            # 获取两站之间的距离
-            distance = self.stations[start].adjacent_stations[end]
+            # 计算行驶时间
+            travel_time = self.calculate_travel_time(distance, self.lines[line].speed)
+            total_time += travel_time
             
-            # 返回两条线路的方案
-            path = [start, end]
-            path_details = []
+            # 添加停站时间（除终点站外每站1分钟）
+            if i < len(path)-2:
+                total_time += 1
             
-            # 1号线/八通线方案
-            line_1_speed = self.lines["1号线/八通线"].speed
-            time_1 = self.calculate_travel_time(distance, line_1_speed)
-            path_details.append((path, 0, ["1号线/八通线"], time_1))
+            # 如果需要换乘，添加换乘时间
+            if i > 0 and lines_used[i-1] != line:
+                total_time += 5
+        
+        return total_time
+    
+    def build_graph(self):
+        """构建搜索用的邻接表
+        
+        每条边按其所属的每条线路分别记录一次，共线区间（如西二旗-清河站）
+        会生成两条不同线路的边，行驶时间按各自线路速度预先计算。
+        """
+        started = time.perf_counter()
+        self._add_circle_line_connections()
+        
+        self.adjacency = {}
+        for station_name in self.stations:
+            self._index_station_edges(station_name)
+        
+        # 线路邻接图：{line: {neighbor_line: [换乘站, ...]}}
+        self.line_graph = {line_id: {} for line_id in self.lines}
+        self._owned_line_graph = set(self.line_graph)  # 本规划器独有（可原地修改）的线路邻接图行
+        self.station_lines = {}  # 建图时各站点所属的线路 {station: frozenset(lines)}
+        for station_name in self.stations:
+            self._index_station_lines(station_name)
+        
+        self.segment_cache = {}  # 线路内站点序列缓存 {line: {(start, end): [station, ...]}}
+        
+        # 线路间最少换乘次数表，作为各搜索的换乘次数下界
+        self.transfer_matrix = TransferMatrix(self.stations, self.lines, self._line_neighbors())
+        self.min_transfer_time = min((station.transfer_time for station in self.stations.values()), default=0)
+        self._compiled_graph = None
+        REBUILD_SECONDS.observe(time.perf_counter() - started, "full")
+
+    @property
+    def compiled_graph(self) -> CompiledGraph:
+        """搜索使用的紧凑路网图（站点和线路编号化的CSR数组）
+        
+        邻接表是编辑时增量维护的可变索引，紧凑图只读，在邻接表变化后的
+        第一次搜索时由邻接表重新编译，耗时与边数成正比。
+        """
+        graph = self._compiled_graph
+        if graph is None:
+            started = time.perf_counter()
+            graph = CompiledGraph(self.stations, self.lines, self.adjacency)
+            self._compiled_graph = graph
+            REBUILD_SECONDS.observe(time.perf_counter() - started, "compiled_graph")
+        return graph
+
+    @property
+    def skeleton_graph(self) -> SkeletonGraph:
+        """最短时间搜索使用的换乘骨架图，紧凑图重新编译后随之重建"""
+        graph = self.compiled_graph
+        skeleton = self._skeleton_graph
+        if skeleton is None or skeleton.graph is not graph:
+            started = time.perf_counter()
+            skeleton = SkeletonGraph(graph)
+            self._skeleton_graph = skeleton
+            REBUILD_SECONDS.observe(time.perf_counter() - started, "skeleton_graph")
+        return skeleton
+
+    def _index_station_edges(self, station_name: str):
+        """根据站点当前的相邻站点和所属线路，（重新）计算其出边及行驶时间"""
+        station = self.stations.get(station_name)
+        if station is None:
+            self.adjacency.pop(station_name, None)
+            return
+        
+        edges = []
+        for next_station, distance in station.adjacent_stations.items():
+            if next_station not in self.stations:
+                continue
+            for line_id in self.get_line_between_stations(station_name, next_station):
+                if line_id not in self.lines:
+                    continue
+                travel_time = self.calculate_travel_time(distance, self.lines[line_id].speed)
+                edges.append((next_station, line_id, travel_time))
+        self.adjacency[station_name] = edges
+
+    def _index_station_lines(self, station_name: str):
+        """根据站点当前所属的线路，（重新）登记其在线路邻接图中的换乘关系"""
+        old_lines = self.station_lines.pop(station_name, frozenset())
+        for line_a in old_lines:
+            for line_b in old_lines:
+                if line_a == line_b or line_b not in self.line_graph.get(line_a, {}):
+                    continue
+                neighbors = self._own_line_neighbors(line_a)
+                interchanges = neighbors[line_b]
+                if station_name in interchanges:
+                    interchanges.remove(station_name)
+                if not interchanges:
+                    del neighbors[line_b]
+        
+        station = self.stations.get(station_name)
+        if station is None:
+            return
+        station_lines = frozenset(line_id for line_id in station.lines if line_id in self.lines)
+        for line_a in station_lines:
+            for line_b in station_lines:
+                if line_a != line_b:
+                    self._own_line_neighbors(line_a).setdefault(line_b, []).append(station_name)
+        self.station_lines[station_name] = station_lines
+
+    def _own_line_neighbors(self, line_id: str) -> Dict[str, List[str]]:
+        """线路邻接图中该线路的一行，与原规划器共用时先复制再返回，之后可以原地修改"""
+        if line_id not in self._owned_line_graph:
+            self.line_graph[line_id] = {neighbor: list(interchanges)
+                                        for neighbor, interchanges in self.line_graph.get(line_id, {}).items()}
+            self._owned_line_graph.add(line_id)
+        return self.line_graph[line_id]
+
+    def _line_neighbors(self) -> Dict[str, Set[str]]:
+        """由线路邻接图得到各线路可直接换乘的线路"""
+        return {line_id: set(neighbors) for line_id, neighbors in self.line_graph.items()}
+
+    def apply_delta(self, delta: NetworkDelta):
+        """按编辑产生的增量更新邻接表、线路邻接图和缓存
+        
+        只重新计算受影响站点（及所属线路变化的站点的相邻站点）的出边，
+        新增线路或线路间换乘关系发生变化时才重建换乘次数表，耗时与受影响的边数成正比。
+        
+        Args:
+            delta: 编辑操作产生的路网增量
+        """
+        started = time.perf_counter()
+        for line_id in delta.added_lines:
+            if line_id in self.lines:
+                self._own_line_neighbors(line_id)
+        
+        touched = delta.touched_stations
+        edge_stations = set(touched)
+        # 所属线路变化后，相邻站点指向它的边所属的线路也随之变化
+        for station_name in touched:
+            station = self.stations.get(station_name)
+            if station is not None and station_name not in delta.added_stations:
+                edge_stations.update(n for n in station.adjacent_stations if n in self.stations)
+        
+        affected_lines = set(delta.added_lines)
+        for station_name in edge_stations:
+            affected_lines.update(line_id for _, line_id, _ in self.adjacency.get(station_name, ()))
+            self._index_station_edges(station_name)
+            affected_lines.update(line_id for _, line_id, _ in self.adjacency.get(station_name, ()))
+        
+        old_neighbors = self._line_neighbors()
+        for station_name in touched:
+            self._index_station_lines(station_name)
+        
+        # 受影响线路的站点序列缓存失效
+        for line_id in affected_lines:
+            self.segment_cache.pop(line_id, None)
+        self._compiled_graph = None
+        
+        # 没有换乘站的新线路不改变线路邻接关系，但换乘次数表中仍需要它的一行
+        if delta.added_lines or self._line_neighbors() != old_neighbors:
+            self.transfer_matrix = TransferMatrix(self.stations, self.lines, self._line_neighbors())
+        for station_name in touched:
+            if station_name in self.stations:
+                self.min_transfer_time = min(self.min_transfer_time, self.stations[station_name].transfer_time)
+        REBUILD_SECONDS.observe(time.perf_counter() - started, "delta")
+
+    def _count_expanded(self, count: int, budget: Optional[SearchBudget] = None) -> bool:
+        """累计搜索确定的状态数（规划器总数用于基准测试，线程内计数用于监控指标）并计入预算
+        
+        Returns:
+            bool: 预算仍有剩余（或没有预算）时为True
+        """
+        self.expanded_states += count
+        SEARCH_COUNTERS.expanded += count
+        return budget is None or budget.spend(count)
+
+    def _line_heuristic(self, graph: CompiledGraph, end: str) -> List[float]:
+        """各线路的A*启发值：剩余换乘次数下界 × 换乘时间（一致且可采纳）
+        
+        无法到达终点所在线路的线路启发值为None，搜索时直接剪枝。
+        """
+        end_lines = self.stations[end].lines
+        heuristic = [None] * graph.line_count
+        for line_id, line_index in graph.line_ids.items():
+            transfers = self.transfer_matrix.to_lines(line_id, end_lines)
+            if transfers is not None:
+                heuristic[line_index] = transfers * self.min_transfer_time
+        return heuristic
+
+    def _search_shortest_time(self, start: str, end: str) -> Tuple[List[str], List[str], float]:
+        """在换乘骨架图的（站点, 当前线路）状态上执行A*搜索
+        
+        起点和终点不是骨架站点时，沿所在区段分别连接到两侧的骨架站点；
+        起点和终点在同一区段上时还可以直接到达。骨架边的代价与完整图中
+        对应区段的代价相同，因此结果与_search_full_graph一致，但只需扩展换乘站和线路端点。
+        
+        Returns:
+            Tuple[path, lines, time]: 站点序列、每段使用的线路和总时间，无可行路线时path为None
+        """
+        if start == end:
+            return [start], [], 0
+        
+        skeleton = self.skeleton_graph
+        graph = skeleton.graph
+        line_count = graph.line_count
+        heuristic = self._line_heuristic(graph, end)
+        width = graph.state_width
+        start_id, end_id = graph.station_ids[start], graph.station_ids[end]
+        start_state = start_id * width + line_count
+        
+        # 终点不是骨架站点时，从两侧骨架站点沿区段到达终点 {骨架站点: [(线路, 代价, 途经站点), ...]}
+        end_edges = {}
+        if not skeleton.is_node[end_id]:
+            for edge in graph.edges(end_id):
+                line, stations, costs = skeleton.walk(end_id, edge)
+                between = stations[-2::-1] + [end_id]
+                end_edges.setdefault(stations[-1], []).append((line, costs[-1], between))
+        
+        # 堆中元素：(估价, 序号, 代价, 状态, 站点, 线路, 前驱状态, 途经)，
+        # 途经为骨架边下标，或连接起终点的区段上依次经过的站点
+        best = {start_state: 0}
+        previous = {}  # 已确定状态的 {state: (previous_state, 途经)}
+        counter = 0  # 相同估价时按入堆顺序弹出
+        heap = []
+        if skeleton.is_node[start_id]:
+            heap.append((0, counter, 0, start_state, start_id, line_count, -1, None))
+        else:
+            previous[start_state] = (-1, None)
+            for edge in graph.edges(start_id):
+                line, stations, costs = skeleton.walk(start_id, edge)
+                if heuristic[line] is None:
+                    continue
+                # 终点在同一区段上时直接到达，继续前进只会再次经过终点
+                position = stations.index(end_id) if end_id in stations else len(stations) - 1
+                station = stations[position]
+                counter += 1
+                heap.append((costs[position] + heuristic[line], counter, costs[position], station * width + line,
+                             station, line, start_state, stations[:position + 1]))
+            heapq.heapify(heap)
+        
+        offsets, edge_lines, edge_states = skeleton.offsets, skeleton.edge_lines, skeleton.edge_states
+        edge_costs, targets = skeleton.costs, skeleton.targets
+        stop_times, transfer_times = graph.stop_times, graph.transfer_times
+        infinity = float('inf')
+        heappush, heappop = heapq.heappush, heapq.heappop
+        
+        while heap:
+            _, _, cost, state, station, line, parent, via = heappop(heap)
+            if state in previous:
+                continue
+            previous[state] = (parent, via)
             
-            # 7号线方案
-            line_7_speed = self.lines["7号线"].speed
-            time_7 = self.calculate_travel_time(distance, line_7_speed)
-            path_details.append((path, 0, ["7号线"], time_7))
+            if station == end_id:
+                self._count_expanded(len(previous))
+                return self._expand_skeleton_path(skeleton, start, state, start_state, previous) + (cost,)
             
-            # 按时间从短到长排序
-            path_details.sort(key=lambda x: x[3])
-            return path_details
+            # 起点不计停站时间，途经站点每站停站一次
+            base_cost = cost + stop_times[station] if parent >= 0 else cost
+            transfer_cost = base_cost + transfer_times[station]
             
-        if start not in self.stations or end not in self.stations:
-            raise ValueError("起点或终点站不存在")
+            for edge in range(offsets[station], offsets[station + 1]):
+                next_line = edge_lines[edge]
+                estimate = heuristic[next_line]
+                if estimate is None:
+                    continue
+                if line == line_count or next_line == line:
+                    new_cost = base_cost + edge_costs[edge]
+                else:
+                    new_cost = transfer_cost + edge_costs[edge]
+                
+                next_state = edge_states[edge]
+                if new_cost < best.get(next_state, infinity):
+                    best[next_state] = new_cost
+                    counter += 1
+                    heappush(heap, (new_cost + estimate, counter, new_cost, next_state,
+                                    targets[edge], next_line, state, edge))
             
-        all_paths = []
-        min_transfers_found = float('inf')
-        
-        def dfs(current: str, path: List[str], lines_used: List[str], transfers: int, visited_stations: Set[str], visited_edges: Set[Tuple[str, str]], current_line: str = None):
-            """深度优先搜索
-            Args:
-                current: 当前站点
-                path: 当前路径
-                lines_used: 当前使用的线路
-                transfers: 当前换乘次数
-                visited_stations: 已访问的站点
-                visited_edges: 已访问的边（站点对）
-                current_line: 当前使用的线路
-            """
-            nonlocal min_transfers_found
+            for next_line, edge_cost, stations in end_edges.get(station, ()):
+                if line == line_count or next_line == line:
+                    new_cost = base_cost + edge_cost
+                else:
+                    new_cost = transfer_cost + edge_cost
+                next_state = end_id * width + next_line
+                if new_cost < best.get(next_state, infinity):
+                    best[next_state] = new_cost
+                    counter += 1
+                    heappush(heap, (new_cost, counter, new_cost, next_state,
+                                    end_id, next_line, state, stations))
+        
+        self._count_expanded(len(previous))
+        return None, None, None
+
+    def _expand_skeleton_path(self, skeleton: SkeletonGraph, start: str, state: int, start_state: int,
+                              previous: Dict[int, Tuple[int, object]]) -> Tuple[List[str], List[str]]:
+        """沿骨架图搜索的前驱还原完整的站点序列和每段线路"""
+        graph = skeleton.graph
+        width = graph.state_width
+        hops = []
+        while state != start_state:
+            parent, via = previous[state]
+            stations = skeleton.via(via) + [state // width] if isinstance(via, int) else via
+            hops.append((stations, graph.line_names[state % width]))
+            state = parent
+        
+        path, lines_used = [start], []
+        for stations, line_id in reversed(hops):
+            path.extend(graph.names(stations))
+            lines_used.extend([line_id] * len(stations))
+        return path, lines_used
+
+    def _search_full_graph(self, start: str, end: str) -> Tuple[List[str], List[str], float]:
+        """在未收缩的完整（站点, 当前线路）状态图上执行A*搜索
+        
+        状态之间的代价包含区间行驶时间、途经站点的停站时间以及换乘时间，
+        因此第一次弹出终点状态时得到的就是全局最短时间路径。作为骨架图搜索的对照实现。
+        
+        Returns:
+            Tuple[path, lines, time]: 站点序列、每段使用的线路和总时间，无可行路线时path为None
+        """
+        if start == end:
+            return [start], [], 0
+        
+        graph = self.compiled_graph
+        # 状态编号见CompiledGraph.edge_states，起点状态为尚未乘车
+        start_state = graph.station_ids[start] * graph.state_width + graph.line_count
+        states, costs = self._search_states(graph, start_state, graph.station_ids[end],
+                                            self._line_heuristic(graph, end))
+        if states is None:
+            return None, None, None
+        path, lines_used = self._states_to_path(graph, states)
+        return path, lines_used, costs[-1]
+
+    def _search_states(self, graph: CompiledGraph, start_state: int, end_id: int, heuristic: List[float],
+                       start_cost: float = 0, banned_stations: Set[int] = frozenset(),
+                       banned_states: Set[int] = frozenset(),
+                       budget: Optional[SearchBudget] = None) -> Tuple[Optional[List[int]], Optional[List[float]]]:
+        """从任意状态出发，在完整状态图上A*搜索到终点站的最短时间状态序列
+        
+        Args:
+            graph: 紧凑路网图
+            start_state: 出发状态，尚未乘车的起点状态不计停站时间，已乘车的状态按途经站点计停站时间
+            end_id: 终点站编号
+            heuristic: 各线路的启发值，见_line_heuristic
+            start_cost: 到达出发状态时已累计的代价
+            banned_stations: 不允许进入的站点编号
+            banned_states: 从出发状态不允许直接前往的状态
+            budget: 搜索预算，单次A*搜索的状态数有界，搜索完成后才计入
+        
+        Returns:
+            Tuple[states, costs]: 从出发状态到终点的状态序列及到达各状态时的累计代价，
+                无可行路线时均为None
+        """
+        line_count = graph.line_count
+        width = graph.state_width
+        best = {start_state: start_cost}
+        previous = {}  # 已确定状态的前驱 {state: previous_state}
+        counter = 0  # 相同估价时按入堆顺序弹出
+        heap = [(start_cost, counter, start_cost, start_state, -1)]
+        offsets, edge_lines, edge_states, targets = graph.offsets, graph.edge_lines, graph.edge_states, graph.targets
+        travel_times, stop_times, transfer_times = graph.travel_times, graph.stop_times, graph.transfer_times
+        infinity = float('inf')
+        heappush, heappop = heapq.heappush, heapq.heappop
+        
+        while heap:
+            _, _, cost, state, parent = heappop(heap)
+            if state in previous:
+                continue
+            previous[state] = parent
+            station, line = divmod(state, width)
             
-            # 如果当前换乘次数已经超过已知的最少换乘次数，剪枝
-            if transfers > min_transfers_found:
-                return
-                
-            if current == end:
-                if transfers < min_transfers_found:
-                    min_transfers_found = transfers
-                    all_paths.clear()  # 清空之前的路径
-                if transfers == min_transfers_found:
-                    all_paths.append((path.copy(), transfers, lines_used.copy()))
-                return
+            if station == end_id:
+                self._count_expanded(len(previous), budget)
+                # 回溯得到状态序列
+                states = []
+                while state != -1:
+                    states.append(state)
+                    state = previous[state]
+                states.reverse()
+                return states, [best[state] for state in states]
             
-            current_station = self.stations[current]
+            # 起点不计停站时间，途经站点每站停站一次
+            base_cost = cost + stop_times[station] if line != line_count else cost
+            transfer_cost = base_cost + transfer_times[station]
             
-            # 获取所有可能的下一站
-            for next_station in current_station.adjacent_stations:
-                # 避免重复访问同一个站点
-                if next_station in visited_stations:
+            for edge in range(offsets[station], offsets[station + 1]):
+                next_line = edge_lines[edge]
+                estimate = heuristic[next_line]
+                if estimate is None or targets[edge] in banned_stations:
                     continue
-                    
-                # 创建边标识（按字母顺序排序以确保唯一性）
-                edge = tuple(sorted([current, next_station]))
+                if line == line_count or next_line == line:
+                    new_cost = base_cost + travel_times[edge]
+                else:
+                    new_cost = transfer_cost + travel_times[edge]
                 
-                # 避免重复使用同一条边
-                if edge in visited_edges:
+                next_state = edge_states[edge]
+                if parent == -1 and next_state in banned_states:
                     continue
-                    
-                # 获取到下一站的所有可能线路
-                next_lines = self.get_line_between_stations(current, next_station)
-                
-                if not next_lines:
+                if new_cost < best.get(next_state, infinity):
+                    best[next_state] = new_cost
+                    counter += 1
+                    heappush(heap, (new_cost + estimate, counter, new_cost, next_state, state))
+        
+        self._count_expanded(len(previous), budget)
+        return None, None
+
+    @staticmethod
+    def _states_to_path(graph: CompiledGraph, states: List[int]) -> Tuple[List[str], List[str]]:
+        """把状态序列转换为站点名称序列和每段使用的线路"""
+        width = graph.state_width
+        path = [graph.station_names[state // width] for state in states]
+        lines_used = [graph.line_names[state % width] for state in states[1:]]
+        return path, lines_used
+
+    def find_k_shortest_time_paths(self, start: str, end: str, k: int, similarity: float = 0.8,
+                                   budget: Optional[SearchBudget] = None,
+                                   hour: Optional[int] = None) -> List[Tuple[List[str], float, List[str]]]:
+        """按时间从短到长查找k条彼此差异足够大的路线（Yen算法）
+        
+        第一条为最短时间路线。之后每次从上一条路线的每个站点（偏离点）出发，
+        禁止走已有路线在该处的下一步并禁止回到偏离点之前的站点，搜索偏离后的最短路线，
+        所有候选中时间最短的成为下一条路线。与已选路线过于相似的路线（只差一个站点、
+        换用并行线路或重合区间距离占比不低于similarity）不返回，但仍参与后续偏离。
+        生成的路线数不超过 k × YEN_PATH_FACTOR，搜索量只随k增长。
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            k: 最多返回的路线数
+            similarity: 判定两条路线相似的重合距离比例
+            budget: 搜索预算，用尽时返回已确定的路线（至少包含最短时间路线），可能少于k条
+            hour: 到站的小时，用于查询等车时间，为None时使用全天的期望等车时间
+        
+        Returns:
+            List[Tuple[path, time, lines]]: 按时间排序的路线，时间包含各自上车线路和方向的期望等车时间
+        """
+        if start not in self.stations or end not in self.stations:
+            raise ValueError("起点或终点站不存在")
+        
+        graph = self.compiled_graph
+        width = graph.state_width
+        end_id = graph.station_ids[end]
+        heuristic = self._line_heuristic(graph, end)
+        start_state = graph.station_ids[start] * width + graph.line_count
+        states, costs = self._search_states(graph, start_state, end_id, heuristic, budget=budget)
+        if states is None:
+            return []
+        SEARCH_COUNTERS.paths += 1
+        
+        found = [(states, costs)]  # 按时间顺序生成的所有路线
+        accepted = [self._states_to_path(graph, states) + (costs[-1],)]
+        candidates = []  # 候选路线堆 (time, counter, states, costs)
+        seen = {tuple(states)}
+        counter = 0
+        while len(accepted) < k and len(found) < k * self.YEN_PATH_FACTOR:
+            last_states, last_costs = found[-1]
+            for i in range(len(last_states) - 1):
+                if budget is not None and budget.exhausted:
+                    break
+                root = last_states[:i + 1]
+                banned_stations = {state // width for state in root}
+                banned_states = {found_states[i + 1] for found_states, _ in found if found_states[:i + 1] == root}
+                spur_states, spur_costs = self._search_states(graph, root[-1], end_id, heuristic, last_costs[i],
+                                                              banned_stations, banned_states, budget)
+                if spur_states is None:
                     continue
-                
-                # 创建新的集合，避免修改原始集合
-                new_visited_stations = set(visited_stations)
-                new_visited_edges = set(visited_edges)
-                new_visited_stations.add(next_station)
-                new_visited_edges.add(edge)
-                
-                path.append(next_station)
-                
-                # 对每条可能的线路都进行尝试
-                for next_line in next_lines:
-                    # 计算是否需要换乘
-                    new_transfers = transfers
-                    if current_line and next_line != current_line:
-                        new_transfers += 1
-                        # 如果换乘次数已经超过已知的最少换乘次数，剪枝
-                        if new_transfers > min_transfers_found:
-                            continue
-                    
-                    # 添加当前使用的线路
-                    lines_used.append(next_line)
-                    
-                    dfs(next_station, path, lines_used, new_transfers, new_visited_stations, new_visited_edges, next_line)
-                    
-                    # 回溯时移除当前使用的线路
-                    lines_used.pop()
-                
-                path.pop()
- 
-        # 开始搜索
-        initial_visited_stations = {start}
-        initial_visited_edges = set()
-        dfs(start, [start], [], 0, initial_visited_stations, initial_visited_edges, None)
- 
-        if not all_paths:
-            return None
- 
-        # 计算每条路径的详细信息
-        path_details = []
-        for path, transfers, lines_used in all_paths:
-            # 计算总时间
-            total_time = 0
-            for i in range(len(path)-1):
-                current = path[i]
-                next_station = path[i+1]
-                distance = self.stations[current].adjacent_stations[next_station]
-                line = lines_used[i]  # 使用DFS中记录的线路
-                
-                # 计算行驶时间
-                travel_time = self.calculate_travel_time(distance, self.lines[line].speed)
-                total_time += travel_time
-                
-                # 添加停站时间（除终点站外每站1分钟）
-                if i < len(path)-2:
-                    total_time += 1
-                
-                # 如果需要换乘，添加换乘时间
-                if i > 0 and lines_used[i-1] != line:
-                    total_time += 5
+                SEARCH_COUNTERS.paths += 1
+                states = root[:-1] + spur_states
+                if tuple(states) in seen:
+                    continue
+                seen.add(tuple(states))
+                counter += 1
+                heapq.heappush(candidates, (spur_costs[-1], counter, states, last_costs[:i] + spur_costs))
+            # 预算用尽时偏离点没有全部搜索完，候选中最短的未必是下一条路线
+            if not candidates or budget is not None and budget.exhausted:
+                break
             
-            path_details.append((path, transfers, lines_used, total_time))
- 
-        # 按时间排序
-        path_details.sort(key=lambda x: x[3])
-                
-        return path_details
-    
-    def build_graph(self):
-        # 实现构建图的逻辑
-        pass
+            _, _, states, costs = heapq.heappop(candidates)
+            found.append((states, costs))
+            path, lines_used = self._states_to_path(graph, states)
+            if not any(self._is_similar_route(path, other[0], similarity) for other in accepted):
+                accepted.append((path, lines_used, costs[-1]))
+        
+        # 各路线上车的线路和方向不同，加上等车时间后重新排序
+        routes = [(path, total_time + self.boarding_wait(path, lines_used, hour), lines_used)
+                  for path, lines_used, total_time in accepted]
+        return sorted(routes, key=lambda route: route[1])
+
+    def _is_similar_route(self, path: List[str], other: List[str], similarity: float) -> bool:
+        """两条路线是否只差一个站点、只是换用并行线路，或重合区间距离占较短路线的比例不低于similarity"""
+        if len(set(path) ^ set(other)) <= 2:
+            return True
+        shared = set(zip(other, other[1:]))
+        overlap = sum(self.stations[a].adjacent_stations[b] for a, b in zip(path, path[1:]) if (a, b) in shared)
+        length = min(sum(self.stations[a].adjacent_stations[b] for a, b in zip(route, route[1:]))
+                     for route in (path, other))
+        return length > 0 and overlap / length >= similarity
 
-    def find_shortest_time_path(self, start: str, end: str) -> Tuple[List[str], float, List[str]]:
+    def find_shortest_times_from(self, start: str, max_time: Optional[float] = None, include_wait: bool = False,
+                                 hour: Optional[int] = None) -> Dict[str, Tuple[float, float, int]]:
+        """从一个起点出发，一次搜索求出到所有站点的最短时间（一对多Dijkstra）
+        
+        在完整状态图上不设终点地扩展，每个状态确定时沿最短路径树累计距离和换乘次数，
+        批量查询同一起点的多个终点时共用这一棵最短路径树。时间与_search_shortest_time一致，
+        默认不含等车时间。
+        
+        Args:
+            start: 起点站
+            max_time: 时间上限（分钟，不含等车时间），超过上限的站点不再扩展，为None时搜索整个路网
+            include_wait: 是否在各站点的时间中加上沿最短路径树首次上车的期望等车时间（与find_shortest_time_path一致）
+            hour: 到站的小时，用于查询等车时间，为None时使用全天的期望等车时间
+        
+        Returns:
+            Dict[str, Tuple[time, distance, transfers]]: 各可达站点的最短时间（分钟）、
+                对应路线的距离（米）和换乘次数，起点本身为(0, 0, 0)
+        """
+        if start not in self.stations:
+            raise ValueError("起点或终点站不存在")
+        
+        graph = self.compiled_graph
+        line_count = graph.line_count
+        width = graph.state_width
+        start_id = graph.station_ids[start]
+        start_state = start_id * width + line_count
+        best = {start_state: 0}
+        settled = {}  # {state: (距离, 换乘次数)}
+        boardings = {}  # include_wait时各状态沿最短路径树的首次上车 {state: (线路编号, 上车后的下一站)}
+        arrivals = {}  # include_wait时各站点最先确定的状态 {station: state}
+        results = {start_id: (0, 0, 0)}
+        heap = [(0, start_state, start_id, line_count, -1, 0)]
+        offsets, edge_lines, edge_states = graph.offsets, graph.edge_lines, graph.edge_states
+        travel_times, distances, targets = graph.travel_times, graph.distances, graph.targets
+        stop_times, transfer_times = graph.stop_times, graph.transfer_times
+        infinity = float('inf')
+        heappush, heappop = heapq.heappush, heapq.heappop
+        
+        while heap:
+            cost, state, station, line, parent, distance = heappop(heap)
+            if max_time is not None and cost > max_time:
+                break
+            if state in settled:
+                continue
+            if parent >= 0:
+                parent_distance, transfers = settled[parent]
+                parent_line = parent % width
+                if parent_line != line_count and parent_line != line:
+                    transfers += 1
+                distance += parent_distance
+            else:
+                transfers = 0
+            settled[state] = (distance, transfers)
+            if include_wait and parent >= 0:
+                boardings[state] = (line, station) if parent == start_state else boardings[parent]
+            # 状态按代价从小到大确定，每个站点第一次确定的状态即为最短时间
+            if station not in results:
+                results[station] = (cost, distance, transfers)
+                if include_wait and parent >= 0:
+                    arrivals[station] = state
+            
+            base_cost = cost + stop_times[station] if parent >= 0 else cost
+            transfer_cost = base_cost + transfer_times[station]
+            for edge in range(offsets[station], offsets[station + 1]):
+                next_line = edge_lines[edge]
+                if line == line_count or next_line == line:
+                    new_cost = base_cost + travel_times[edge]
+                else:
+                    new_cost = transfer_cost + travel_times[edge]
+                next_state = edge_states[edge]
+                if new_cost < best.get(next_state, infinity):
+                    best[next_state] = new_cost
+                    heappush(heap, (new_cost, next_state, targets[edge], next_line, state, distances[edge]))
+        
+        self._count_expanded(len(settled))
+        names = graph.station_names
+        waits = {}  # 首次上车相同的站点共用一次查表
+        for station, state in arrivals.items():
+            boarding = boardings[state]
+            if boarding not in waits:
+                line_id = graph.line_names[boarding[0]]
+                waits[boarding] = self.wait_times.boarding_wait(
+                    line_id, self.lines[line_id].stations, start, names[boarding[1]], hour)
+            cost, distance, transfers = results[station]
+            results[station] = (cost + waits[boarding], distance, transfers)
+        return {names[station]: value for station, value in results.items()}
+
+    def find_shortest_time_path(self, start: str, end: str,
+                                hour: Optional[int] = None) -> Tuple[List[str], float, List[str]]:
         """查找最短时间路径
         
-        直接从最少换乘路径中选择时间最短的路径
+        在（站点, 线路）状态图上运行Dijkstra，停站时间和换乘时间计入边的代价，
+        因此多换乘一次但更快的路线同样可以被找到。返回的时间另加首次上车的期望等车时间。
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            hour: 到站的小时，用于查询等车时间，为None时使用全天的期望等车时间
         """
         if start not in self.stations or end not in self.stations:
             raise ValueError("起点或终点站不存在")
             
-        # 获取所有最少换乘路径
-        path_details = self.find_least_transfers_path(start, end)
+        path, lines, total_time = self._search_shortest_time(start, end)
         
-        if not path_details:
+        if not path:
             return None, None, None
-            
-        # find_least_transfers_path已经按时间排序，直接取第一条就是时间最短的
-        path, transfers, lines, total_time = path_details[0]
-        
-        # 生成起点-终点的唯一标识
-        route_key = f"{start}-{end}"
-        
-        # 添加随机等车时间，并实现递减逻辑
-        if route_key not in self.route_wait_times:
-            # 第一次查询这条路线，生成0到4分钟的随机等待时间
-            self.route_wait_times[route_key] = random.uniform(0, 4)
-        else:
-            # 后续查询，等待时间递减（但不低于0）
-            self.route_wait_times[route_key] = max(0, self.route_wait_times[route_key] * 0.8)
+        SEARCH_COUNTERS.paths += 1
         
-        # 将等待时间加到总时间上
-        wait_time = self.route_wait_times[route_key]
-        total_time += wait_time
+        total_time += self.boarding_wait(path, lines, hour)
         
         return path, total_time, lines
 
-    def calculate_route_details(self, path: List[str], lines: List[str] = None) -> Dict:
-        """计算路径的详细信息"""
+    def boarding_wait(self, path: List[str], lines: List[str], hour: Optional[int] = None) -> float:
+        """路线首次上车的期望等车时间（分钟），由上车线路、运行方向和小时从等车时间表中查得"""
+        if len(path) < 2 or not lines or lines[0] not in self.lines:
+            return 0
+        return self.wait_times.boarding_wait(lines[0], self.lines[lines[0]].stations, path[0], path[1], hour)
+
+    def calculate_route_details(self, path: List[str], lines: List[str] = None, hour: Optional[int] = None) -> Dict:
+        """计算路径的详细信息
+        
+        Args:
+            path: 站点序列
+            lines: 各区间乘坐的线路，为None时重新计算
+            hour: 到站的小时，用于查询等车时间，为None时使用全天的期望等车时间
+        """
         details = {
             "total_distance": 0,
             "total_time": 0,
@@ -304,11 +961,9 @@ class SubwayPlanner:
             
         current_line = None
         
-        # 计算等车时间
-        route_key = f"{path[0]}-{path[-1]}"
-        if route_key in self.route_wait_times:
-            details["wait_time"] = self.route_wait_times[route_key]
-            details["total_time"] += details["wait_time"]  # 将等车时间加入总时间
+        # 首次上车的等车时间
+        details["wait_time"] = self.boarding_wait(path, lines, hour)
+        details["total_time"] += details["wait_time"]  # 将等车时间加入总时间
         
         for i in range(len(path)-1):
             current = path[i]
@@ -363,27 +1018,4 @@ class SubwayPlanner:
         # 实现加载站点的逻辑
         pass
 
-    def load_departure_times(self, lines: Dict[str, Line]):
-        """从JSON文件加载发车时间数据"""
-        try:
-            with open('resources/data/parsed_departure_times.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # 使用工作日数据
-            weekday_data = data.get('weekday', {})
-            
-            for line_id, line_data in weekday_data.items():
-                if line_id in lines:
-                    line = lines[line_id]
-                    
-                    # 处理正向和反向的发车时间
-                    for direction, stations in line_data.items():
-                        for station, times in stations.items():
-                            for time_id, time in times.items():
-                                line.add_start_time(station, time_id, time)  # 添加time参数
-                                
-        except Exception as e:
-            print(f"加载发车时间数据失败: {str(e)}")
-            raise
-
    
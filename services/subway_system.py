@@ -1,9 +1,79 @@
 from typing import Dict, List, Optional
 from models.station import Station
 from models.line import Line
+from models.route_result import RouteResult
+from models.network_delta import NetworkDelta, NODE_ADDED, EDGE_SPLIT
+from models.timetable import Timetable, ServiceCalendar, WEEKDAY, WEEKEND, parse_time, format_time
 from services.subway_editor import SubwayEditor
 from services.subway_planner import SubwayPlanner
-from utils.initializer import initialize_from_json
+from services.route_cache import RouteCache
+from services.timetable_router import TimetableRouter
+from services.all_pairs import AllPairsMatrices, compute_all_pairs
+from services.network_state import NetworkState
+from services.search_budget import SearchBudget
+from services.wait_times import WaitTimeTable
+from services.metrics import SEARCH_COUNTERS, SEARCH_BUCKETS, counter, histogram
+from datetime import datetime
+from contextlib import contextmanager
+from utils.initializer import initialize_from_json, load_departure_times
+from utils.snapshot import open_snapshot, DEFAULT_SNAPSHOT_PATH
+import functools
+import threading
+import time
+import numpy as np
+
+SEARCH_SECONDS = histogram("subway_planner_search_seconds", "单次路线计算的耗时（秒），不含路线缓存命中的查询",
+                           ("mode",), SEARCH_BUCKETS)
+EXPANDED_STATES = counter("subway_planner_expanded_states_total", "路线计算中搜索确定的状态数", ("mode",))
+PATHS_ENUMERATED = counter("subway_planner_paths_enumerated_total", "路线计算中枚举的候选路线数", ("mode",))
+BUDGET_EXHAUSTED = counter("subway_planner_budget_exhausted_total", "搜索预算用尽、返回非最优结果的路线计算次数",
+                           ("mode",))
+SEGMENT_CACHE_LOOKUPS = counter("subway_planner_segment_cache_lookups_total",
+                                "线路区段缓存的查找次数，result为hit或miss", ("result",))
+
+def _editing(method):
+    """SubwaySystemEditor的编辑方法在地铁系统的edit()中执行，失败时不会留下改了一半的路网"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.subway_system.edit():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _pinned(method):
+    """SubwaySystem的查询方法在整个调用期间固定使用同一版本的路网"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pinned():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _measured(method):
+    """记录SubwaySystem路线计算的耗时和搜索量指标
+
+    搜索量由规划器累加在当前线程的计数器上，计算结束后取差值一次性计入全局指标，
+    搜索过程中不加锁。按时刻表规划以外的未知模式与最少换乘模式一样计入transfers。
+    """
+    @functools.wraps(method)
+    def wrapper(self, start, end, mode, *args, **kwargs):
+        counters = SEARCH_COUNTERS
+        expanded, paths = counters.expanded, counters.paths
+        hits, misses = counters.segment_hits, counters.segment_misses
+        started = time.perf_counter()
+        label = mode if mode == "time" or mode in self.TIMETABLE_MODES else "transfers"
+        try:
+            result = method(self, start, end, mode, *args, **kwargs)
+            if not result.optimal:
+                BUDGET_EXHAUSTED.inc(label)
+            return result
+        finally:
+            SEARCH_SECONDS.observe(time.perf_counter() - started, label)
+            EXPANDED_STATES.inc(label, amount=counters.expanded - expanded)
+            PATHS_ENUMERATED.inc(label, amount=counters.paths - paths)
+            if counters.segment_hits != hits:
+                SEGMENT_CACHE_LOOKUPS.inc("hit", amount=counters.segment_hits - hits)
+            if counters.segment_misses != misses:
+                SEGMENT_CACHE_LOOKUPS.inc("miss", amount=counters.segment_misses - misses)
+    return wrapper
 
 class SubwaySystemEditor:
     """用于编辑地铁系统的类"""
@@ -16,6 +86,24 @@ class SubwaySystemEditor:
         """
         self.subway_system = subway_system
     
+    @property
+    def station_editor(self):
+        """站点级编辑（在两站之间插入、删除站点）复用SubwayEditor的实现"""
+        return SubwayEditor(self.subway_system.stations, self.subway_system.lines,
+                            on_change=self.subway_system.mark_network_changed)
+    
+    @_editing
+    def add_station(self, line_id, prev_station, next_station, new_station, prev_distance, next_distance):
+        """在线路上两个相邻站点之间添加新站点"""
+        self.station_editor.add_station(line_id, prev_station, next_station,
+                                        new_station, prev_distance, next_distance)
+    
+    @_editing
+    def remove_station(self, station_name):
+        """删除恰好有两个相邻站点的站点"""
+        self.station_editor.remove_station(station_name)
+    
+    @_editing
     def extend_line(self, line_id, terminal_station, new_station, distance):
         """延长一条线路
         
@@ -63,8 +151,10 @@ class SubwaySystemEditor:
         new_station_obj.add_adjacent_station(terminal_station, distance)
         self.subway_system.stations[terminal_station].add_adjacent_station(new_station, distance)
         
+        self._refresh_planner(NetworkDelta.line_extended(line_id, terminal_station, new_station))
         return line
     
+    @_editing
     def create_new_line(self, line_id, station_name, speed):
         """创建新线路
         
@@ -95,8 +185,10 @@ class SubwaySystemEditor:
         # 添加线路到系统
         self.subway_system.lines[line_id] = new_line
         
+        self._refresh_planner(NetworkDelta.line_created(line_id, station_name))
         return new_line
     
+    @_editing
     def add_station_to_line(self, line_id, station_name, connected_station, distance):
         """向已有线路添加站点
         
@@ -123,7 +215,11 @@ class SubwaySystemEditor:
         connected_idx = line.stations.index(connected_station)
         
         # 检查新站点是否已存在于系统中
-        if station_name not in self.subway_system.stations:
+        station_added = station_name not in self.subway_system.stations
+        delta = NetworkDelta(NODE_ADDED, line_id,
+                             added_stations=[station_name] if station_added else [],
+                             relined_stations=[] if station_added else [station_name])
+        if station_added:
             # 创建新站点
             from models.station import Station
             new_station = Station(station_name)
@@ -163,10 +259,13 @@ class SubwaySystemEditor:
                     # 删除直接连接关系
                     del self.subway_system.stations[prev_station].adjacent_stations[next_station]
                     del self.subway_system.stations[next_station].adjacent_stations[prev_station]
+                    delta.kind = EDGE_SPLIT
+                    delta.removed_edges.append((prev_station, next_station))
         
         # 更新相邻站点信息 - 与连接站点建立连接
         new_station.add_adjacent_station(connected_station, distance)
         self.subway_system.stations[connected_station].add_adjacent_station(station_name, distance)
+        delta.added_edges.append((connected_station, station_name))
         
         # 如果新站点被插入在两站点之间，还需要与下一个站点建立连接
         if connected_idx < len(line.stations) - 2 and connected_idx > 0:
@@ -177,29 +276,202 @@ class SubwaySystemEditor:
             next_station_name = line.stations[connected_idx + 2]  # 新站点后面的站点
             new_station.add_adjacent_station(next_station_name, next_station_distance)
             self.subway_system.stations[next_station_name].add_adjacent_station(station_name, next_station_distance)
+            delta.added_edges.append((station_name, next_station_name))
             
             print(f"建立新连接: {station_name} -> {next_station_name}，距离: {next_station_distance}米")
         
+        self._refresh_planner(delta)
         return line
 
+    def _refresh_planner(self, delta: NetworkDelta):
+        """编辑后通知地铁系统路网已变化，规划器只更新增量涉及的部分"""
+        self.subway_system.mark_network_changed(delta)
+
 class SubwaySystem:
-    def __init__(self, data_file='resources/data/line_speed_final.json'):
+    # 按真实发车时刻表规划的查询模式
+    TIMETABLE_MODES = ("depart_at", "profile", "arrive_by")
+    # 支持批量查询的规划模式
+    BATCH_MODES = ("time", "transfers", "depart_at")
+    # "time"模式最多返回的备选路线数，以及判定两条路线相似的重合距离比例
+    MAX_ALTERNATIVES = 10
+    ROUTE_SIMILARITY = 0.8
+    # 票价分段 (距离上限（米）, 票价)，超过最后一段后每增加FARE_EXTRA_DISTANCE米加1元
+    FARE_BRACKETS = ((6000, 3), (12000, 4), (22000, 5), (32000, 6))
+    FARE_EXTRA_DISTANCE = 20000
+
+    def __init__(self, data_file='resources/data/line_speed_final.json', cache_size: int = 1024,
+                 holidays=(), workdays=(), snapshot_path: Optional[str] = DEFAULT_SNAPSHOT_PATH,
+                 max_expansions: Optional[int] = None, max_search_ms: Optional[float] = None):
         """初始化地铁系统
         
         Args:
             data_file: 包含地铁系统数据的JSON文件路径
+            cache_size: 路线缓存最多保存的查询结果数，为0时不缓存
+            holidays: 按双休日时刻表运营的法定节假日（"YYYY-MM-DD"）
+            workdays: 按工作日时刻表运营的调休周末（"YYYY-MM-DD"）
+            snapshot_path: 编译后的路网快照路径，数据文件变化时自动重新编译；为None时直接读取JSON
+            max_expansions: 单次路线计算最多扩展的状态数，为None时不限制
+            max_search_ms: 单次路线计算的最长搜索时间（毫秒），为None时不限制
         """
+        # 先创建一次预算以检查参数
+        SearchBudget(max_expansions, max_search_ms)
+        self.max_expansions = max_expansions
+        self.max_search_ms = max_search_ms
         self.data_file = data_file
-        self.stations = {}  # 站点名称到Station对象的映射
-        self.lines = {}     # 线路名称到Line对象的映射
+        self.snapshot_path = snapshot_path
+        self.snapshot = None  # 当前使用的路网快照
+        self._state = None  # 当前发布的路网版本（NetworkState），只通过引用赋值整体替换
+        self._edit_lock = threading.RLock()  # 编辑和重新加载互斥，查询不加锁
+        self._local = threading.local()  # 各线程正在编辑的草稿或固定使用的版本
+        self.route_cache = RouteCache(cache_size)
+        self.calendar = ServiceCalendar(holidays, workdays)
+        self._timetable_lock = threading.Lock()
+        self._loaded_day_types = set()  # 已加载发车时间的日期类型
+        self._timetable_routers = {}  # 按需构建的时刻表规划器 {day_type: (network_version, router)}
+        self._all_pairs = None  # 按需计算的全路网矩阵 (network_version, matrices)
         self.load_data()
         self.editor = SubwaySystemEditor(self)  # 初始化编辑器
 
+    @property
+    def state(self) -> NetworkState:
+        """当前线程使用的路网版本
+        
+        编辑中的线程看到自己的草稿，固定了版本的线程（见pinned）看到固定的版本，
+        其余情况为最新发布的版本。
+        """
+        local = self._local
+        return getattr(local, 'draft', None) or getattr(local, 'pinned', None) or self._state
+
+    @property
+    def stations(self) -> Dict[str, Station]:
+        """站点名称到Station对象的映射"""
+        return self.state.stations
+
+    @property
+    def lines(self) -> Dict[str, Line]:
+        """线路名称到Line对象的映射"""
+        return self.state.lines
+
+    @property
+    def planner(self) -> SubwayPlanner:
+        """当前路网版本的规划器"""
+        return self.state.planner
+
+    @property
+    def network_version(self) -> int:
+        """路网版本号，每次编辑后递增"""
+        return self.state.version
+
+    def pin(self) -> bool:
+        """让本线程固定使用当前最新发布的路网版本，之后发布的新版本不影响本线程
+        
+        Returns:
+            bool: 本线程此前没有固定版本、由这次调用固定时返回True，调用方随后需调用unpin
+        """
+        if getattr(self._local, 'pinned', None) is not None:
+            return False
+        self._local.pinned = self._state
+        return True
+
+    def unpin(self):
+        """取消本线程固定的路网版本"""
+        self._local.pinned = None
+
+    @contextmanager
+    def pinned(self):
+        """在with块内固定使用进入时最新发布的路网版本（见pin），可以嵌套
+        
+        一次查询多次读取站点、线路和规划器时用它保证读到的是同一版本。
+        """
+        pinned_here = self.pin()
+        try:
+            yield self.state
+        finally:
+            if pinned_here:
+                self.unpin()
+
+    @contextmanager
+    def edit(self):
+        """在with块内编辑路网：修改作用于下一版本的草稿，正常退出后一次性发布
+        
+        块内通过stations、lines、planner、editor读写的都是草稿，其他线程的查询
+        仍使用当前版本且不会被阻塞；块内抛出异常时草稿被丢弃。编辑之间互斥，可以嵌套。
+        
+        Yields:
+            NetworkState: 下一版本的草稿
+        """
+        if getattr(self._local, 'draft', None) is not None:
+            yield self._local.draft
+            return
+        with self._edit_lock:
+            draft = self._state.copy_for_edit()
+            self._local.draft = draft
+            try:
+                yield draft
+            finally:
+                self._local.draft = None
+            if draft.changed:
+                draft.seal()
+                self._publish(draft)
+
+    def _publish(self, state: NetworkState):
+        """发布新的路网版本"""
+        self._state = state
+        # 旧版本的条目已不可能命中，直接清空以释放内存
+        self.route_cache.clear()
+
     def load_data(self):
-        """从JSON文件加载地铁系统数据"""
-        self.stations, self.lines = initialize_from_json(self.data_file)
-        # 初始化规划器
-        self.planner = SubwayPlanner(self.stations, self.lines)
+        """加载地铁系统数据（优先使用路网快照，不可用时读取JSON文件）"""
+        with self._edit_lock:
+            self.snapshot = open_snapshot(self.data_file, self.snapshot_path) if self.snapshot_path else None
+            if self.snapshot is not None:
+                stations, lines = self.snapshot.load_network()
+            else:
+                stations, lines = initialize_from_json(self.data_file)
+            # 发车时间随线路对象一起重新加载
+            self._loaded_day_types = set()
+            self._timetable_routers = {}
+            # 初始化规划器
+            planner = SubwayPlanner(stations, lines)
+            planner.wait_times = self._load_wait_times(lines)
+            version = self._state.version + 1 if self._state is not None else 1
+            self._publish(NetworkState(version, stations, lines, planner))
+
+    def _load_wait_times(self, lines: Dict[str, Line]) -> WaitTimeTable:
+        """期望等车时间表：优先使用快照中预先计算的结果，否则加载工作日发车时间后计算"""
+        wait_times = self.snapshot.load_wait_times() if self.snapshot is not None else None
+        if wait_times is None:
+            self._load_timetables(lines, WEEKDAY)
+            wait_times = WaitTimeTable(lines, WEEKDAY)
+        return wait_times
+
+    @_pinned
+    def warm_up(self, day_types=(WEEKDAY, WEEKEND)):
+        """预先构建按需生成的搜索结构（紧凑图、骨架图和各日期类型的时刻表规划器）
+        
+        多进程部署时在主进程中调用，派生的工作进程以写时复制方式共享这些只读结构，
+        不必各自在首个请求时重复构建。
+        """
+        self.planner.compiled_graph
+        self.planner.skeleton_graph
+        for day_type in day_types:
+            self.get_timetable_router(day_type)
+
+    def mark_network_changed(self, delta: Optional[NetworkDelta] = None):
+        """站点或线路被修改后调用：更新规划器的图结构并发布新的路网版本
+        
+        在edit()中调用时只更新草稿的规划器，退出edit()时统一发布；
+        在edit()之外调用时（调用方已直接修改了当前版本的站点或线路）复制后立即发布。
+        
+        Args:
+            delta: 编辑产生的路网增量，规划器只更新受影响的部分；为None时完整重建
+        """
+        with self.edit() as draft:
+            if delta is None:
+                draft.planner.build_graph()
+            else:
+                draft.apply_delta(delta)
+            draft.changed = True
 
     def get_system_data(self):
         """获取当前系统数据，用于前端显示"""
@@ -211,45 +483,149 @@ class SubwaySystem:
             }
         return data
 
-    def get_departure_times(self, line_id: str) -> Dict[str, str]:
+    def get_day_type(self, date=None) -> str:
+        """获取指定日期（默认为今天）使用的时刻表日期类型"""
+        return self.calendar.timetable_day_type(date or datetime.now().date())
+
+    def get_timetable(self, line_id: str, date=None) -> Timetable:
+        """获取线路在指定日期使用的发车时刻表（首次使用某日期类型时加载）"""
+        day_type = self.get_day_type(date)
+        self._ensure_timetables(day_type)
+        return self.lines[line_id].get_timetable(day_type)
+
+    def _ensure_timetables(self, day_type: str):
+        """确保该日期类型的发车时间已加载，每种日期类型只解析一次"""
+        if day_type in self._loaded_day_types:
+            return
+        with self._timetable_lock:
+            if day_type not in self._loaded_day_types:
+                self._load_timetables(self.lines, day_type)
+
+    def _load_timetables(self, lines: Dict[str, Line], day_type: str):
+        """从路网快照（可用时）或JSON文件加载该日期类型的发车时间"""
+        if self.snapshot is not None and day_type in self.snapshot.day_types:
+            self.snapshot.load_timetables(lines, [day_type])
+        else:
+            load_departure_times(lines, [day_type])
+        self._loaded_day_types.add(day_type)
+
+    def get_departure_times(self, line_id: str, date=None) -> Dict[str, Dict[str, List[str]]]:
         """获取指定线路所有站点的发车时间
         
         Args:
             line_id: 线路ID
+            date: 日期（"YYYY-MM-DD"），默认为今天
             
         Returns:
-            Dict[str, str]: 所有站点的发车时间字典，如果线路不存在则返回空字典
+            Dict[str, Dict[str, List[str]]]: 各始发站各方向按时间排序的发车时间，如果线路不存在则返回空字典
         """
         if line_id in self.lines:
-            return self.lines[line_id].get_all_start_times()
+            day_type = self.get_day_type(date)
+            self._ensure_timetables(day_type)
+            return self.lines[line_id].get_all_start_times(day_type)
         return {}
         
-    def get_station_departure_time(self, line_id: str, station: str) -> Optional[str]:
+    def get_station_departure_time(self, line_id: str, station: str, after: Optional[str] = None,
+                                   date=None) -> Optional[str]:
         """获取指定线路指定站点的发车时间
         
         Args:
             line_id: 线路ID
             station: 站点名称
+            after: 起始时间（HH:MM），给出时返回此后的下一班发车时间，否则返回最早发车时间
+            date: 日期（"YYYY-MM-DD"），默认为今天
             
         Returns:
             Optional[str]: 发车时间字符串，如果线路或站点不存在则返回None
         """
         if line_id in self.lines:
-            return self.lines[line_id].get_start_time(station)
+            day_type = self.get_day_type(date)
+            self._ensure_timetables(day_type)
+            return self.lines[line_id].get_start_time(station, after, day_type)
         return None
 
+    def get_next_departures(self, line_id: str, station: str, after: str, count: int = 5,
+                            direction: Optional[str] = None, date=None) -> List[Dict[str, str]]:
+        """获取指定站点在某时间之后的若干班发车时间
+        
+        Args:
+            line_id: 线路ID
+            station: 始发站名称
+            after: 起始时间（HH:MM）
+            count: 返回的班次数
+            direction: 运行方向，为None时合并所有方向
+            date: 日期（"YYYY-MM-DD"），默认为今天
+            
+        Returns:
+            List[Dict[str, str]]: 按时间排序的班次列表 [{"time": ..., "direction": ...}]
+        """
+        if line_id not in self.lines:
+            return []
+        departures = self.get_timetable(line_id, date).next_departures(station, parse_time(after), count, direction)
+        return [{"time": format_time(minute), "direction": name} for minute, name in departures]
+
+    def get_departures_between(self, line_id: str, station: str, start: str, end: str,
+                               direction: Optional[str] = None, date=None) -> List[Dict[str, str]]:
+        """获取指定站点在时间区间[start, end]内的所有发车时间
+        
+        Args:
+            line_id: 线路ID
+            station: 始发站名称
+            start: 区间开始时间（HH:MM）
+            end: 区间结束时间（HH:MM）
+            direction: 运行方向，为None时合并所有方向
+            date: 日期（"YYYY-MM-DD"），默认为今天
+            
+        Returns:
+            List[Dict[str, str]]: 按时间排序的班次列表 [{"time": ..., "direction": ...}]
+        """
+        if line_id not in self.lines:
+            return []
+        departures = self.get_timetable(line_id, date).departures_between(
+            station, parse_time(start), parse_time(end), direction)
+        return [{"time": format_time(minute), "direction": name} for minute, name in departures]
+
+    def get_min_transfers(self, start: str, end: str) -> Optional[int]:
+        """查询两站之间的最少换乘次数（查表，不做图搜索）
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            
+        Returns:
+            Optional[int]: 最少换乘次数，两站不连通时返回None
+        """
+        return self.planner.transfer_matrix.between_stations(start, end)
+
     def calculate_fare(self, distance: float) -> float:
         """计算票价"""
-        if distance <= 6000:  # 6公里以内
-            return 3
-        elif distance <= 12000:  # 6-12公里
-            return 4
-        elif distance <= 22000:  # 12-22公里
-            return 5
-        elif distance <= 32000:  # 22-32公里
-            return 6
-        else:  # 32公里以上
-            return 7 + ((distance - 32000) // 20000)  # 每增加20公里增加1元
+        for limit, fare in self.FARE_BRACKETS:
+            if distance <= limit:
+                return fare
+        # 超过最后一段后每增加20公里增加1元
+        limit, fare = self.FARE_BRACKETS[-1]
+        return fare + 1 + ((distance - limit) // self.FARE_EXTRA_DISTANCE)
+
+    def calculate_fares(self, distances: np.ndarray) -> np.ndarray:
+        """按与calculate_fare相同的规则对距离数组逐元素计算票价"""
+        limits = np.array([limit for limit, _ in self.FARE_BRACKETS], dtype=float)
+        fares = np.array([fare for _, fare in self.FARE_BRACKETS], dtype=float)
+        bracket = np.searchsorted(limits, distances, side='left')
+        extra = fares[-1] + 1 + np.floor_divide(distances - limits[-1], self.FARE_EXTRA_DISTANCE)
+        return np.where(bracket < len(limits), fares[np.minimum(bracket, len(limits) - 1)], extra)
+
+    @_pinned
+    def get_all_pairs(self) -> AllPairsMatrices:
+        """按需计算全路网两两之间的最短时间、距离、换乘次数和票价矩阵，路网变化后重新计算"""
+        entry = self._all_pairs
+        if entry is None or entry[0] != self.network_version:
+            entry = (self.network_version, compute_all_pairs(self.planner.compiled_graph, self.calculate_fares))
+            self._all_pairs = entry
+        return entry[1]
+
+    def export_all_pairs(self, directory: str) -> List[str]:
+        """将当前路网的全路网矩阵导出为.npy文件，返回写入的文件路径"""
+        return self.get_all_pairs().save(directory)
 
     def format_route(self, path: List[str], total_time: float, lines: List[str], details: Dict) -> str:
         """格式化路线信息"""
@@ -273,34 +649,343 @@ class SubwaySystem:
         result.append("\n" + "="*30 + "\n")  # 添加分隔线
         return "\n".join(result)
 
-    def plan_route(self, start: str, end: str, mode: str = "time") -> str:
-        """规划路线"""
-        try:
+    @_pinned
+    def query_route(self, start: str, end: str, mode: str = "time", depart_time: Optional[str] = None,
+                    depart_until: Optional[str] = None, arrive_time: Optional[str] = None,
+                    date: Optional[str] = None, k: int = 1) -> RouteResult:
+        """执行一次路线查询
+        
+        每个请求只调用一次规划器，文本、地图详情和备选路线均由返回的结果渲染。
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            mode: 规划模式，"time"为最短时间，"transfers"为最少换乘，"depart_at"为按时刻表的最早到达，
+                "profile"为出发时间窗口内的所有最优方案，"arrive_by"为按时到达的最晚出发方案
+            depart_time: 出发时间（HH:MM），"depart_at"和"profile"模式使用，默认为当前时间；
+                "time"和"transfers"模式只按所在小时估计等车时间，不提供时使用全天的期望等车时间
+            depart_until: 出发时间窗口的结束时间（HH:MM），仅"profile"模式使用，默认为出发时间后一小时
+            arrive_time: 最晚到达时间（HH:MM），仅"arrive_by"模式使用，默认为当前时间
+            date: 出行日期（YYYY-MM-DD），按时刻表规划的模式据此选择工作日或双休日时刻表，默认为今天
+            k: "time"模式返回的备选路线数（1到MAX_ALTERNATIVES），大于1时按时间返回k条差异足够大的路线
+            
+        Returns:
+            RouteResult: 包含所有路线方案的查询结果
+        """
+        if mode != "time":
+            k = 1
+        elif isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= self.MAX_ALTERNATIVES:
+            return RouteResult(start, end, mode, error=f"备选路线数k应为1到{self.MAX_ALTERNATIVES}之间的整数")
+        if mode in ("depart_at", "profile"):
+            if not depart_time:
+                depart_time = datetime.now().strftime('%H:%M')
+        elif mode in ("time", "transfers") and depart_time:
+            # 只有所在小时影响等车时间，同一小时内的查询共用缓存条目
+            try:
+                depart_time = f"{self._parse_query_time(depart_time, '出发时间') // 60:02d}:00"
+            except ValueError as e:
+                return RouteResult(start, end, mode, error=str(e))
+        else:
+            depart_time = None
+        if mode != "profile":
+            depart_until = None
+        if mode == "arrive_by":
+            if not arrive_time:
+                arrive_time = datetime.now().strftime('%H:%M')
+        else:
+            arrive_time = None
+        
+        day_type = None
+        if mode in self.TIMETABLE_MODES:
+            try:
+                day_type = self.get_day_type(date)
+            except ValueError:
+                return RouteResult(start, end, mode, error="日期格式应为YYYY-MM-DD")
+        
+        # 同一日期类型的不同日期共用缓存条目
+        cache_key = (start, end, mode, depart_time, depart_until, arrive_time, day_type, k, self.network_version)
+        cached = self.route_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        result = self._compute_route(start, end, mode, depart_time, depart_until, arrive_time, day_type, k)
+        # 出错的查询（如站点不存在）和预算用尽时的非最优结果不缓存
+        if result.error is None and result.optimal:
+            self.route_cache.put(cache_key, result)
+        return result
+
+    @_pinned
+    def plan_many(self, origins: List[str], destinations: List[str], mode: str = "time",
+                  depart_time: Optional[str] = None, date: Optional[str] = None) -> Dict:
+        """批量查询多个起点到多个终点的出行矩阵
+        
+        同一起点的所有终点共用一次搜索："time"模式为一对多Dijkstra，"depart_at"模式为
+        一次不设终点的RAPTOR扫描；"transfers"模式逐对查询，共用规划器的线路区段缓存。
+        批量结果不经过路线缓存，"time"和"transfers"模式的时间与/query一致，包含首次上车的期望等车时间。
+        
+        Args:
+            origins: 起点站列表
+            destinations: 终点站列表
+            mode: 规划模式，支持"time"、"transfers"和"depart_at"
+            depart_time: 出发时间（HH:MM），"depart_at"模式默认为当前时间；
+                "time"和"transfers"模式只按所在小时估计等车时间，不提供时使用全天的期望等车时间
+            date: 出行日期（YYYY-MM-DD），仅"depart_at"模式使用，默认为今天
+            
+        Returns:
+            Dict: 包含origins、destinations、mode以及time（分钟）、distance（米）、transfers、fare
+                四个矩阵，第i行第j列对应origins[i]到destinations[j]，不可达时为None；
+                "depart_at"模式的时间为从出发时间到到达终点的总时长（含候车）
+        
+        Raises:
+            ValueError: 模式不支持、站点不存在或时间格式错误
+        """
+        if mode not in self.BATCH_MODES:
+            raise ValueError(f"批量查询不支持{mode}模式")
+        unknown = [name for name in dict.fromkeys(list(origins) + list(destinations)) if name not in self.stations]
+        if unknown:
+            raise ValueError(f"站点不存在: {'、'.join(unknown)}")
+        
+        if mode == "depart_at":
+            try:
+                router = self.get_timetable_router(self.get_day_type(date))
+            except ValueError:
+                raise ValueError("日期格式应为YYYY-MM-DD")
+            departure = self._parse_query_time(depart_time or datetime.now().strftime('%H:%M'), "出发时间")
+        hour = self._parse_query_time(depart_time, "出发时间") // 60 if mode != "depart_at" and depart_time else None
+        
+        matrices = {key: [[None] * len(destinations) for _ in origins]
+                    for key in ("time", "distance", "transfers", "fare")}
+        
+        def fill(i: int, j: int, total_time: float, distance: float, transfers: int):
+            matrices["time"][i][j] = round(total_time, 2)
+            matrices["distance"][i][j] = distance
+            matrices["transfers"][i][j] = transfers
+            matrices["fare"][i][j] = self.calculate_fare(distance)
+        
+        for i, origin in enumerate(origins):
             if mode == "time":
-                path, total_time, lines = self.planner.find_shortest_time_path(start, end)
-                if not path:
-                    return "未找到可行路线"
-                details = self.planner.calculate_route_details(path, lines)
-                return self.format_route(path, total_time, lines, details)
+                tree = self.planner.find_shortest_times_from(origin, include_wait=True, hour=hour)
+                for j, destination in enumerate(destinations):
+                    if destination in tree:
+                        fill(i, j, *tree[destination])
+            elif mode == "depart_at":
+                journeys = router.earliest_arrivals(origin, destinations, departure)
+                for j, destination in enumerate(destinations):
+                    if destination in journeys:
+                        route = self._build_timetable_route(journeys[destination])
+                        fill(i, j, route["time"], route["total_distance"], route["transfers"])
             else:
-                paths = self.planner.find_least_transfers_path(start, end)
-                if not paths:
-                    return "未找到可行路线"
-                
-                result = []
-                result.append("最少换乘路线方案：\n")
-                
-                # 遍历所有路径并格式化显示
-                for i, (path, transfers, lines, total_time) in enumerate(paths, 1):
-                    result.append(f"\n{'='*15} 路线 {i} {'='*15}")
-                    details = self.planner.calculate_route_details(path, lines)
-                    result.append(self.format_route(path, total_time, lines, details))
-                
-                return "\n".join(result)
+                for j, destination in enumerate(destinations):
+                    paths = self.planner.find_least_transfers_path(origin, destination)
+                    if paths:
+                        # 与/query相同，加上等车时间后取最快的方案
+                        path, transfers, _, total_time = min(
+                            ((path, transfers, lines, ride_time + self.planner.boarding_wait(path, lines, hour))
+                             for path, transfers, lines, ride_time in paths), key=lambda item: item[3])
+                        distance = sum(self.stations[a].adjacent_stations[b] for a, b in zip(path, path[1:]))
+                        fill(i, j, total_time, distance, transfers)
+        
+        return dict(origins=list(origins), destinations=list(destinations), mode=mode, **matrices)
+
+    @_pinned
+    def get_isochrone(self, station: str, minutes: Optional[float] = None) -> Dict:
+        """查询从一个站点出发到其他各站的最短时间、换乘次数和距离（一次一对多搜索）
+        
+        Args:
+            station: 出发站
+            minutes: 时间上限（分钟），只返回在该时间内可到达的站点，为None时返回所有可达站点
+            
+        Returns:
+            Dict: 包含station、minutes和按时间升序排列的stations列表
+                [{"station", "time", "transfers", "distance"}]，时间不含等车时间
+        
+        Raises:
+            ValueError: 站点不存在或时间上限为负数
+        """
+        if station not in self.stations:
+            raise ValueError(f"站点 {station} 不存在")
+        if minutes is not None and minutes < 0:
+            raise ValueError("时间上限不能为负数")
+        
+        cache_key = ("isochrone", station, minutes, self.network_version)
+        cached = self.route_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        reachable = self.planner.find_shortest_times_from(station, minutes)
+        result = {
+            "station": station,
+            "minutes": minutes,
+            "stations": [{"station": name, "time": round(total_time, 2), "transfers": transfers, "distance": distance}
+                         for name, (total_time, distance, transfers)
+                         in sorted(reachable.items(), key=lambda item: item[1][0])]
+        }
+        self.route_cache.put(cache_key, result)
+        return result
+
+    def get_timetable_router(self, day_type: str) -> TimetableRouter:
+        """按需构建某日期类型的时刻表规划器，路网变化后重新构建"""
+        entry = self._timetable_routers.get(day_type)
+        if entry is None or entry[0] != self.network_version:
+            self._ensure_timetables(day_type)
+            entry = (self.network_version, TimetableRouter(self.planner, day_type))
+            self._timetable_routers[day_type] = entry
+        return entry[1]
+
+    @_measured
+    def _compute_route(self, start: str, end: str, mode: str, depart_time: Optional[str] = None,
+                       depart_until: Optional[str] = None, arrive_time: Optional[str] = None,
+                       day_type: Optional[str] = None, k: int = 1) -> RouteResult:
+        """调用规划器计算路线（不经过缓存）
+        
+        备选路线和最少换乘的搜索量随路网结构可能急剧增长，按max_expansions和max_search_ms
+        限制搜索预算，预算用尽时返回目前找到的最好结果并标记为非最优。
+        """
+        budget = None
+        hour = None
+        if mode in ("time", "transfers") and depart_time:
+            hour = self._parse_query_time(depart_time, "出发时间") // 60
+        if self.max_expansions is not None or self.max_search_ms is not None:
+            budget = SearchBudget(self.max_expansions, self.max_search_ms)
+        try:
+            router = self.get_timetable_router(day_type) if mode in self.TIMETABLE_MODES else None
+            routes = []
+            if mode == "time" and k > 1:
+                for path, total_time, lines in self.planner.find_k_shortest_time_paths(start, end, k,
+                                                                                       self.ROUTE_SIMILARITY, budget, hour):
+                    details = self.planner.calculate_route_details(path, lines, hour)
+                    routes.append(self._build_route(path, total_time, lines, details.get("transfers", 0), details))
+            elif mode == "time":
+                path, total_time, lines = self.planner.find_shortest_time_path(start, end, hour)
+                if path:
+                    details = self.planner.calculate_route_details(path, lines, hour)
+                    routes.append(self._build_route(path, total_time, lines, details.get("transfers", 0), details))
+            elif mode == "depart_at":
+                departure = self._parse_query_time(depart_time, "出发时间")
+                journey = router.earliest_arrival(start, end, departure)
+                if journey:
+                    routes.append(self._build_timetable_route(journey))
+            elif mode == "profile":
+                window_start = self._parse_query_time(depart_time, "出发时间")
+                window_end = (self._parse_query_time(depart_until, "出发截止时间")
+                              if depart_until else window_start + 60)
+                if window_end < window_start:
+                    raise ValueError("出发截止时间不能早于出发时间")
+                for journey in router.profile(start, end, window_start, window_end):
+                    routes.append(self._build_timetable_route(journey))
+            elif mode == "arrive_by":
+                deadline = self._parse_query_time(arrive_time, "到达时间")
+                journey = router.latest_departure(start, end, deadline)
+                if journey:
+                    routes.append(self._build_timetable_route(journey))
+            else:
+                paths = self.planner.find_least_transfers_path(start, end, budget)
+                for path, transfers, lines, total_time in paths or []:
+                    details = self.planner.calculate_route_details(path, lines, hour)
+                    routes.append(self._build_route(path, total_time + details["wait_time"], lines, transfers, details))
                 
+                # 按时间排序
+                routes.sort(key=lambda x: x["time"])
+            
+            return RouteResult(start, end, mode, routes, optimal=budget is None or not budget.exhausted)
         except ValueError as e:
-            return f"错误：{str(e)}"
+            return RouteResult(start, end, mode, error=str(e))
+
+    @staticmethod
+    def _parse_query_time(value: str, name: str) -> int:
+        """解析查询中的HH:MM时间，格式错误时抛出ValueError"""
+        try:
+            return parse_time(value)
+        except (ValueError, AttributeError):
+            raise ValueError(f"{name}格式应为HH:MM")
+
+    def _build_timetable_route(self, journey: Dict) -> Dict:
+        """将时刻表规划结果（各趟列车）组合为一条路线方案"""
+        legs = journey["legs"]
+        path = [legs[0]["from"]] if legs else []
+        lines = []
+        for leg in legs:
+            path.extend(leg["stations"][1:])
+            lines.extend([leg["line"]] * (len(leg["stations"]) - 1))
+        
+        details = self.planner.calculate_route_details(path, lines) if legs else {}
+        total_time = journey["arrival"] - journey["departure"]
+        ride_time = sum(leg["arrival"] - leg["departure"] for leg in legs)
+        
+        route = self._build_route(path, total_time, lines, max(len(legs) - 1, 0), details)
+        # 在站内的时间（首次候车和换乘候车）
+        route["wait_time"] = total_time - ride_time
+        route["departure"] = format_time(journey["departure"])
+        route["arrival"] = format_time(journey["arrival"])
+        route["legs"] = [dict(leg, departure=format_time(leg["departure"]), arrival=format_time(leg["arrival"]))
+                         for leg in legs]
+        return route
+
+    def _build_route(self, path: List[str], total_time: float, lines: List[str], transfers: int, details: Dict) -> Dict:
+        """将规划结果和路线详情组合为一条路线方案"""
+        return {
+            "path": path,
+            "time": total_time,
+            "lines": lines,
+            "transfers": transfers,
+            "total_distance": details.get("total_distance", 0),
+            "wait_time": details.get("wait_time", 0),
+            "segments": details.get("segments", []),
+            "fare": self.calculate_fare(details.get("total_distance", 0))
+        }
+
+    def render_route_text(self, result: RouteResult) -> str:
+        """将查询结果渲染为文本方案"""
+        text = self._render_route_text(result)
+        if not result.optimal and result.routes:
+            text = "搜索量超出预算，以下为目前找到的最好结果，可能不是最优\n\n" + text
+        return text
+
+    def _render_route_text(self, result: RouteResult) -> str:
+        if result.error:
+            return f"错误：{result.error}"
+        if not result.routes:
+            return "未找到可行路线"
+        
+        if result.mode == "time" and len(result.routes) == 1:
+            route = result.best
+            return self.format_route(route["path"], route["time"], route["lines"], route)
+        
+        if result.mode in ("depart_at", "arrive_by"):
+            return self._render_timetable_route(result.best)
+        
+        if result.mode == "profile":
+            text = [f"出发时间窗口内共 {len(result.routes)} 个最优方案：\n"]
+            for i, route in enumerate(result.routes, 1):
+                text.append(f"\n{'='*15} 方案 {i} {'='*15}")
+                text.append(self._render_timetable_route(route))
+            return "\n".join(text)
+        
+        text = []
+        text.append("最短时间备选路线：\n" if result.mode == "time" else "最少换乘路线方案：\n")
+        
+        # 遍历所有路径并格式化显示
+        for i, route in enumerate(result.routes, 1):
+            text.append(f"\n{'='*15} 路线 {i} {'='*15}")
+            text.append(self.format_route(route["path"], route["time"], route["lines"], route))
+        
+        return "\n".join(text)
+
+    def _render_timetable_route(self, route: Dict) -> str:
+        """渲染按时刻表规划的一条路线（各趟列车的上下车时间）"""
+        text = [f"出发时间: {route['departure']}，预计到达: {route['arrival']}"]
+        for leg in route["legs"]:
+            text.append(f"{leg['departure']} {leg['from']} 乘坐 {leg['line']}（{leg['direction']}）"
+                        f" -> {leg['arrival']} 到达 {leg['to']}")
+        text.append(self.format_route(route["path"], route["time"], route["lines"], route))
+        return "\n".join(text)
+
+    @_pinned
+    def plan_route(self, start: str, end: str, mode: str = "time") -> str:
+        """规划路线"""
+        return self.render_route_text(self.query_route(start, end, mode))
     
+    @_pinned
     def get_route_details(self, start: str, end: str, mode: str = "time") -> dict:
         """获取路线详细信息，用于地图显示
         
@@ -312,47 +997,37 @@ class SubwaySystem:
         Returns:
             dict: 包含路线详细信息的字典
         """
-        try:
-            if mode == "time":
-                path, total_time, lines = self.planner.find_shortest_time_path(start, end)
-                if not path:
-                    return {"error": "未找到可行路线"}
-                
-                details = self.planner.calculate_route_details(path, lines)
-                
-                return {
-                    "path": path,
-                    "time": total_time,
-                    "lines": lines,
-                    "transfers": details.get("transfers", 0),
-                    "total_distance": details.get("total_distance", 0),
-                    "wait_time": details.get("wait_time", 0),
-                    "segments": details.get("segments", []),
-                    "fare": self.calculate_fare(details.get("total_distance", 0))
-                }
-            else:
-                paths = self.planner.find_least_transfers_path(start, end)
-                if not paths:
-                    return {"error": "未找到可行路线"}
-                
-                # 使用第一条路径（最少换乘且时间最短的路径）
-                path, transfers, lines, total_time = paths[0]
-                details = self.planner.calculate_route_details(path, lines)
-                
-                return {
-                    "path": path,
-                    "time": total_time,
-                    "lines": lines,
-                    "transfers": transfers,
-                    "total_distance": details.get("total_distance", 0),
-                    "wait_time": details.get("wait_time", 0),
-                    "segments": details.get("segments", []),
-                    "fare": self.calculate_fare(details.get("total_distance", 0))
-                }
-                
-        except ValueError as e:
-            return {"error": str(e)}
+        return self.render_route_details(self.query_route(start, end, mode))
+
+    def render_route_details(self, result: RouteResult) -> dict:
+        """取查询结果中的首选路线（最少换乘模式下为最少换乘且时间最短的路线）"""
+        if result.error:
+            return {"error": result.error}
+        if not result.routes:
+            return {"error": "未找到可行路线"}
+        return result.best
             
+    @_pinned
+    def get_route_profile(self, start: str, end: str, depart_time: str, depart_until: str,
+                          date: Optional[str] = None) -> list:
+        """获取出发时间窗口内的所有最优方案
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            depart_time: 窗口开始时间（HH:MM）
+            depart_until: 窗口结束时间（HH:MM）
+            date: 出行日期（YYYY-MM-DD），默认为今天
+            
+        Returns:
+            list: 按出发时间升序的方案列表，出发越晚到达越晚
+        """
+        result = self.query_route(start, end, "profile", depart_time=depart_time, depart_until=depart_until,
+                                  date=date)
+        if result.error:
+            print(f"获取出发时间窗口内的方案失败: {result.error}")
+        return result.routes
+
     def get_all_transfer_routes(self, start: str, end: str) -> list:
         """获取所有最少换乘路线方案
         
@@ -363,33 +1038,10 @@ class SubwaySystem:
         Returns:
             list: 包含所有最少换乘路线方案的列表
         """
-        try:
-            paths = self.planner.find_least_transfers_path(start, end)
-            if not paths:
-                return []
-                
-            result = []
-            for path, transfers, lines, total_time in paths:
-                details = self.planner.calculate_route_details(path, lines)
-                
-                result.append({
-                    "path": path,
-                    "time": total_time,
-                    "lines": lines,
-                    "transfers": transfers,
-                    "total_distance": details.get("total_distance", 0),
-                    "wait_time": details.get("wait_time", 0),
-                    "segments": details.get("segments", []),
-                    "fare": self.calculate_fare(details.get("total_distance", 0))
-                })
-            
-            # 按时间排序
-            result.sort(key=lambda x: x["time"])
-            
-            return result
-        except ValueError as e:
-            print(f"获取所有最少换乘路线失败: {str(e)}")
-            return []
+        result = self.query_route(start, end, "transfers")
+        if result.error:
+            print(f"获取所有最少换乘路线失败: {result.error}")
+        return result.routes
             
     def add_custom_station(self, station_name: str, line_id: str, connected_station: str, distance: float) -> bool:
         """添加自定义站点到地铁系统
@@ -404,54 +1056,59 @@ class SubwaySystem:
             bool: 是否成功添加站点
         """
         try:
-            # 检查线路是否存在
-            if line_id not in self.lines:
-                raise ValueError(f"线路 {line_id} 不存在")
-                
-            # 检查连接站点是否存在并且在指定线路上
-            if connected_station not in self.stations:
-                raise ValueError(f"站点 {connected_station} 不存在")
-                
-            if line_id not in self.stations[connected_station].lines:
-                raise ValueError(f"站点 {connected_station} 不在线路 {line_id} 上")
-                
-            # 检查新站点名称是否已存在
-            if station_name in self.stations:
-                raise ValueError(f"站点 {station_name} 已存在")
-                
-            # 创建新站点
-            new_station = Station(station_name)
-            new_station.add_line(line_id)
-            
-            # 获取线路对象
-            line = self.lines[line_id]
-            
-            # 确定新站点在线路中的位置
-            connected_idx = line.stations.index(connected_station)
-            
-            # 将新站点添加到线路
-            if connected_idx == 0:
-                # 如果连接站是线路的第一个站点，则在开头添加新站点
-                line.stations.insert(0, station_name)
-            elif connected_idx == len(line.stations) - 1:
-                # 如果连接站是线路的最后一个站点，则在末尾添加新站点
-                line.stations.append(station_name)
-            else:
-                # 如果连接站在中间，则需要用户指定方向，默认添加到后面
-                line.stations.insert(connected_idx + 1, station_name)
-            
-            # 更新站点间的连接关系
-            new_station.add_adjacent_station(connected_station, distance)
-            self.stations[connected_station].add_adjacent_station(station_name, distance)
+            with self.edit():
+                return self._add_custom_station(station_name, line_id, connected_station, distance)
+        except ValueError as e:
+            print(f"添加自定义站点失败: {str(e)}")
+            return False
+
+    def _add_custom_station(self, station_name: str, line_id: str, connected_station: str, distance: float) -> bool:
+        """在编辑草稿中添加自定义站点，参数见add_custom_station"""
+        # 检查线路是否存在
+        if line_id not in self.lines:
+            raise ValueError(f"线路 {line_id} 不存在")
             
-            # 将新站点添加到系统
-            self.stations[station_name] = new_station
+        # 检查连接站点是否存在并且在指定线路上
+        if connected_station not in self.stations:
+            raise ValueError(f"站点 {connected_station} 不存在")
             
-            # 更新规划器
-            self.planner = SubwayPlanner(self.stations, self.lines)
+        if line_id not in self.stations[connected_station].lines:
+            raise ValueError(f"站点 {connected_station} 不在线路 {line_id} 上")
             
-            return True
+        # 检查新站点名称是否已存在
+        if station_name in self.stations:
+            raise ValueError(f"站点 {station_name} 已存在")
             
-        except ValueError as e:
-            print(f"添加自定义站点失败: {str(e)}")
-            return False 
\ No newline at end of file
+        # 创建新站点
+        new_station = Station(station_name)
+        new_station.add_line(line_id)
+        
+        # 获取线路对象
+        line = self.lines[line_id]
+        
+        # 确定新站点在线路中的位置
+        connected_idx = line.stations.index(connected_station)
+        
+        # 将新站点添加到线路
+        if connected_idx == 0:
+            # 如果连接站是线路的第一个站点，则在开头添加新站点
+            line.stations.insert(0, station_name)
+        elif connected_idx == len(line.stations) - 1:
+            # 如果连接站是线路的最后一个站点，则在末尾添加新站点
+            line.stations.append(station_name)
+        else:
+            # 如果连接站在中间，则需要用户指定方向，默认添加到后面
+            line.stations.insert(connected_idx + 1, station_name)
+        
+        # 更新站点间的连接关系
+        new_station.add_adjacent_station(connected_station, distance)
+        self.stations[connected_station].add_adjacent_station(station_name, distance)
+        
+        # 将新站点添加到系统
+        self.stations[station_name] = new_station
+        
+        # 更新规划器并使路线缓存失效
+        self.mark_network_changed(NetworkDelta(NODE_ADDED, line_id, added_stations=[station_name],
+                                               added_edges=[(connected_station, station_name)]))
+        
+        return True 
\ No newline at end of file
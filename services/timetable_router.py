@@ -0,0 +1,399 @@
+from typing import List, Dict, Tuple, Optional
+from array import array
+from bisect import bisect_left
+from collections import deque
+from models.timetable import WEEKDAY, parse_time, format_time
+
+class TripPattern:
+    """同一线路、同一方向、同一始发站的一组车次
+    
+    这些车次停站序列相同、区间运行时间相同，只有始发时间不同，
+    因此第i站的发车时间 = 始发时间 + dep_offsets[i]，按始发时间排序即满足先到先走。
+    """
+
+    def __init__(self, line_id: str, direction: str, stops: array,
+                 arr_offsets: List[float], dep_offsets: List[float], departures: List[int]):
+        self.line_id = line_id
+        self.direction = direction
+        self.stops = stops  # 停站序列的站点编号（环线车次会绕行超过一圈）
+        self.arr_offsets = arr_offsets  # 各站相对始发时间的到达时刻（分钟）
+        self.dep_offsets = dep_offsets  # 各站相对始发时间的发车时刻（分钟）
+        self.departures = departures  # 始发时间，升序（分钟）
+    
+    # 比较时间时容忍的浮点误差（分钟），避免"始发时间+偏移-偏移"后错过恰好该时刻出发的车次
+    EPSILON = 1e-6
+
+    def earliest_trip(self, position: int, ready_time: float) -> Optional[int]:
+        """在第position站找到ready_time之后最早出发的车次，没有时返回None"""
+        index = bisect_left(self.departures, ready_time - self.dep_offsets[position] - self.EPSILON)
+        return index if index < len(self.departures) else None
+
+class TimetableRouter:
+    """基于真实发车时刻表的最早到达路径规划（RAPTOR算法）
+    
+    车次由Line中指定日期类型时刻表的各方向各始发站发车时间构造，区间运行时间
+    与停站时间与SubwayPlanner的计算保持一致。每一轮扫描代表多乘坐一趟列车，
+    因此第k轮得到的是最多换乘k-1次的最早到达时间。扫描在规划器紧凑图的
+    站点编号上进行，站点名称只在输入输出时转换。
+    """
+    
+    # 环线各方向的运行方向：从锚点站出发的下一站
+    RING_DIRECTIONS = {
+        ("2号线", "内环"): ("西直门", "车公庄"),
+        ("2号线", "外环"): ("西直门", "积水潭"),
+        ("10号线", "内环"): ("宋家庄", "成寿寺"),
+        ("10号线", "外环"): ("宋家庄", "石榴庄")
+    }
+
+    def __init__(self, planner, day_type: str = WEEKDAY, max_rounds: int = 8):
+        """根据规划器中的路网和线路发车时间构建车次
+        
+        Args:
+            planner: SubwayPlanner实例，提供站点、线路和区间运行时间
+            day_type: 使用的时刻表日期类型（工作日、双休日）
+            max_rounds: 最多乘坐的列车趟数
+        """
+        self.planner = planner
+        self.graph = planner.compiled_graph
+        self.day_type = day_type
+        self.max_rounds = max_rounds
+        self.patterns = []  # List[TripPattern]
+        self.routes_by_stop = [[] for _ in range(self.graph.station_count)]  # 按站点编号 [(pattern_index, position), ...]
+        self._build_patterns()
+
+    def _build_patterns(self):
+        """为每条线路每个方向的每个始发站构建车次模式"""
+        for line_id, line in self.planner.lines.items():
+            line_adjacency = self.graph.line_adjacency(line_id)
+            if not line_adjacency:
+                continue
+            
+            for (direction, origin), departures in line.get_timetable(self.day_type).items():
+                if origin not in line_adjacency or not departures:
+                    continue
+                stops = self._trip_stops(line_id, line, direction, origin, line_adjacency)
+                if not stops or len(stops) < 2:
+                    continue
+                
+                self._add_pattern(line_id, direction, stops, list(departures))
+
+    def _trip_stops(self, line_id: str, line, direction: str, origin: str,
+                    line_adjacency: Dict[str, List[Tuple[str, float]]]) -> Optional[List[str]]:
+        """确定从始发站出发的车次停站序列"""
+        ring = self.RING_DIRECTIONS.get((line_id, direction))
+        if ring is not None:
+            cycle = self._ring_cycle(ring[0], ring[1], line_adjacency)
+            if not cycle or origin not in cycle:
+                return None
+            # 从始发站开始绕行接近两圈，使环线上任意不超过一圈的行程都能在同一车次内完成
+            offset = cycle.index(origin)
+            return [cycle[(offset + i) % len(cycle)] for i in range(2 * len(cycle) - 1)]
+        
+        target = self._direction_terminal(line, direction, origin, line_adjacency)
+        if target is None or target == origin:
+            return None
+        return self._line_path(origin, target, line_adjacency)
+
+    def _ring_cycle(self, anchor: str, next_station: str,
+                    line_adjacency: Dict[str, List[Tuple[str, float]]]) -> Optional[List[str]]:
+        """沿环线从锚点站按指定方向走一圈，返回站点序列（不重复锚点站）"""
+        if anchor not in line_adjacency or next_station not in line_adjacency:
+            return None
+        cycle = [anchor]
+        previous, current = anchor, next_station
+        while current != anchor:
+            if current in cycle:
+                return None
+            cycle.append(current)
+            neighbors = [station for station, _ in line_adjacency[current] if station != previous]
+            if len(neighbors) != 1:
+                return None  # 线路被编辑后不再是简单环线
+            previous, current = current, neighbors[0]
+        return cycle
+
+    def _direction_terminal(self, line, direction: str, origin: str,
+                            line_adjacency: Dict[str, List[Tuple[str, float]]]) -> Optional[str]:
+        """确定非环线从某个始发站出发的车次终点站
+        
+        优先使用线路方向数据中的终点站；方向名称与发车时间数据不一致
+        （终点站就是始发站或方向不存在）时，从一端始发的车次驶向另一端。
+        """
+        if direction in line.directions:
+            end_station = line.directions[direction][1]
+            candidates = end_station if isinstance(end_station, list) else [end_station]
+            for candidate in candidates:
+                if candidate in line_adjacency and candidate != origin:
+                    return candidate
+        
+        terminals = [station for station, edges in line_adjacency.items()
+                     if len({next_station for next_station, _ in edges}) == 1]
+        if len(terminals) == 2 and origin in terminals:
+            return terminals[1] if origin == terminals[0] else terminals[0]
+        return None
+
+    def _line_path(self, start: str, end: str,
+                   line_adjacency: Dict[str, List[Tuple[str, float]]]) -> Optional[List[str]]:
+        """同一线路上两站之间经过站数最少的站点序列"""
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            station = queue.popleft()
+            if station == end:
+                path = []
+                while station is not None:
+                    path.append(station)
+                    station = previous[station]
+                return path[::-1]
+            for next_station, _ in line_adjacency[station]:
+                if next_station not in previous:
+                    previous[next_station] = station
+                    queue.append(next_station)
+        return None
+
+    def _add_pattern(self, line_id: str, direction: str, stops: List[str], departures: List[int]):
+        """将停站序列转换为站点编号，计算车次模式的到发时刻偏移并建立站点索引"""
+        graph = self.graph
+        line = graph.line_ids[line_id]
+        stop_ids = array('I', (graph.station_ids[station] for station in stops))
+        arr_offsets = [0.0]
+        dep_offsets = [0.0]
+        for i in range(1, len(stop_ids)):
+            arrival = dep_offsets[-1] + graph.travel_time(stop_ids[i - 1], stop_ids[i], line)
+            arr_offsets.append(arrival)
+            dep_offsets.append(arrival + graph.stop_times[stop_ids[i]])
+        
+        pattern_index = len(self.patterns)
+        self.patterns.append(TripPattern(line_id, direction, stop_ids, arr_offsets, dep_offsets, departures))
+        # 终点站不能上车，不建立索引
+        for position in range(len(stop_ids) - 1):
+            self.routes_by_stop[stop_ids[position]].append((pattern_index, position))
+
+    def earliest_arrival(self, start: str, end: str, depart_time: float) -> Optional[Dict]:
+        """查询指定出发时间下的最早到达方案
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            depart_time: 出发时间（当天分钟数）
+        
+        Returns:
+            Optional[Dict]: 包含departure、arrival和legs（每趟列车的乘车信息）的方案，
+                当天已无可达车次时返回None
+        """
+        self._check_stations(start, end)
+        if start == end:
+            return {"departure": depart_time, "arrival": depart_time, "legs": []}
+        
+        start_id, end_id = self.graph.station_ids[start], self.graph.station_ids[end]
+        labels, journeys, best = self._new_labels()
+        self._scan(start_id, end_id, depart_time, labels, journeys, best)
+        if end_id not in best:
+            return None
+        return self._build_journey(end_id, depart_time, labels, journeys)
+
+    def earliest_arrivals(self, start: str, ends: List[str], depart_time: float) -> Dict[str, Dict]:
+        """一次扫描求出从起点出发到多个终点的最早到达方案
+        
+        扫描不设终点（不做目标剪枝），各轮标签覆盖所有可达站点，
+        同一起点的多个终点共用这一次扫描。
+        
+        Args:
+            start: 起点站
+            ends: 终点站列表
+            depart_time: 出发时间（当天分钟数）
+        
+        Returns:
+            Dict[str, Dict]: {终点站: 方案}，方案格式同earliest_arrival，当天无法到达的终点不出现
+        """
+        for end in ends:
+            self._check_stations(start, end)
+        
+        start_id = self.graph.station_ids[start]
+        labels, journeys, best = self._new_labels()
+        self._scan(start_id, -1, depart_time, labels, journeys, best)
+        
+        results = {}
+        for end in ends:
+            end_id = self.graph.station_ids[end]
+            if end_id == start_id:
+                results[end] = {"departure": depart_time, "arrival": depart_time, "legs": []}
+            elif end_id in best:
+                results[end] = self._build_journey(end_id, depart_time, labels, journeys)
+        return results
+
+    def profile(self, start: str, end: str, window_start: float, window_end: float) -> List[Dict]:
+        """查询出发时间窗口内所有不被支配的乘车方案（rRAPTOR）
+        
+        按起点站在窗口内的发车时刻从晚到早依次扫描，各轮标签在扫描之间保留：
+        较晚出发能到达的时间也是较早出发的上界，因此每次扫描只需处理被改进的站点。
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            window_start: 窗口开始时间（当天分钟数）
+            window_end: 窗口结束时间（当天分钟数）
+        
+        Returns:
+            List[Dict]: 按出发时间升序的方案列表，出发越晚到达越晚（帕累托最优集合），
+                每个方案的departure为在起点站上车的时间
+        """
+        self._check_stations(start, end)
+        if start == end or window_end < window_start:
+            return []
+        
+        start_id, end_id = self.graph.station_ids[start], self.graph.station_ids[end]
+        departures = set()
+        for pattern_index, position in self.routes_by_stop[start_id]:
+            pattern = self.patterns[pattern_index]
+            offset = pattern.dep_offsets[position]
+            first = bisect_left(pattern.departures, window_start - offset)
+            for trip in range(first, len(pattern.departures)):
+                departure = pattern.departures[trip] + offset
+                if departure > window_end:
+                    break
+                departures.add(departure)
+        
+        labels, journeys, best = self._new_labels()
+        results = []
+        for departure in sorted(departures, reverse=True):
+            previous_arrival = best.get(end_id)
+            self._scan(start_id, end_id, departure, labels, journeys, best, latest_board=window_end)
+            if end_id not in best or (previous_arrival is not None and best[end_id] >= previous_arrival):
+                continue
+            journey = self._build_journey(end_id, departure, labels, journeys)
+            journey["departure"] = journey["legs"][0]["departure"]
+            if results and results[-1]["departure"] == journey["departure"]:
+                results[-1] = journey
+            else:
+                results.append(journey)
+        
+        results.reverse()
+        return results
+
+    def latest_departure(self, start: str, end: str, arrive_time: float, horizon: float = 180) -> Optional[Dict]:
+        """查询在指定时间前到达的最晚出发方案
+        
+        Args:
+            start: 起点站
+            end: 终点站
+            arrive_time: 最晚到达时间（当天分钟数）
+            horizon: 向前搜索的出发时间范围（分钟）
+        
+        Returns:
+            Optional[Dict]: 出发最晚的方案，范围内无法按时到达时返回None
+        """
+        self._check_stations(start, end)
+        if start == end:
+            return {"departure": arrive_time, "arrival": arrive_time, "legs": []}
+        
+        feasible = [journey for journey in self.profile(start, end, arrive_time - horizon, arrive_time)
+                    if journey["arrival"] <= arrive_time]
+        return feasible[-1] if feasible else None
+
+    def _check_stations(self, start: str, end: str):
+        """检查起点和终点站是否存在"""
+        if start not in self.planner.stations or end not in self.planner.stations:
+            raise ValueError("起点或终点站不存在")
+
+    def _new_labels(self) -> Tuple[List[Dict], List[Dict], Dict]:
+        """创建空的各轮到达时间、各轮乘车记录和各站最早到达时间"""
+        rounds = self.max_rounds + 1
+        return [{} for _ in range(rounds)], [{} for _ in range(rounds)], {}
+
+    def _scan(self, start: int, end: int, depart_time: float,
+              labels: List[Dict], journeys: List[Dict], best: Dict, latest_board: Optional[float] = None):
+        """从起点站按给定出发时间执行各轮扫描，就地更新标签
+        
+        站点均为紧凑图中的编号。labels[k]为乘坐k趟列车后各站的最早到达时间，journeys[k]为对应的乘车记录
+        {station: (pattern_index, trip, board_position, alight_position)}，
+        best为所有轮次中各站的最早到达时间。latest_board限制在起点站上车的最晚时间，
+        使时间窗口查询的标签都对应窗口内出发的方案。
+        """
+        infinity = float('inf')
+        labels[0] = {start: depart_time}
+        best[start] = min(best.get(start, infinity), depart_time)
+        marked = {start}
+        routes_by_stop = self.routes_by_stop
+        stop_times = self.graph.stop_times
+        transfer_times = self.graph.transfer_times
+        
+        for round_index in range(1, self.max_rounds + 1):
+            # 收集经过被标记站点的车次模式，记录最靠前的上车位置
+            queue = {}
+            for station in marked:
+                for pattern_index, position in routes_by_stop[station]:
+                    if position < queue.get(pattern_index, infinity):
+                        queue[pattern_index] = position
+            
+            marked = set()
+            previous_labels = labels[round_index - 1]
+            round_labels = labels[round_index]
+            round_journeys = journeys[round_index]
+            target_time = best.get(end, infinity)
+            
+            for pattern_index, first_position in queue.items():
+                pattern = self.patterns[pattern_index]
+                trip = None
+                board_position = None
+                stops = pattern.stops
+                
+                for position in range(first_position, len(stops)):
+                    station = stops[position]
+                    
+                    if trip is not None:
+                        arrival = pattern.departures[trip] + pattern.arr_offsets[position]
+                        if arrival < best.get(station, infinity) and arrival < target_time:
+                            best[station] = arrival
+                            round_labels[station] = arrival
+                            round_journeys[station] = (pattern_index, trip, board_position, position)
+                            marked.add(station)
+                            if station == end:
+                                target_time = arrival
+                    
+                    # 上一轮到达该站后能否赶上更早的车次（换乘站计停站与换乘时间，起点站都不计）
+                    label = previous_labels.get(station)
+                    if label is not None and position < len(stops) - 1:
+                        ready_time = label if round_index == 1 else label + stop_times[station] + transfer_times[station]
+                        if trip is None or ready_time <= pattern.departures[trip] + pattern.dep_offsets[position]:
+                            earlier = pattern.earliest_trip(position, ready_time)
+                            if (earlier is not None and round_index == 1 and latest_board is not None
+                                    and pattern.departures[earlier] + pattern.dep_offsets[position] > latest_board):
+                                earlier = None
+                            if earlier is not None and (trip is None or earlier < trip):
+                                trip = earlier
+                                board_position = position
+            
+            if not marked:
+                break
+
+    def _build_journey(self, end: int, depart_time: float,
+                       labels: List[Dict], journeys: List[Dict]) -> Dict:
+        """从各轮乘车记录回溯出完整的乘车方案（站点编号转换为名称）"""
+        names = self.graph.station_names
+        legs = []
+        station = end
+        # 到达时间最早的轮次中乘车趟数最少的一轮
+        arrival = min(round_labels[end] for round_labels in labels[1:] if end in round_labels)
+        round_index = next(i for i in range(1, len(labels)) if labels[i].get(end) == arrival)
+        while round_index > 0:
+            pattern_index, trip, board_position, alight_position = journeys[round_index][station]
+            pattern = self.patterns[pattern_index]
+            trip_departure = pattern.departures[trip]
+            legs.append({
+                "line": pattern.line_id,
+                "direction": pattern.direction,
+                "from": names[pattern.stops[board_position]],
+                "to": names[pattern.stops[alight_position]],
+                "departure": trip_departure + pattern.dep_offsets[board_position],
+                "arrival": trip_departure + pattern.arr_offsets[alight_position],
+                "stations": self.graph.names(pattern.stops[board_position:alight_position + 1])
+            })
+            station = pattern.stops[board_position]
+            round_index -= 1
+        
+        legs.reverse()
+        return {
+            "departure": depart_time,
+            "arrival": legs[-1]["arrival"],
+            "legs": legs
+        }
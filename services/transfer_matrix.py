@@ -0,0 +1,91 @@
+from typing import Dict, Optional, Iterable, Set
+from collections import deque
+import copy
+from models.station import Station
+from models.line import Line
+
+class TransferMatrix:
+    """线路之间最少换乘次数表
+    
+    由换乘站的Station.lines构建线路邻接关系，对每条线路做一次BFS，
+    得到任意两条线路之间的最少换乘次数。不可达的线路对不出现在表中。
+    """
+    
+    def __init__(self, stations: Dict[str, Station], lines: Dict[str, Line],
+                 line_neighbors: Optional[Dict[str, Set[str]]] = None):
+        """构建换乘次数表
+        
+        Args:
+            stations: 站点字典
+            lines: 线路字典
+            line_neighbors: 已知的线路邻接关系 {line: {可直接换乘的线路}}，为None时由站点数据计算
+        """
+        self.stations = stations
+        if line_neighbors is not None:
+            self.line_neighbors = {line_id: set(line_neighbors.get(line_id, ())) for line_id in lines}
+        else:
+            self.line_neighbors = {line_id: set() for line_id in lines}
+            for station in stations.values():
+                station_lines = [line_id for line_id in station.lines if line_id in lines]
+                if len(station_lines) < 2:
+                    continue
+                for line_a in station_lines:
+                    for line_b in station_lines:
+                        if line_a != line_b:
+                            self.line_neighbors[line_a].add(line_b)
+        
+        # {line: {other_line: 最少换乘次数}}
+        self.matrix = {line_id: self._bfs(line_id) for line_id in self.line_neighbors}
+    
+    def copy(self, stations: Dict[str, Station]) -> 'TransferMatrix':
+        """复制一份查询站点时使用stations的换乘次数表，线路间的次数表与原对象共用"""
+        matrix = copy.copy(self)
+        matrix.stations = stations
+        return matrix
+    
+    def _bfs(self, source: str) -> Dict[str, int]:
+        """计算从一条线路出发到其他所有线路的最少换乘次数"""
+        distances = {source: 0}
+        queue = deque([source])
+        while queue:
+            line = queue.popleft()
+            for neighbor in self.line_neighbors[line]:
+                if neighbor not in distances:
+                    distances[neighbor] = distances[line] + 1
+                    queue.append(neighbor)
+        return distances
+    
+    def between_lines(self, line_a: str, line_b: str) -> Optional[int]:
+        """获取两条线路之间的最少换乘次数，不可达时返回None"""
+        return self.matrix.get(line_a, {}).get(line_b)
+    
+    def to_lines(self, line: str, targets: Iterable[str]) -> Optional[int]:
+        """获取一条线路到一组线路中任意一条的最少换乘次数，不可达时返回None"""
+        row = self.matrix.get(line, {})
+        best = None
+        for target in targets:
+            transfers = row.get(target)
+            if transfers is not None and (best is None or transfers < best):
+                best = transfers
+        return best
+    
+    def between_stations(self, start: str, end: str) -> Optional[int]:
+        """获取两个站点之间的最少换乘次数
+        
+        只查表，复杂度为 O(起点线路数 × 终点线路数)，不做任何图搜索。
+        
+        Returns:
+            Optional[int]: 最少换乘次数，同一站点返回0，不可达时返回None
+        """
+        if start not in self.stations or end not in self.stations:
+            raise ValueError("起点或终点站不存在")
+        if start == end:
+            return 0
+        
+        best = None
+        end_lines = self.stations[end].lines
+        for line in self.stations[start].lines:
+            transfers = self.to_lines(line, end_lines)
+            if transfers is not None and (best is None or transfers < best):
+                best = transfers
+        return best
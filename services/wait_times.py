@@ -0,0 +1,149 @@
+from typing import Dict, List, Optional, Tuple
+from array import array
+from models.line import Line
+from models.timetable import WEEKDAY
+from services.timetable_router import TimetableRouter
+import numpy as np
+
+class WaitTimeTable:
+    """按(线路, 方向, 小时)预先计算的期望等车时间表
+    
+    乘客在两班车之间随机到站时，期望等车时间为 Σh² / (2Σh)（h为该小时内各发车间隔），
+    发车越不均匀等车越久。间隔取每个方向主始发站（发车最多的始发站）的发车时间，
+    小区间车只服务部分区段，不计入。每个方向一行，依次为0到23点及全天的期望等车时间，
+    全部存放在一个单精度矩阵中，查询时只做字典和数组下标查找，不产生新的数据。
+    """
+    
+    HOURS = 24
+    # 没有发车时间数据（如新建线路）时的等车时间（分钟）
+    DEFAULT_WAIT = 2.0
+
+    def __init__(self, lines: Optional[Dict[str, Line]] = None, day_type: str = WEEKDAY):
+        """根据线路的发车时刻表计算等车时间
+        
+        Args:
+            lines: 线路字典，发车时间需已加载；为None时所有查询都返回默认等车时间
+            day_type: 使用的时刻表日期类型
+        """
+        self.day_type = day_type
+        self._rows: Dict[Tuple[str, Optional[str]], int] = {}  # {(line_id, direction): 行号}，direction为None时为线路各方向的合计
+        self._directions: Dict[Tuple[str, bool], str] = {}  # {(line_id, 是否沿站点列表正向): direction}
+        self._waits = self._build(lines or {})
+
+    def _build(self, lines: Dict[str, Line]) -> np.ndarray:
+        """一次性计算所有方向及各线路合计的期望等车时间矩阵"""
+        keys, line_keys, departures = [], [], []
+        for line_id, line in lines.items():
+            directions = [(direction, values) for direction, values in self._principal_departures(line).items()
+                          if len(values) > 1]
+            for direction, values in directions:
+                keys.append((line_id, direction))
+                departures.append(np.asarray(values))
+                forward = self._orientation(line_id, line, direction)
+                if forward is not None:
+                    self._directions.setdefault((line_id, forward), direction)
+            if directions:
+                line_keys.append((line_id, None))
+        if not keys:
+            return np.zeros((0, self.HOURS + 1), dtype=np.float32)
+        
+        # 各方向的发车时间首尾相接，只保留同一方向内相邻两班车的间隔
+        owners = np.repeat(np.arange(len(keys)), [len(values) for values in departures])
+        minutes = np.concatenate(departures).astype(np.int64)
+        same = owners[1:] == owners[:-1]
+        headways = np.diff(minutes)[same].astype(float)
+        cells = owners[:-1][same] * self.HOURS + (minutes[:-1][same] // 60) % self.HOURS
+        size = len(keys) * self.HOURS
+        squares = np.bincount(cells, headways * headways, size).reshape(len(keys), self.HOURS)
+        totals = np.bincount(cells, headways, size).reshape(len(keys), self.HOURS)
+        
+        # 线路合计行为该线路各方向之和
+        line_rows = {key: i for i, key in enumerate(line_keys)}
+        line_of_key = [line_rows[(line_id, None)] for line_id, _ in keys]
+        line_squares = np.zeros((len(line_keys), self.HOURS))
+        line_totals = np.zeros((len(line_keys), self.HOURS))
+        np.add.at(line_squares, line_of_key, squares)
+        np.add.at(line_totals, line_of_key, totals)
+        squares = np.vstack([squares, line_squares])
+        totals = np.vstack([totals, line_totals])
+        
+        # 最后一列为全天，没有发车间隔的小时使用全天的期望等车时间
+        squares = np.hstack([squares, squares.sum(axis=1, keepdims=True)])
+        totals = np.hstack([totals, totals.sum(axis=1, keepdims=True)])
+        all_day = np.divide(squares[:, -1], 2 * totals[:, -1], out=np.full(len(totals), self.DEFAULT_WAIT),
+                            where=totals[:, -1] > 0)
+        waits = np.repeat(all_day[:, None], self.HOURS + 1, axis=1)
+        np.divide(squares, 2 * totals, out=waits, where=totals > 0)
+        self._rows = {key: row for row, key in enumerate(keys + line_keys)}
+        return waits.astype(np.float32)
+
+    def _principal_departures(self, line: Line) -> Dict[str, array]:
+        """各方向发车最多的始发站的发车时间"""
+        principal = {}
+        for (direction, _), departures in line.get_timetable(self.day_type).items():
+            if len(departures) > len(principal.get(direction, ())):
+                principal[direction] = departures
+        return principal
+
+    @staticmethod
+    def _orientation(line_id: str, line: Line, direction: str) -> Optional[bool]:
+        """方向是否沿站点列表正向运行，无法确定时返回None"""
+        ring = TimetableRouter.RING_DIRECTIONS.get((line_id, direction))
+        if ring is not None:
+            return _step_orientation(line.stations, *ring)
+        if direction not in line.directions:
+            return None
+        start, end = (value[0] if isinstance(value, list) and value else value
+                      for value in line.directions[direction])
+        if start in line.stations and end in line.stations and start != end:
+            return line.stations.index(start) < line.stations.index(end)
+        return None
+
+    def wait(self, line_id: str, direction: Optional[str] = None, hour: Optional[int] = None) -> float:
+        """查询期望等车时间（分钟）
+        
+        Args:
+            line_id: 线路编号
+            direction: 运行方向，为None或没有该方向的数据时使用线路各方向的合计
+            hour: 到站的小时（0-23，超过23时按次日计），为None时使用全天的期望等车时间
+        """
+        row = self._rows.get((line_id, direction))
+        if row is None:
+            row = self._rows.get((line_id, None))
+            if row is None:
+                return self.DEFAULT_WAIT
+        return float(self._waits[row, self.HOURS if hour is None else hour % self.HOURS])
+
+    def boarding_wait(self, line_id: str, stations: List[str], origin: str, next_station: str,
+                      hour: Optional[int] = None) -> float:
+        """在origin上车、下一站为next_station时的期望等车时间
+        
+        Args:
+            line_id: 乘坐的线路
+            stations: 该线路当前的站点列表，用于判断运行方向
+            origin: 上车站
+            next_station: 乘坐方向上的下一站
+            hour: 到站的小时，为None时使用全天的期望等车时间
+        """
+        forward = _step_orientation(stations, origin, next_station)
+        direction = self._directions.get((line_id, forward)) if forward is not None else None
+        return self.wait(line_id, direction, hour)
+
+    def __len__(self) -> int:
+        """表中的行数（各方向及各线路合计）"""
+        return len(self._rows)
+
+def _step_orientation(stations: List[str], origin: str, next_station: str) -> Optional[bool]:
+    """从origin到相邻的next_station是否沿站点列表正向（环线首尾相接），无法确定时返回None"""
+    try:
+        i, j = stations.index(origin), stations.index(next_station)
+    except ValueError:
+        return None
+    count = len(stations)
+    if count > 2 and (j - i) % count == 1:
+        return True
+    if count > 2 and (i - j) % count == 1:
+        return False
+    if count == 2 and i != j:
+        return j > i
+    return None
@@ -221,7 +221,17 @@ function addStationMarker(stationName, coords) {
         color: '#004A83',
         weight: 1,
         opacity: 1,
-        fillOpacity: 0.8
+        fillOpacity: 0.8,
+        // 站点右键菜单：显示从该站出发的可达范围
+        contextmenu: true,
+        contextmenuInheritItems: false,
+        contextmenuItems: [{
+            text: '显示60分钟可达范围',
+            callback: function() { showIsochrone(stationName, 60); }
+        }, {
+            text: '清除可达范围',
+            callback: clearIsochrone
+        }]
     }).addTo(subwayMap);
     
     // 创建站点名称标签
@@ -476,6 +486,60 @@ function resetMarkerStyles() {
     }
 }
 
+// 可达范围的时间分段颜色（分钟上限, 颜色）
+const isochroneBands = [
+    [15, '#1A9850'],
+    [30, '#91CF60'],
+    [45, '#FEE08B'],
+    [60, '#FC8D59'],
+    [Infinity, '#D73027']
+];
+
+// 按从某站出发的最短时间为所有站点着色（一次请求获取所有站点的时间）
+function showIsochrone(stationName, minutes) {
+    const params = new URLSearchParams({ station: stationName });
+    if (minutes) {
+        params.append('minutes', minutes);
+    }
+    
+    fetch(`/isochrone?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                alert(data.message);
+                return;
+            }
+            
+            clearIsochrone();
+            const times = {};
+            data.stations.forEach(item => { times[item.station] = item; });
+            
+            for (const [name, marker] of Object.entries(stationMarkers)) {
+                const item = times[name];
+                if (!item) {
+                    // 时间上限内不可达的站点置灰
+                    marker.setStyle({ fillColor: '#BBBBBB', color: '#888888', fillOpacity: 0.4 });
+                    continue;
+                }
+                const band = isochroneBands.find(([limit]) => item.time <= limit);
+                marker.setStyle({ fillColor: band[1], color: '#333333', fillOpacity: 0.9 });
+                marker.bindTooltip(`${name}: ${item.time.toFixed(1)}分钟，换乘${item.transfers}次`);
+            }
+        })
+        .catch(error => {
+            console.error('获取可达范围失败:', error);
+        });
+}
+
+// 清除可达范围着色，恢复默认站点样式
+function clearIsochrone() {
+    for (const marker of Object.values(stationMarkers)) {
+        marker.unbindTooltip();
+    }
+    resetMarkerStyles();
+    updateMarkerStyles();
+}
+
 // 查询地图路线
 function queryMapRoute(start, end) {
     // 清除现有路线
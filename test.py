@@ -1,5 +1,7 @@
 from services.subway_system import SubwaySystem
 from utils.initializer import initialize_from_json
+from utils.snapshot import NetworkSnapshot, compile_snapshot, open_snapshot
+from models.timetable import ServiceCalendar, WEEKDAY, WEEKEND, HOLIDAY, parse_time, format_time
 
 def test_initialization():
     print("=== 开始初始化测试 ===")
@@ -135,12 +137,794 @@ def test_route_planning():
         result = system.plan_route(start, end, mode)
         print(result)
 
+def test_shortest_time_path():
+    print("\n=== 测试最短时间路径 ===")
+    
+    system = SubwaySystem()
+    planner = system.planner
+    
+    test_cases = [
+        ("西直门", "天安门东"),
+        ("积水潭", "西直门"),   # 2号线环线闭合区间
+        ("火器营", "巴沟"),     # 10号线环线闭合区间
+        ("西二旗", "清河站"),   # 13号线与昌平线共线区间
+    ]
+    
+    for start, end in test_cases:
+        path, lines, total_time = planner._search_shortest_time(start, end)
+        details = planner.calculate_route_details(path, lines)
+        print(f"{start} -> {end}: {total_time:.2f}分钟，线路 {lines}")
+        
+        # 搜索代价与逐段计算的时间一致，且不慢于最少换乘方案中最快的一条
+        assert abs(details["total_time"] - details["wait_time"] - total_time) < 1e-6
+        least_transfers = planner.find_least_transfers_path(start, end)
+        assert total_time <= least_transfers[0][3] + 1e-6
+    
+    # 环线闭合区间直达
+    assert planner._search_shortest_time("积水潭", "西直门")[0] == ["积水潭", "西直门"]
+
+def test_least_transfers_path():
+    print("\n=== 测试最少换乘路径 ===")
+    
+    system = SubwaySystem()
+    planner = system.planner
+    
+    test_cases = [
+        ("西直门", "天安门东", 1),
+        ("苹果园", "潞城", 0),
+        ("西二旗", "清河站", 0),   # 共线区间两条线路各给出一个方案
+        ("车公庄", "鼓楼大街", 0),  # 经过2号线环线闭合区间
+    ]
+    
+    for start, end, expected_transfers in test_cases:
+        paths = planner.find_least_transfers_path(start, end)
+        print(f"{start} -> {end}: {len(paths)}条方案，换乘{paths[0][1]}次")
+        
+        assert all(transfers == expected_transfers for _, transfers, _, _ in paths)
+        # 结果按时间排序，且每条路径不重复经过站点
+        assert [p[3] for p in paths] == sorted(p[3] for p in paths)
+        assert all(len(set(path)) == len(path) for path, _, _, _ in paths)
+    
+    assert {tuple(p[2]) for p in planner.find_least_transfers_path("西二旗", "清河站")} == {("13号线",), ("昌平线",)}
+
+def test_query_route_once():
+    print("\n=== 测试单次查询渲染 ===")
+    
+    system = SubwaySystem()
+    
+    for mode in ["time", "transfers"]:
+        result = system.query_route("西直门", "天安门东", mode)
+        text = system.render_route_text(result)
+        details = system.render_route_details(result)
+        print(f"模式 {mode}: {len(result.routes)}条方案，首选用时 {details['time']:.2f}分钟")
+        
+        # 文本、地图详情和备选路线来自同一次规划，等车时间和总时间一致
+        assert details is result.best
+        assert f"总时间: {details['time']:.2f}分钟" in text
+    
+    result = system.query_route("不存在的站点", "天安门东")
+    assert result.error and system.render_route_text(result).startswith("错误")
+
+def test_route_cache():
+    print("\n=== 测试路线缓存 ===")
+    
+    system = SubwaySystem(cache_size=2)
+    
+    first = system.query_route("西直门", "天安门东")
+    assert system.query_route("西直门", "天安门东") is first
+    
+    # 编辑路网后版本号递增，旧结果不再命中
+    version = system.network_version
+    system.editor.extend_line(
+        line_id="2号线",
+        terminal_station="西直门",
+        new_station="缓存测试站",
+        distance=800
+    )
+    assert system.network_version == version + 1
+    assert system.query_route("西直门", "天安门东") is not first
+    
+    # 超出容量时淘汰最久未使用的条目
+    system.query_route("西直门", "积水潭")
+    system.query_route("苹果园", "潞城")
+    stats = system.route_cache.stats()
+    print(f"缓存统计: {stats}")
+    assert stats["size"] == 2 and stats["evictions"] == 1 and stats["hits"] == 1
+
+def test_transfer_matrix():
+    print("\n=== 测试线路换乘次数表 ===")
+    
+    system = SubwaySystem()
+    
+    for start, end in [("西直门", "天安门东"), ("天通苑北", "大兴机场"), ("苹果园", "潞城")]:
+        min_transfers = system.get_min_transfers(start, end)
+        print(f"{start} -> {end}: 最少换乘{min_transfers}次")
+        # 查表结果与最少换乘搜索一致
+        assert min_transfers == system.planner.find_least_transfers_path(start, end)[0][1]
+    
+    # 新建线路后换乘次数表随之重建
+    system.editor.create_new_line("测试线", "西直门", 80)
+    assert system.planner.transfer_matrix.between_lines("测试线", "2号线") == 1
+
+def test_depart_at_route():
+    print("\n=== 测试按时刻表出发的最早到达路线 ===")
+    
+    system = SubwaySystem()
+    
+    result = system.query_route("西直门", "天安门东", "depart_at", "08:00")
+    print(system.render_route_text(result))
+    route = result.best
+    
+    # 每趟列车都在上一趟到达之后出发，且首趟列车不早于出发时间
+    assert route["legs"][0]["departure"] >= "08:00"
+    for previous, leg in zip(route["legs"], route["legs"][1:]):
+        assert previous["to"] == leg["from"]
+        assert previous["arrival"] <= leg["departure"]
+    assert route["arrival"] == route["legs"][-1]["arrival"]
+    
+    # 换乘站同样计停站时间，首趟上车到最终到达的用时不会少于静态最短时间
+    router = system.get_timetable_router(WEEKDAY)
+    for start, end in (("大兴新城", "刘家窑"), ("十八里店", "黄厂"), ("西直门", "国贸"), ("望京南", "西单")):
+        static_time = system.planner._search_full_graph(start, end)[2]
+        for depart_time in ("07:30", "08:00", "18:00"):
+            journey = router.earliest_arrival(start, end, parse_time(depart_time))
+            assert journey["arrival"] - journey["legs"][0]["departure"] >= static_time - 1e-6
+
+    # 末班车之后没有可行路线
+    assert not system.query_route("西直门", "天安门东", "depart_at", "23:59").routes
+
+def test_profile_and_arrive_by():
+    print("\n=== 测试出发时间窗口查询和按时到达查询 ===")
+    
+    system = SubwaySystem()
+    
+    routes = system.get_route_profile("西直门", "国贸", "08:00", "09:00")
+    print(f"08:00-09:00 共 {len(routes)} 个最优方案")
+    assert routes
+    # 帕累托最优：出发越晚到达越晚，且都在窗口内出发
+    for previous, route in zip(routes, routes[1:]):
+        assert previous["departure"] <= route["departure"]
+        assert previous["arrival"] <= route["arrival"]
+    assert all("08:00" <= route["departure"] <= "09:00" for route in routes)
+    # 短窗口中也不会在窗口结束之后才上车
+    for start, end, window_start, window_end in (("望京南", "西单", "08:57", "08:59"),
+                                                 ("工人体育场", "回龙观", "17:33", "17:34")):
+        bounded = system.get_route_profile(start, end, window_start, window_end)
+        assert all(window_start <= route["departure"] <= window_end for route in bounded)
+    
+    # 窗口内任意出发时间的单次查询都不会比窗口方案到得更早
+    single = system.query_route("西直门", "国贸", "depart_at", "08:30").best
+    assert single["arrival"] == min(route["arrival"] for route in routes if route["departure"] >= "08:30")
+    
+    result = system.query_route("西直门", "国贸", "arrive_by", arrive_time="09:00")
+    print(system.render_route_text(result))
+    latest = result.best
+    assert latest["arrival"] <= "09:00"
+    # 晚于最晚出发方案出发就无法按时到达
+    next_minute = format_time(parse_time(latest["departure"]) + 1)
+    later = system.query_route("西直门", "国贸", "depart_at", next_minute).best
+    assert later is None or later["arrival"] > "09:00"
+    
+    assert system.query_route("西直门", "国贸", "profile", "09:00", "08:00").error
+
+def test_timetable_store():
+    print("\n=== 测试发车时刻表查询 ===")
+    
+    system = SubwaySystem()
+    monday = "2025-03-03"
+    line = system.lines["2号线"]
+    timetable = system.get_timetable("2号线", monday)
+    
+    # 各方向各始发站的发车时间按分钟数升序保存
+    for (direction, station), departures in timetable.items():
+        assert list(departures) == sorted(departures)
+    
+    departures = timetable.departures("内环", "积水潭")
+    earliest = line.get_earliest_start_time("积水潭", WEEKDAY)
+    assert earliest == format_time(timetable.earliest("积水潭"))
+    assert earliest <= format_time(departures[0])
+    
+    # 下一班：不早于给定时间的最早班次
+    next_time = system.get_station_departure_time("2号线", "积水潭", "08:00", monday)
+    print(f"积水潭 08:00 之后的下一班: {next_time}")
+    assert next_time >= "08:00"
+    upcoming = system.get_next_departures("2号线", "积水潭", "08:00", 3, date=monday)
+    assert len(upcoming) == 3 and upcoming[0]["time"] == next_time
+    assert [item["time"] for item in upcoming] == sorted(item["time"] for item in upcoming)
+    
+    # 区间查询与逐个筛选的结果一致
+    between = system.get_departures_between("2号线", "积水潭", "07:00", "07:30", "内环", monday)
+    expected = [format_time(minute) for minute in departures if parse_time("07:00") <= minute <= parse_time("07:30")]
+    assert [item["time"] for item in between] == expected
+    
+    assert system.get_station_departure_time("2号线", "积水潭", "23:59", monday) is None
+    assert system.get_station_departure_time("不存在的线路", "积水潭") is None
+    
+    # 接口对后续班次数count做范围检查
+    from app import app, MAX_NEXT_DEPARTURES
+    client = app.test_client()
+    url = f"/departure_time?line_id=2号线&station=积水潭&after=08:00&date={monday}"
+    assert len(client.get(f"{url}&count=3").get_json()["next_departures"]) == 3
+    for count in ["0", "-1", "2.5", "abc", str(MAX_NEXT_DEPARTURES + 1)]:
+        response = client.get(f"{url}&count={count}")
+        assert response.status_code == 400 and "count" in response.get_json()["message"]
+
+def test_service_calendar():
+    print("\n=== 测试运营日历和按日期类型加载时刻表 ===")
+    
+    calendar = ServiceCalendar(holidays=["2025-10-01"], workdays=["2025-09-28"])
+    assert calendar.day_type("2025-03-03") == WEEKDAY  # 周一
+    assert calendar.day_type("2025-03-08") == WEEKEND  # 周六
+    assert calendar.day_type("2025-10-01") == HOLIDAY
+    assert calendar.timetable_day_type("2025-10-01") == WEEKEND  # 节假日按双休日时刻表运营
+    assert calendar.timetable_day_type("2025-09-28") == WEEKDAY  # 调休上班的周日
+    
+    system = SubwaySystem(holidays=["2025-10-01"])
+    # 启动时不解析发车时间数据，首次查询某日期类型时才加载
+    assert not system.lines["2号线"].timetables
+    
+    result = system.query_route("西直门", "国贸", "depart_at", "08:00", date="2025-03-08")
+    print(system.render_route_text(result))
+    assert result.best
+    assert set(system.lines["2号线"].timetables) == {WEEKEND}
+    
+    # 节假日与双休日共用时刻表和缓存条目
+    assert system.query_route("西直门", "国贸", "depart_at", "08:00", date="2025-10-01") is result
+    assert set(system.lines["2号线"].timetables) == {WEEKEND}
+    
+    weekday = system.query_route("西直门", "国贸", "depart_at", "08:00", date="2025-03-03")
+    assert set(system.lines["2号线"].timetables) == {WEEKDAY, WEEKEND}
+    assert weekday is not result
+    
+    weekday_times = system.get_departure_times("2号线", "2025-03-03")
+    weekend_times = system.get_departure_times("2号线", "2025-03-08")
+    assert weekday_times and weekend_times and weekday_times != weekend_times
+    
+    assert system.query_route("西直门", "国贸", "depart_at", "08:00", date="2025/03/03").error
+
+def test_network_snapshot():
+    print("\n=== 测试路网快照 ===")
+    
+    import os
+    import shutil
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "line_speed.json")
+        shutil.copy("resources/data/line_speed_final.json", data_file)
+        snapshot_path = os.path.join(directory, "network.snapshot")
+        
+        compile_snapshot(data_file, snapshot_path)
+        snapshot = open_snapshot(data_file, snapshot_path, rebuild=False)
+        assert snapshot is not None
+        
+        # 快照中的路网与直接读取JSON一致
+        stations, lines = snapshot.load_network()
+        json_stations, json_lines = initialize_from_json(data_file)
+        assert set(stations) == set(json_stations) and set(lines) == set(json_lines)
+        assert stations["西直门"].adjacent_stations == json_stations["西直门"].adjacent_stations
+        assert not lines["2号线"].timetables  # 发车时间按日期类型单独加载
+        assert snapshot.load_timetables(lines, ["双休日"]) == ["双休日"]
+        assert len(lines["2号线"].get_timetable("双休日")) > 0
+        
+        # 只修改时间不修改内容时快照仍然有效
+        os.utime(data_file, (0, 0))
+        assert snapshot.is_current(data_file)
+        
+        # 数据内容变化后快照过期，open_snapshot会重新编译
+        with open(data_file, "a", encoding="utf-8") as f:
+            f.write("\n")
+        assert not snapshot.is_current(data_file)
+        assert open_snapshot(data_file, snapshot_path, rebuild=False) is None
+        rebuilt = open_snapshot(data_file, snapshot_path)
+        assert rebuilt.is_current(data_file)
+        snapshot.close()
+        rebuilt.close()
+        
+        # 使用快照与直接读取JSON的查询结果一致
+        system = SubwaySystem(snapshot_path=snapshot_path)
+        json_system = SubwaySystem(snapshot_path=None)
+        assert system.query_route("西直门", "国贸").best["path"] == json_system.query_route("西直门", "国贸").best["path"]
+        # 快照中预先计算的等车时间表与由JSON计算的一致
+        assert system.query_route("西直门", "国贸").best["time"] == json_system.query_route("西直门", "国贸").best["time"]
+        route = system.query_route("西直门", "国贸", "depart_at", "08:00", date="2025-03-03").best
+        json_route = json_system.query_route("西直门", "国贸", "depart_at", "08:00", date="2025-03-03").best
+        assert route["legs"] == json_route["legs"]
+
+def test_incremental_planner_update():
+    print("\n=== 测试增量更新规划器 ===")
+    
+    from services.subway_planner import SubwayPlanner
+    from models.station import Station
+    from models.line import Line
+    from models.network_delta import NetworkDelta, NODE_ADDED
+    
+    def snapshot_state(planner):
+        """规范化规划器的索引，便于比较增量更新与重新建图的结果"""
+        adjacency = {name: sorted(edges) for name, edges in planner.adjacency.items() if edges}
+        line_adjacency = {line_id: {name: sorted(edges) for name, edges in
+                                    planner.compiled_graph.line_adjacency(line_id).items()}
+                          for line_id in planner.lines}
+        line_graph = {line_id: {neighbor: sorted(hubs) for neighbor, hubs in neighbors.items()}
+                      for line_id, neighbors in planner.line_graph.items()}
+        return adjacency, line_adjacency, line_graph, planner.transfer_matrix.matrix
+    
+    system = SubwaySystem()
+    system.query_route("西直门", "国贸")
+    system.editor.add_station("2号线", "西直门", "车公庄", "增量测试站", 500, 410)
+    system.editor.extend_line("10号线", "巴沟", "增量延长站", 900)
+    system.editor.remove_station("增量测试站")
+    system.editor.create_new_line("增量线", "国贸", 60)
+    system.editor.add_station_to_line("增量线", "增量换乘站", "国贸", 1200)
+    system.add_custom_station("增量自定义站", "增量线", "增量换乘站", 800)
+    
+    # 与已有线路没有换乘站的新线路（与/edit/add_custom_station新建线路的方式相同）
+    with system.edit():
+        station = Station("孤立站一")
+        station.add_line("孤立线")
+        system.stations["孤立站一"] = station
+        line = Line("孤立线", 60.0)
+        line.stations = ["孤立站一"]
+        system.lines["孤立线"] = line
+        system.mark_network_changed(NetworkDelta(NODE_ADDED, "孤立线", added_stations=["孤立站一"],
+                                                 added_lines=["孤立线"]))
+    system.editor.add_station_to_line("孤立线", "孤立站二", "孤立站一", 1200)
+    
+    rebuilt = SubwayPlanner(system.stations, system.lines)
+    assert snapshot_state(system.planner) == snapshot_state(rebuilt)
+    assert system.planner.transfer_matrix.matrix == rebuilt.transfer_matrix.matrix
+    for mode in ("time", "transfers"):
+        assert system.query_route("孤立站一", "孤立站二", mode).best["path"] == ["孤立站一", "孤立站二"]
+    assert system.get_min_transfers("孤立站一", "孤立站二") == 0
+    
+    # 增量更新后的规划器可以直接查询新站点
+    route = system.query_route("西直门", "增量自定义站").best
+    print(f"西直门 -> 增量自定义站: {' -> '.join(route['path'])}")
+    assert route["path"][-1] == "增量自定义站" and "增量换乘站" in route["path"]
+
+def test_compiled_graph():
+    print("\n=== 测试紧凑路网图 ===")
+    
+    system = SubwaySystem()
+    planner = system.planner
+    graph = planner.compiled_graph
+    print(f"站点 {graph.station_count} 个，有向边 {graph.edge_count} 条，数组共 {graph.nbytes} 字节")
+    assert graph.edge_count == sum(len(edges) for edges in planner.adjacency.values())
+    
+    # 编号与名称一一对应，预先算好的行驶时间与按距离计算的一致
+    a, b = graph.station_ids["西直门"], graph.station_ids["车公庄"]
+    assert graph.names([a, b]) == ["西直门", "车公庄"]
+    distance = system.stations["西直门"].adjacent_stations["车公庄"]
+    expected = planner.calculate_travel_time(distance, system.lines["2号线"].speed)
+    assert abs(graph.travel_time(a, b, graph.line_ids["2号线"]) - expected) < 1e-9
+    assert graph.travel_time(a, graph.station_ids["国贸"], graph.line_ids["2号线"]) is None
+    assert ("车公庄", expected) in graph.line_adjacency("2号线")["西直门"]
+    
+    # 编辑后新版本的规划器重新编译，新站点可以参与搜索；旧版本的紧凑图不变
+    system.editor.extend_line("2号线", "西直门", "紧凑图测试站", 800)
+    assert planner.compiled_graph is graph
+    assert system.planner.compiled_graph is not graph
+    assert "紧凑图测试站" in system.planner.compiled_graph.station_ids
+    assert system.query_route("紧凑图测试站", "车公庄").best["path"][:2] == ["紧凑图测试站", "西直门"]
+
+def test_skeleton_graph():
+    print("\n=== 测试换乘骨架图 ===")
+    
+    system = SubwaySystem()
+    planner = system.planner
+    skeleton = planner.skeleton_graph
+    print(f"骨架站点 {skeleton.node_count}/{skeleton.graph.station_count}，骨架边 {skeleton.edge_count}/{skeleton.graph.edge_count}")
+    assert skeleton.node_count < skeleton.graph.station_count
+    assert skeleton.is_node[skeleton.graph.station_ids["西直门"]]  # 换乘站
+    assert not skeleton.is_node[skeleton.graph.station_ids["车公庄西"]]  # 只有两个相邻站点的普通站
+    
+    # 起终点为换乘站、普通站、同一区段上的两站以及跨环线的组合，结果与完整图搜索一致
+    test_cases = [
+        ("西直门", "国贸"),
+        ("车公庄西", "潞城"),
+        ("苹果园", "古城"),
+        ("古城", "苹果园"),
+        ("天通苑北", "宋家庄"),
+        ("积水潭", "鼓楼大街"),
+        ("安定门", "雍和宫"),
+        ("二里沟", "车公庄西")
+    ]
+    for start, end in test_cases:
+        path, lines, cost = planner._search_shortest_time(start, end)
+        _, _, full_cost = planner._search_full_graph(start, end)
+        print(f"{start} -> {end}: {cost:.2f} 分钟，经过 {len(path)} 站")
+        assert abs(cost - full_cost) < 1e-9
+        assert path[0] == start and path[-1] == end and len(lines) == len(path) - 1
+        assert abs(planner._calculate_path_time(path, lines) - cost) < 1e-9
+
+def test_plan_many():
+    print("\n=== 测试批量路线查询 ===")
+    
+    system = SubwaySystem()
+    origins = ["西直门", "苹果园", "天通苑北"]
+    destinations = ["国贸", "宋家庄", "西直门", "车公庄西"]
+    
+    # 同一起点共用一次一对多搜索，结果与逐对查询的最短时间（含等车时间）一致
+    for depart_time in (None, "08:00"):
+        matrix = system.plan_many(origins, destinations, depart_time=depart_time)
+        print(f"时间矩阵: {matrix['time']}")
+        for i, origin in enumerate(origins):
+            for j, destination in enumerate(destinations):
+                route = system.query_route(origin, destination, depart_time=depart_time).best
+                assert abs(matrix["time"][i][j] - route["time"]) < 0.01
+                assert matrix["fare"][i][j] == system.calculate_fare(matrix["distance"][i][j])
+    assert matrix["time"][0][2] == 0 and matrix["distance"][0][2] == 0
+    
+    # 按时刻表出发的批量查询与逐对查询的到达时间一致
+    matrix = system.plan_many(origins, destinations, "depart_at", "08:00", "2025-03-03")
+    router = system.get_timetable_router(WEEKDAY)
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            journey = router.earliest_arrival(origin, destination, parse_time("08:00"))
+            assert abs(matrix["time"][i][j] - (journey["arrival"] - journey["departure"])) < 0.01
+            assert matrix["transfers"][i][j] == len(journey["legs"]) - 1 or origin == destination
+    
+    matrix = system.plan_many(origins[:1], destinations[:2], "transfers")
+    assert matrix["transfers"][0] == [system.get_min_transfers("西直门", "国贸"),
+                                      system.get_min_transfers("西直门", "宋家庄")]
+    assert matrix["time"][0] == [round(system.query_route("西直门", end, "transfers").best["time"], 2)
+                                 for end in destinations[:2]]
+    
+    for args in [(["不存在的站"], destinations), (origins, destinations, "profile")]:
+        try:
+            system.plan_many(*args)
+            assert False, "应当抛出ValueError"
+        except ValueError as e:
+            print(f"预期的错误: {str(e)}")
+
+def test_isochrone():
+    print("\n=== 测试可达范围查询 ===")
+    
+    system = SubwaySystem()
+    full = system.get_isochrone("西直门")
+    times = {item["station"]: item["time"] for item in full["stations"]}
+    print(f"西直门出发可达 {len(times)} 个站点，最远 {full['stations'][-1]}")
+    assert full["stations"][0] == {"station": "西直门", "time": 0, "transfers": 0, "distance": 0}
+    assert abs(times["国贸"] - system.planner._search_full_graph("西直门", "国贸")[2]) < 0.01
+    
+    # 时间上限内的结果恰好是完整结果中不超过上限的站点
+    limited = system.get_isochrone("西直门", 20)
+    assert {item["station"] for item in limited["stations"]} == {name for name, time in times.items() if time <= 20}
+    assert [item["time"] for item in limited["stations"]] == sorted(item["time"] for item in limited["stations"])
+    assert system.get_isochrone("西直门", 20) is limited  # 命中缓存
+    
+    for args in [("不存在的站",), ("西直门", -1)]:
+        try:
+            system.get_isochrone(*args)
+            assert False, "应当抛出ValueError"
+        except ValueError as e:
+            print(f"预期的错误: {str(e)}")
+
+def test_all_pairs():
+    print("\n=== 测试全路网矩阵 ===")
+    
+    import tempfile
+    import numpy as np
+    from services.all_pairs import AllPairsMatrices
+    
+    system = SubwaySystem()
+    matrices = system.get_all_pairs()
+    count = len(system.stations)
+    print(f"矩阵大小: {matrices.time.shape}，最多换乘 {matrices.transfers.max()} 次")
+    assert matrices.time.shape == matrices.distance.shape == matrices.transfers.shape == (count, count)
+    assert system.get_all_pairs() is matrices  # 路网未变化时复用
+    
+    # 与一对多搜索的结果逐项一致
+    for origin in ["西直门", "苹果园", "宋家庄"]:
+        row = matrices.index(origin)
+        reachable = system.planner.find_shortest_times_from(origin)
+        assert np.isfinite(matrices.time[row]).sum() == len(reachable)
+        for name, (total_time, distance, transfers) in reachable.items():
+            column = matrices.index(name)
+            assert abs(matrices.time[row, column] - total_time) < 1e-6
+            assert abs(matrices.distance[row, column] - distance) < 1e-6
+            assert matrices.transfers[row, column] == transfers
+    
+    # 票价与逐个计算一致
+    for distance in [0, 6000, 6001, 32000, 52000, 52001, 98765.4]:
+        assert system.calculate_fares(np.array([distance]))[0] == system.calculate_fare(distance)
+    row, column = matrices.index("西直门"), matrices.index("国贸")
+    assert matrices.fare[row, column] == system.calculate_fare(matrices.distance[row, column])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        system.export_all_pairs(directory)
+        loaded = AllPairsMatrices.load(directory)
+        assert loaded.stations == matrices.stations
+        assert np.array_equal(loaded.time, matrices.time) and np.array_equal(loaded.transfers, matrices.transfers)
+    
+    system.editor.add_station("2号线", "西直门", "车公庄", "矩阵测试站", 500, 410)
+    assert system.get_all_pairs().time.shape == (count + 1, count + 1)
+
+def test_k_shortest_routes():
+    print("\n=== 测试k条备选路线 ===")
+    
+    system = SubwaySystem()
+    result = system.query_route("西直门", "国贸", "time", k=4)
+    for route in result.routes:
+        print(f"{route['time']:.2f}分钟 {' -> '.join(dict.fromkeys(route['lines']))}")
+    assert 1 < len(result.routes) <= 4
+    times = [route["time"] for route in result.routes]
+    assert times == sorted(times)
+    
+    # 包含最短时间路线，各条路线不重复经过站点且两两不相似，时间包含各自上车的等车时间
+    best_time = system.planner._search_full_graph("西直门", "国贸")[2]
+    assert abs(min(route["time"] - route["wait_time"] for route in result.routes) - best_time) < 1e-6
+    for i, route in enumerate(result.routes):
+        assert len(set(route["path"])) == len(route["path"])
+        assert route["wait_time"] == system.planner.boarding_wait(route["path"], route["lines"])
+        assert abs(system.planner._calculate_path_time(route["path"], route["lines"]) + route["wait_time"]
+                   - route["time"]) < 1e-6
+        for other in result.routes[:i]:
+            assert not system.planner._is_similar_route(route["path"], other["path"], system.ROUTE_SIMILARITY)
+    assert system.query_route("西直门", "国贸", "time", k=4) is result  # 命中缓存
+    
+    for k in [0, 11, "3"]:
+        assert system.query_route("西直门", "国贸", "time", k=k).error
+    assert len(system.query_route("西直门", "西直门", "time", k=3).routes) == 1
+
+def test_network_versions():
+    print("\n=== 测试路网版本发布 ===")
+    
+    import threading
+    
+    system = SubwaySystem()
+    old = system.state
+    system.editor.extend_line("2号线", "西直门", "版本测试站", 800)
+    assert system.network_version == old.version + 1
+    # 旧版本保持不变，仍可独立查询
+    assert "版本测试站" not in old.stations and "版本测试站" not in old.lines["2号线"].stations
+    assert "版本测试站" not in old.stations["西直门"].adjacent_stations
+    assert old.planner.find_shortest_time_path("西直门", "国贸")[0]
+    assert "版本测试站" in system.stations["西直门"].adjacent_stations
+    # 只复制编辑触及的站点、线路和线路邻接图行，其余对象在新旧版本间共用
+    assert system.stations["西直门"] is not old.stations["西直门"] and system.lines["2号线"] is not old.lines["2号线"]
+    assert system.stations["国贸"] is old.stations["国贸"] and system.lines["1号线/八通线"] is old.lines["1号线/八通线"]
+    assert system.planner.line_graph["1号线/八通线"] is old.planner.line_graph["1号线/八通线"]
+
+    # 编辑中途出错时草稿被丢弃，不会发布改了一半的路网
+    current = system.state
+    try:
+        with system.edit():
+            system.stations["西直门"].adjacent_stations.pop("车公庄")
+            raise ValueError("模拟编辑失败")
+    except ValueError:
+        pass
+    assert system.state is current and "车公庄" in system.stations["西直门"].adjacent_stations
+    try:
+        system.editor.extend_line("2号线", "不在线路上的站", "版本测试站2", 800)
+    except ValueError as e:
+        print(f"预期的错误: {str(e)}")
+    assert system.state is current
+    
+    # 固定版本的线程不受其他线程发布的编辑影响
+    with system.pinned():
+        worker = threading.Thread(target=system.editor.extend_line, args=("2号线", "版本测试站", "版本测试站3", 500))
+        worker.start()
+        worker.join()
+        assert system.state is current and "版本测试站3" not in system.stations
+    assert "版本测试站3" in system.stations
+    
+    # 查询线程与编辑同时进行
+    errors = []
+    stop = threading.Event()
+    
+    def query_loop():
+        while not stop.is_set():
+            try:
+                result = system.query_route("西直门", "国贸")
+                assert result.error is None and result.best["path"][-1] == "国贸"
+            except Exception as e:
+                errors.append(e)
+    
+    workers = [threading.Thread(target=query_loop) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for i in range(10):
+        system.editor.add_station("4号线/大兴线", "西直门", "动物园", f"并发测试站{i}", 300, 300)
+        system.editor.remove_station(f"并发测试站{i}")
+    stop.set()
+    for worker in workers:
+        worker.join()
+    assert not errors, errors
+    print(f"并发编辑后路网版本: {system.network_version}")
+
+def test_metrics():
+    print("\n=== 测试监控指标 ===")
+    
+    from services.metrics import _Metric, Counter, Histogram, MetricsRegistry, REGISTRY
+    
+    try:
+        _Metric("test_untyped", "未实现样本输出的指标")
+        assert False, "指标基类不能直接实例化"
+    except TypeError as e:
+        print(f"预期的错误: {str(e)}")
+    
+    registry = MetricsRegistry()
+    requests = registry.register(Counter("test_requests_total", "请求数", ("route",)))
+    latency = registry.register(Histogram("test_seconds", "耗时", buckets=(0.1, 1)))
+    requests.inc("/query")
+    requests.inc("/query", amount=2)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+    text = registry.render()
+    assert 'test_requests_total{route="/query"} 3' in text
+    assert 'test_seconds_bucket{le="0.1"} 2' in text and 'test_seconds_bucket{le="1"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text and "test_seconds_count 4" in text
+    
+    # 路线计算按模式累计耗时、扩展状态数和枚举路线数，缓存命中的查询不计入
+    searches = REGISTRY.get("subway_planner_search_seconds")
+    expanded = REGISTRY.get("subway_planner_expanded_states_total")
+    paths = REGISTRY.get("subway_planner_paths_enumerated_total")
+    system = SubwaySystem()
+    before = (searches.count("time"), expanded.value("time"), paths.value("transfers"))
+    system.query_route("西直门", "国贸")
+    system.query_route("西直门", "国贸")
+    system.query_route("西直门", "宋家庄", "transfers")
+    assert searches.count("time") == before[0] + 1
+    assert expanded.value("time") > before[1] and paths.value("transfers") > before[2]
+    
+    rebuilds = REGISTRY.get("subway_planner_rebuild_seconds")
+    deltas = rebuilds.count("delta")
+    system.editor.extend_line("5号线", "刘家窑", "指标测试站", 900)
+    assert rebuilds.count("delta") == deltas + 1
+    
+    from app import app
+    client = app.test_client()
+    client.get('/stations')
+    response = client.get('/metrics')
+    body = response.get_data(as_text=True)
+    print(body.splitlines()[1])
+    assert response.status_code == 200 and response.content_type.startswith("text/plain")
+    assert 'subway_http_requests_total{method="GET",route="/stations",status="200"}' in body
+    assert "subway_route_cache_hit_ratio" in body and "subway_planner_search_seconds_bucket" in body
+
+def test_debug_endpoints():
+    print("\n=== 测试诊断接口 ===")
+    
+    import app as application
+    
+    client = application.app.test_client()
+    token = application.ADMIN_TOKEN
+    try:
+        application.ADMIN_TOKEN = None
+        assert client.get('/debug/memory').status_code == 404
+        application.ADMIN_TOKEN = "测试令牌".encode('utf-8').hex()
+        headers = {'X-Admin-Token': application.ADMIN_TOKEN}
+        assert client.get('/debug/profile', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+        assert client.post('/debug/profile', json={}, headers=headers).status_code == 400
+        
+        # 只分析接下来的2个/query请求，其他路径的请求不计入
+        response = client.post('/debug/profile', json={"requests": 2, "path": "/query"}, headers=headers)
+        assert response.status_code == 202
+        assert client.post('/debug/profile', json={"requests": 1}, headers=headers).status_code == 409
+        client.get('/stations')
+        client.post('/query', json={"start": "西直门", "end": "国贸", "mode": "time"})
+        assert not client.get('/debug/profile', headers=headers).get_json()["status"]["finished"]
+        client.post('/query', json={"start": "苹果园", "end": "宋家庄", "mode": "transfers"})
+        response = client.get('/debug/profile', headers={'Authorization': f'Bearer {application.ADMIN_TOKEN}'})
+        stacks = response.get_data(as_text=True).splitlines()
+        assert response.content_type.startswith("text/plain") and stacks
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+        assert any("find_least_transfers_path" in line for line in stacks)
+        assert not any("get_stations" in line for line in stacks)
+        print(f"折叠调用栈 {len(stacks)} 行")
+        
+        report = client.get('/debug/memory', headers=headers).get_json()
+        assert report["objects"]["stations"]["count"] == len(application.system.stations)
+        assert report["objects"]["stations"]["size_kib"] > 0 and "wait_times" in report["objects"]
+        print(f"站点占用 {report['objects']['stations']['size_kib']:.1f} KiB")
+    finally:
+        application.ADMIN_TOKEN = token
+
+def test_search_budget():
+    print("\n=== 测试搜索预算 ===")
+    
+    from services.search_budget import SearchBudget
+    
+    budget = SearchBudget(max_expansions=10)
+    assert budget.spend(10) and not budget.spend(1) and budget.exhausted
+    try:
+        SearchBudget(max_expansions=0)
+        assert False, "预算上限必须为正数"
+    except ValueError as e:
+        print(f"预期的错误: {str(e)}")
+    
+    # 预算充足时结果与不限制预算相同
+    unlimited = SubwaySystem()
+    limited = SubwaySystem(max_expansions=100000, max_search_ms=5000)
+    for mode, k in (("transfers", 1), ("time", 3)):
+        expected = unlimited.query_route("苹果园", "大兴机场", mode, k=k)
+        result = limited.query_route("苹果园", "大兴机场", mode, k=k)
+        assert result.optimal and [r["path"] for r in result.routes] == [r["path"] for r in expected.routes]
+    
+    # 预算用尽时返回目前找到的最好结果并标记为非最优，且不写入缓存
+    system = SubwaySystem(max_expansions=1)
+    for mode, k in (("transfers", 1), ("time", 3)):
+        result = system.query_route("苹果园", "大兴机场", mode, k=k)
+        print(f"{mode}: {len(result.routes)} 条路线，optimal={result.optimal}")
+        assert not result.optimal and result.routes
+        assert result.best["path"][0] == "苹果园" and result.best["path"][-1] == "大兴机场"
+        assert "可能不是最优" in system.render_route_text(result)
+    assert len(system.route_cache) == 0
+
+def test_wait_times():
+    print("\n=== 测试等车时间表 ===")
+    
+    from services.wait_times import WaitTimeTable
+    from models.line import Line
+    
+    # 每小时内的期望等车时间为 Σh²/(2Σh)，没有发车间隔的小时使用全天的值
+    line = Line("测试线", 80)
+    line.set_stations(["甲", "乙", "丙"])
+    line.add_direction("东行", "甲", "丙")
+    line.add_direction("西行", "丙", "甲")
+    for time in ["06:00", "06:10", "06:20", "07:00", "07:04", "07:08"]:
+        line.add_start_time("甲", time, "东行")
+    line.add_start_time("乙", "06:05", "东行")  # 小区间车不计入
+    for time in ["06:00", "06:30", "07:00"]:
+        line.add_start_time("丙", time, "西行")
+    table = WaitTimeTable({"测试线": line})
+    assert abs(table.wait("测试线", "东行", 6) - (100 + 100 + 1600) / (2 * 60)) < 1e-4
+    assert abs(table.wait("测试线", "东行", 7) - 2) < 1e-4
+    assert abs(table.wait("测试线", "东行", 12) - table.wait("测试线", "东行")) < 1e-6
+    assert abs(table.wait("测试线", "东行") - (1800 + 32) / (2 * 68)) < 1e-4
+    assert abs(table.boarding_wait("测试线", line.stations, "丙", "乙", 6) - 15) < 1e-4
+    assert table.wait("新线路") == WaitTimeTable.DEFAULT_WAIT
+    
+    # 相同查询得到相同的等车时间，查询不会让等车时间表增长
+    system = SubwaySystem()
+    rows = len(system.planner.wait_times)
+    print(f"等车时间表 {rows} 行")
+    first = system.planner.find_shortest_time_path("西直门", "国贸")
+    for _ in range(3):
+        assert system.planner.find_shortest_time_path("西直门", "国贸") == first
+    assert len(system.planner.wait_times) == rows
+    
+    # 上车方向不同，等车时间按各自方向的发车间隔计算
+    for start, end in (("苹果园", "四惠东"), ("四惠东", "苹果园")):
+        route = system.query_route(start, end).best
+        print(f"{start} -> {end}: 等车 {route['wait_time']:.2f} 分钟")
+        assert 0 < route["wait_time"] < 10
+    
+    # 提供出发时间时按所在小时计算，同一小时的查询共用缓存
+    late = system.query_route("苹果园", "四惠东", depart_time="22:10")
+    assert late.best["wait_time"] > system.query_route("苹果园", "四惠东", depart_time="08:10").best["wait_time"]
+    assert system.query_route("苹果园", "四惠东", depart_time="22:45") is late
+    assert system.query_route("苹果园", "四惠东", depart_time="8点").error
+
 def main():
     try:
         test_initialization()
         test_subway_editor()
         test_subway_editor_error_cases()
         test_route_planning()
+        test_shortest_time_path()
+        test_least_transfers_path()
+        test_query_route_once()
+        test_route_cache()
+        test_transfer_matrix()
+        test_depart_at_route()
+        test_profile_and_arrive_by()
+        test_timetable_store()
+        test_service_calendar()
+        test_network_snapshot()
+        test_incremental_planner_update()
+        test_compiled_graph()
+        test_skeleton_graph()
+        test_plan_many()
+        test_isochrone()
+        test_all_pairs()
+        test_k_shortest_routes()
+        test_network_versions()
+        test_metrics()
+        test_debug_endpoints()
+        test_search_budget()
+        test_wait_times()
         print("\n所有测试完成！")
     except Exception as e:
         print(f"\n测试过程中出现错误：{str(e)}")
@@ -1,7 +1,8 @@
 import json
-from typing import Dict, Tuple
+from typing import Dict, Tuple, List, Iterable
 from models.station import Station
 from models.line import Line
+from models.timetable import Timetable, WEEKDAY, parse_time
 import os
 
 def initialize_from_json(line_speed_file: str) -> Tuple[Dict[str, Station], Dict[str, Line]]:
@@ -64,46 +65,78 @@ def initialize_from_json(line_speed_file: str) -> Tuple[Dict[str, Station], Dict
             if "大钟寺" in line.stations and line.stations.index("大钟寺") == 0:
                 line.stations = line.stations[1:]
     
-    # 加载发车时间数据
-    load_departure_times(lines)
+    # 加载线路运行方向（发车时间数据按日期类型在首次使用时加载）
+    load_line_directions(lines)
     
     return stations, lines
 
-def load_departure_times(lines: Dict[str, Line]) -> None:
-    """加载发车时间数据到相应的Line对象中
+def load_line_directions(lines: Dict[str, Line]) -> None:
+    """加载各线路的运行方向（起点站和终点站）到相应的Line对象中
     
     Args:
         lines: 包含所有线路对象的字典
     """
+    directions_file = 'resources/data/line_direction_startAndEnd.json'
+    if not os.path.exists(directions_file):
+        print(f"警告: 线路方向数据文件 {directions_file} 不存在")
+        return
+    
+    with open(directions_file, 'r', encoding='utf-8') as f:
+        directions_data = json.load(f)
+    
+    for line_info in directions_data:
+        line_obj = lines.get(line_info['lineId'])
+        if line_obj is None:
+            continue
+        for direction_info in line_info['directions']:
+            line_obj.add_direction(direction_info['direction'],
+                                   direction_info['startStation'],
+                                   direction_info['endStation'])
+
+def load_departure_times(lines: Dict[str, Line], day_types: Iterable[str] = (WEEKDAY,)) -> List[str]:
+    """加载指定日期类型的发车时间数据到相应的Line对象中
+    
+    发车时间数据较大，不在初始化时加载，而是在首次查询某个日期类型时按需调用。
+    
+    Args:
+        lines: 包含所有线路对象的字典
+        day_types: 要加载的日期类型（如"工作日"、"双休日"）
+        
+    Returns:
+        List[str]: 数据文件中存在并已加载的日期类型
+    """
+    loaded = []
     try:
         # 检查发车时间数据文件是否存在
         departure_times_file = 'resources/data/parsed_departure_times.json'
         if not os.path.exists(departure_times_file):
             print(f"警告: 发车时间数据文件 {departure_times_file} 不存在")
-            return
+            return loaded
         
         # 读取发车时间数据
         with open(departure_times_file, 'r', encoding='utf-8') as f:
             departure_data = json.load(f)
         
-        # 只解析工作日数据作为每天的发车时间
-        weekday_key = "工作日"
-        if weekday_key in departure_data:
-            weekday_data = departure_data[weekday_key]
+        for day_type in day_types:
+            if day_type not in departure_data:
+                print(f"警告: 发车时间数据中没有{day_type}的时刻表")
+                continue
+            day_data = departure_data[day_type]
             
             # 遍历所有线路
             for line_id, line_obj in lines.items():
-                if line_id in weekday_data:
-                    line_data = weekday_data[line_id]
-                    
-                    # 遍历所有方向
-                    for direction, stations_data in line_data.items():
-                        # 遍历所有始发站
-                        for station_name, departure_times in stations_data.items():
-                            # 保存所有发车时间
-                            for time_id, time_value in departure_times.items():
-                                line_obj.add_start_time(station_name, time_id, time_value)
+                timetable = Timetable()
+                # 遍历所有方向
+                for direction, stations_data in day_data.get(line_id, {}).items():
+                    # 遍历所有始发站
+                    for station_name, departure_times in stations_data.items():
+                        # 发车时间编号只是数据文件中的标识，只保存时间本身
+                        timetable.extend(direction, station_name,
+                                         (parse_time(value) for value in departure_times.values()))
+                line_obj.set_timetable(day_type, timetable)
+            loaded.append(day_type)
         
-        print("发车时间数据加载完成")
+        print(f"发车时间数据加载完成: {'、'.join(loaded)}")
     except Exception as e:
-        print(f"加载发车时间数据时出错: {str(e)}")
\ No newline at end of file
+        print(f"加载发车时间数据时出错: {str(e)}")
+    return loaded
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+from typing import Dict, List, Tuple, Optional, Iterable
+from models.station import Station
+from models.line import Line
+from services.wait_times import WaitTimeTable
+from utils.initializer import initialize_from_json, load_departure_times
+
+# 快照文件格式版本，Station/Line/Timetable/WaitTimeTable的结构变化时需要递增
+SNAPSHOT_FORMAT = 2
+SNAPSHOT_MAGIC = b'BJSUBWAY'
+DEFAULT_SNAPSHOT_PATH = 'resources/cache/network.snapshot'
+DEPARTURE_TIMES_FILE = 'resources/data/parsed_departure_times.json'
+
+# 除线路速度文件外，初始化时读取的数据文件
+DATA_FILES = [
+    'resources/data/station_distance_final.json',
+    'resources/data/subway_lines_final.json',
+    'resources/data/line_direction_startAndEnd.json',
+    DEPARTURE_TIMES_FILE
+]
+
+def _file_hash(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _source_files(data_file: str) -> List[str]:
+    """快照依赖的所有数据文件"""
+    return [data_file] + [path for path in DATA_FILES if path != data_file]
+
+def _fingerprint(paths: Iterable[str]) -> Dict[str, Tuple[int, int, str]]:
+    """记录数据文件的大小、修改时间和内容哈希 {path: (size, mtime_ns, sha256)}"""
+    sources = {}
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            sources[path] = (stat.st_size, stat.st_mtime_ns, _file_hash(path))
+    return sources
+
+class NetworkSnapshot:
+    """编译后的路网快照
+    
+    文件结构为：魔数 + 头部长度 + 头部 + 各数据段。头部记录格式版本、数据文件指纹
+    和各数据段的位置；数据段通过mmap按需反序列化，发车时间按日期类型分段，
+    只有首次用到某日期类型时才读取。由工作日发车时间预先计算的等车时间表单独成段，
+    启动时读取它不需要加载发车时间。
+    """
+
+    def __init__(self, path: str):
+        """打开快照文件并读取头部
+        
+        Args:
+            path: 快照文件路径
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        prefix = len(SNAPSHOT_MAGIC)
+        if self._buffer[:prefix] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} 不是路网快照文件")
+        header_length, = struct.unpack_from('<I', self._buffer, prefix)
+        header_start = prefix + 4
+        self.header = pickle.loads(self._buffer[header_start:header_start + header_length])
+        self._data_start = header_start + header_length
+
+    @property
+    def day_types(self) -> List[str]:
+        """快照中包含的发车时间日期类型"""
+        return list(self.header['timetables'])
+
+    def is_current(self, data_file: str) -> bool:
+        """检查快照是否与当前代码和数据文件一致
+        
+        文件大小和修改时间都未变化时直接认为一致；修改时间变化（如重新检出）
+        但内容哈希相同时同样有效。
+        """
+        if self.header.get('format') != SNAPSHOT_FORMAT:
+            return False
+        sources = self.header['sources']
+        paths = [path for path in _source_files(data_file) if os.path.exists(path)]
+        if sorted(paths) != sorted(sources):
+            return False
+        
+        for path in paths:
+            size, mtime_ns, digest = sources[path]
+            stat = os.stat(path)
+            if stat.st_size != size:
+                return False
+            if stat.st_mtime_ns != mtime_ns and _file_hash(path) != digest:
+                return False
+        return True
+
+    def _section(self, offset: int, length: int):
+        """反序列化一个数据段"""
+        start = self._data_start + offset
+        return pickle.loads(self._buffer[start:start + length])
+
+    def load_network(self) -> Tuple[Dict[str, Station], Dict[str, Line]]:
+        """读取站点和线路（每次调用都返回新的对象，可以独立编辑）"""
+        return self._section(*self.header['network'])
+
+    def load_timetables(self, lines: Dict[str, Line], day_types: Iterable[str]) -> List[str]:
+        """将指定日期类型的发车时刻表设置到线路对象中
+        
+        Args:
+            lines: 包含所有线路对象的字典
+            day_types: 要加载的日期类型
+        
+        Returns:
+            List[str]: 快照中存在并已加载的日期类型
+        """
+        loaded = []
+        for day_type in day_types:
+            section = self.header['timetables'].get(day_type)
+            if section is None:
+                continue
+            for line_id, timetable in self._section(*section).items():
+                if line_id in lines:
+                    lines[line_id].set_timetable(day_type, timetable)
+            loaded.append(day_type)
+        return loaded
+
+    def load_wait_times(self) -> Optional[WaitTimeTable]:
+        """读取预先计算的等车时间表"""
+        section = self.header.get('wait_times')
+        return self._section(*section) if section is not None else None
+
+    def close(self):
+        """关闭文件映射"""
+        self._buffer.close()
+
+def compile_snapshot(data_file: str = 'resources/data/line_speed_final.json',
+                     path: str = DEFAULT_SNAPSHOT_PATH) -> str:
+    """将数据文件编译为路网快照
+    
+    Args:
+        data_file: 线路速度数据文件路径
+        path: 快照文件输出路径
+    
+    Returns:
+        str: 快照文件路径
+    """
+    # 先记录指纹再读取数据，编译期间数据文件被修改时快照会被判定为过期
+    sources = _fingerprint(_source_files(data_file))
+    stations, lines = initialize_from_json(data_file)
+    
+    day_types = []
+    if os.path.exists(DEPARTURE_TIMES_FILE):
+        with open(DEPARTURE_TIMES_FILE, 'r', encoding='utf-8') as f:
+            day_types = list(json.load(f))
+    load_departure_times(lines, day_types)
+    wait_times = WaitTimeTable(lines)
+    
+    sections = []
+    timetables = {}
+    for day_type in day_types:
+        timetables[day_type] = {line_id: line.timetables[day_type]
+                                for line_id, line in lines.items() if day_type in line.timetables}
+    for line in lines.values():
+        line.timetables = {}
+
+    def add_section(value) -> Tuple[int, int]:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        offset = sum(len(section) for section in sections)
+        sections.append(data)
+        return offset, len(data)
+    
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'sources': sources,
+        'network': add_section((stations, lines)),
+        'timetables': {day_type: add_section(value) for day_type, value in timetables.items()},
+        'wait_times': add_section(wait_times)
+    }
+    header_data = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    # 写入临时文件后原子替换，正在读取旧快照的进程不受影响
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<I', len(header_data)))
+        f.write(header_data)
+        for data in sections:
+            f.write(data)
+    os.replace(temp_path, path)
+    return path
+
+def open_snapshot(data_file: str = 'resources/data/line_speed_final.json',
+                  path: str = DEFAULT_SNAPSHOT_PATH, rebuild: bool = True) -> Optional[NetworkSnapshot]:
+    """打开与数据文件一致的路网快照
+    
+    Args:
+        data_file: 线路速度数据文件路径
+        path: 快照文件路径
+        rebuild: 快照不存在或已过期时是否重新编译
+    
+    Returns:
+        Optional[NetworkSnapshot]: 可用的快照，无法使用快照时返回None（调用方应直接读取JSON）
+    """
+    try:
+        if os.path.exists(path):
+            snapshot = NetworkSnapshot(path)
+            if snapshot.is_current(data_file):
+                return snapshot
+            snapshot.close()
+        if not rebuild:
+            return None
+        compile_snapshot(data_file, path)
+        return NetworkSnapshot(path)
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, struct.error) as e:
+        print(f"路网快照不可用，改为读取JSON数据: {str(e)}")
+        return None
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="将 resources/data 下的JSON数据编译为路网快照")
+    parser.add_argument('--data-file', default='resources/data/line_speed_final.json', help="线路速度数据文件")
+    parser.add_argument('--output', default=DEFAULT_SNAPSHOT_PATH, help="快照文件输出路径")
+    args = parser.parse_args()
+    
+    print(f"已生成路网快照: {compile_snapshot(args.data_file, args.output)}")